@@ -0,0 +1,712 @@
+# bench.py
+# Offline microbenchmarks for whale_watcher hot paths.
+#   python bench.py decode [--n 20000]   per-tx calldata decode cost, legacy eth-abi path vs zero-copy path
+#   python bench.py parse [--n 50000]    websocket frame parsing, frames/s per core: stdlib json vs the
+#                                        fast-parse layer (C backend + hash scan / lazy Solana decode)
+#   python bench.py replay rec.jsonl.gz [--speed 1|10|max]
+#       replay traffic captured with `whale_watcher.py --record rec.jsonl.gz` through an unmodified
+#       whale_watcher.py process, against local stand-in ws/RPC/price/Discord servers; reports
+#       tx/s, per-stage latency percentiles, CPU time and peak RSS from the watcher's /metrics
+
+import argparse
+import asyncio
+import gzip
+import json
+import os
+import random
+import re
+import signal
+import socket
+import sys
+import tempfile
+import time
+from collections import defaultdict
+from typing import Dict, List, Optional, Tuple
+
+import yaml
+from aiohttp import ClientSession, WSMsgType, web
+
+os.environ.setdefault("DISCORD_WEBHOOK_URL", "")
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from eth_abi import decode as abi_decode, encode as abi_encode
+from web3 import Web3
+
+import whale_watcher as ww
+
+WETH = "0xC02aaA39b223FE8D0A0e5C4F27eAD9083C756Cc2"
+USDC = "0xA0b86991c6218b36c1d19D4a2e9Eb0cE3606eB48"
+
+def _sel(sig: str) -> bytes:
+    return bytes(Web3.keccak(text=sig)[:4])
+
+def _rand_addr(rng: random.Random) -> str:
+    return Web3.to_checksum_address("0x" + rng.randbytes(20).hex())
+
+# -------------------- decode --------------------
+# (signature, eth-abi types after the selector, builder(rng) -> args, legacy extractor(vals) -> (token_in, token_out))
+DECODE_CASES = [
+    ("swapExactETHForTokens(uint256,address[],address,uint256)",
+     ["uint256", "address[]", "address", "uint256"],
+     lambda r: [r.randrange(10**18), [WETH, _rand_addr(r)], _rand_addr(r), 2**32],
+     lambda v: (v[1][0], v[1][-1])),
+    ("swapExactTokensForTokens(uint256,uint256,address[],address,uint256)",
+     ["uint256", "uint256", "address[]", "address", "uint256"],
+     lambda r: [r.randrange(10**24), r.randrange(10**18), [USDC, WETH, _rand_addr(r)], _rand_addr(r), 2**32],
+     lambda v: (v[2][0], v[2][-1])),
+    ("exactInputSingle((address,address,uint24,address,uint256,uint256,uint160))",
+     ["(address,address,uint24,address,uint256,uint256,uint160)"],
+     lambda r: [(USDC, _rand_addr(r), 3000, _rand_addr(r), r.randrange(10**12), r.randrange(10**18), 0)],
+     lambda v: (v[0][0], v[0][1])),
+]
+
+# Round-trip correctness: for every signature in ww._DECODERS, calldata encoded by eth-abi must decode
+# (zero-copy) to what eth-abi reads back from it. ROUNDTRIP_CASES rows are
+# (signature, eth-abi types after the selector, builder(rng) -> args, expect(vals) -> (token_in, token_out, amount_in, amount_out_min))
+_V2_TAIL = ["address", "uint256"]
+
+def _lo(a: str) -> str:
+    return a.lower()
+
+def _rand_path(r: random.Random) -> List[str]:
+    return [USDC, WETH, _rand_addr(r)][:r.choice((2, 3))]
+
+def _v3_path(r: random.Random) -> bytes:
+    tokens = _rand_path(r)
+    out = bytes.fromhex(tokens[0][2:])
+    for t in tokens[1:]:
+        out += r.choice((500, 3000, 10000)).to_bytes(3, "big") + bytes.fromhex(t[2:])
+    return out
+
+def _v3_ends(path: bytes) -> Tuple[str, str]:
+    return "0x" + path[:20].hex(), "0x" + path[-20:].hex()
+
+def _amt(r: random.Random) -> int:
+    return r.randrange(1, 10**24)
+
+def _v2_eth_in(sig):
+    return (sig, ["uint256", "address[]"] + _V2_TAIL,
+            lambda r: [_amt(r), _rand_path(r), _rand_addr(r), 2**32],
+            lambda v: (_lo(v[1][0]), _lo(v[1][-1]), None, v[0]))
+
+def _v2_tokens(sig, exact_out: bool):
+    tail = _V2_TAIL if sig.endswith("uint256)") else ["address"]
+    return (sig, ["uint256", "uint256", "address[]"] + tail,
+            lambda r: [_amt(r), _amt(r), _rand_path(r), _rand_addr(r), 2**32][:3 + len(tail)],
+            (lambda v: (_lo(v[2][0]), _lo(v[2][-1]), v[1], v[0])) if exact_out
+            else (lambda v: (_lo(v[2][0]), _lo(v[2][-1]), v[0], v[1])))
+
+def _v3_single(sig, deadline: bool, exact_out: bool):
+    tup = "(address,address,uint24,address," + ("uint256," if deadline else "") + "uint256,uint256,uint160)"
+    a = 5 if deadline else 4  # index of amountIn (exact in) / amountOut (exact out)
+
+    def build(r):
+        head = [_rand_addr(r), _rand_addr(r), 3000, _rand_addr(r)] + ([2**32] if deadline else [])
+        return [tuple(head + [_amt(r), _amt(r), 0])]
+
+    def expect(v):
+        t = v[0]
+        return (_lo(t[0]), _lo(t[1])) + ((t[a + 1], t[a]) if exact_out else (t[a], t[a + 1]))
+    return (sig + "(" + tup + ")", [tup], build, expect)
+
+def _v3_path_call(sig, deadline: bool, exact_out: bool):
+    tup = "(bytes,address," + ("uint256," if deadline else "") + "uint256,uint256)"
+    a = 3 if deadline else 2
+
+    def build(r):
+        return [tuple([_v3_path(r), _rand_addr(r)] + ([2**32] if deadline else []) + [_amt(r), _amt(r)])]
+
+    def expect(v):
+        t = v[0]
+        first, last = _v3_ends(t[0])
+        return (last, first, t[a + 1], t[a]) if exact_out else (first, last, t[a], t[a + 1])
+    return (sig + "(" + tup + ")", [tup], build, expect)
+
+_NOT_A_SWAP = _sel("refundETH()")
+
+def _inner_calls(r: random.Random) -> List[bytes]:
+    """A multicall body: optionally a non-swap call first, then one or two swaps (the first one counts)."""
+    calls = [_NOT_A_SWAP] if r.random() < 0.5 else []
+    for _ in range(r.choice((1, 2))):
+        sig, types, build, _ = r.choice(_LEAF_CASES)
+        calls.append(_sel(sig) + abi_encode(types, build(r)))
+    if r.random() < 0.2:  # one level of nesting
+        calls[-1] = _sel("multicall(bytes[])") + abi_encode(["bytes[]"], [[calls[-1]]])
+    return calls
+
+def _expect_call(data: bytes):
+    entry = _ROUNDTRIP_BY_SEL.get(data[:4])
+    if entry is None:
+        return None
+    types, expect = entry
+    return expect(abi_decode(types, data[4:]))
+
+def _first_expected(calls: List[bytes]):
+    return next(filter(None, map(_expect_call, calls)), None)
+
+# Universal Router: (command, input types, expect(input vals))
+_UR_SWAPS = {
+    ww.UR_V3_SWAP_EXACT_IN: (["address", "uint256", "uint256", "bytes", "bool"],
+                             lambda v: _v3_ends(v[3]) + (None if v[1] == ww.UR_CONTRACT_BALANCE else v[1], v[2])),
+    ww.UR_V3_SWAP_EXACT_OUT: (["address", "uint256", "uint256", "bytes", "bool"],
+                              lambda v: _v3_ends(v[3])[::-1] + (v[2], v[1])),
+    ww.UR_V2_SWAP_EXACT_IN: (["address", "uint256", "uint256", "address[]", "bool"],
+                             lambda v: (_lo(v[3][0]), _lo(v[3][-1]), None if v[1] == ww.UR_CONTRACT_BALANCE else v[1], v[2])),
+    ww.UR_V2_SWAP_EXACT_OUT: (["address", "uint256", "uint256", "address[]", "bool"],
+                              lambda v: (_lo(v[3][0]), _lo(v[3][-1]), v[2], v[1])),
+}
+UR_WRAP_ETH = 0x0b
+
+def _ur_build(r: random.Random, deadline: bool):
+    commands, inputs = [], []
+    if r.random() < 0.5:
+        commands.append(UR_WRAP_ETH)
+        inputs.append(abi_encode(["address", "uint256"], [_rand_addr(r), ww.UR_CONTRACT_BALANCE]))
+    for _ in range(r.choice((1, 2))):
+        command = r.choice(list(_UR_SWAPS))
+        amount = ww.UR_CONTRACT_BALANCE if r.random() < 0.2 else _amt(r)
+        path = _v3_path(r) if command in (ww.UR_V3_SWAP_EXACT_IN, ww.UR_V3_SWAP_EXACT_OUT) else _rand_path(r)
+        commands.append(command | (0x80 if r.random() < 0.2 else 0))  # allow-revert flag is masked off
+        inputs.append(abi_encode(_UR_SWAPS[command][0], [_rand_addr(r), amount, _amt(r), path, True]))
+    return [bytes(commands), inputs] + ([2**32] if deadline else [])
+
+def _ur_expect(v):
+    for command, inp in zip(v[0], v[1]):
+        entry = _UR_SWAPS.get(command & ww.UR_COMMAND_MASK)
+        if entry:
+            return entry[1](abi_decode(entry[0], inp))
+    return None
+
+_LEAF_CASES = [
+    _v2_eth_in("swapExactETHForTokens(uint256,address[],address,uint256)"),
+    _v2_eth_in("swapExactETHForTokensSupportingFeeOnTransferTokens(uint256,address[],address,uint256)"),
+    _v2_eth_in("swapETHForExactTokens(uint256,address[],address,uint256)"),
+    _v2_tokens("swapExactTokensForTokens(uint256,uint256,address[],address,uint256)", False),
+    _v2_tokens("swapExactTokensForTokensSupportingFeeOnTransferTokens(uint256,uint256,address[],address,uint256)", False),
+    _v2_tokens("swapExactTokensForETH(uint256,uint256,address[],address,uint256)", False),
+    _v2_tokens("swapExactTokensForETHSupportingFeeOnTransferTokens(uint256,uint256,address[],address,uint256)", False),
+    _v2_tokens("swapExactTokensForTokens(uint256,uint256,address[],address)", False),
+    _v2_tokens("swapTokensForExactTokens(uint256,uint256,address[],address,uint256)", True),
+    _v2_tokens("swapTokensForExactETH(uint256,uint256,address[],address,uint256)", True),
+    _v2_tokens("swapTokensForExactTokens(uint256,uint256,address[],address)", True),
+    _v3_single("exactInputSingle", True, False),
+    _v3_single("exactInputSingle", False, False),
+    _v3_single("exactOutputSingle", True, True),
+    _v3_single("exactOutputSingle", False, True),
+    _v3_path_call("exactInput", True, False),
+    _v3_path_call("exactInput", False, False),
+    _v3_path_call("exactOutput", True, True),
+    _v3_path_call("exactOutput", False, True),
+]
+
+ROUNDTRIP_CASES = _LEAF_CASES + [
+    ("multicall(bytes[])", ["bytes[]"],
+     lambda r: [_inner_calls(r)], lambda v: _first_expected(v[0])),
+    ("multicall(uint256,bytes[])", ["uint256", "bytes[]"],
+     lambda r: [2**32, _inner_calls(r)], lambda v: _first_expected(v[1])),
+    ("multicall(bytes32,bytes[])", ["bytes32", "bytes[]"],
+     lambda r: [r.randbytes(32), _inner_calls(r)], lambda v: _first_expected(v[1])),
+    ("execute(bytes,bytes[],uint256)", ["bytes", "bytes[]", "uint256"],
+     lambda r: _ur_build(r, True), _ur_expect),
+    ("execute(bytes,bytes[])", ["bytes", "bytes[]"],
+     lambda r: _ur_build(r, False), _ur_expect),
+]
+_ROUNDTRIP_BY_SEL = {_sel(sig): (types, expect) for sig, types, _, expect in ROUNDTRIP_CASES}
+
+def check_roundtrip(rng: random.Random, per_case: int = 50) -> int:
+    """Assert the zero-copy decoders agree with eth-abi on every registered signature; returns cases checked."""
+    missing = set(ww._DECODERS) - {int.from_bytes(s, "big") for s in _ROUNDTRIP_BY_SEL}
+    assert not missing, f"decoders without a round-trip case: {[ww._DECODERS[m][0] for m in missing]}"
+    for sig, types, build, _ in ROUNDTRIP_CASES:
+        for _ in range(per_case):
+            data = _sel(sig) + abi_encode(types, build(rng))
+            got = ww.parse_uniswap_call(data)
+            want = _expect_call(data)
+            assert want is not None and got is not None, sig
+            assert (got["token_in"], got["token_out"], got["amount_in"], got["amount_out_min"]) == want, (sig, got, want)
+    return len(ROUNDTRIP_CASES) * per_case
+
+def _legacy_decode(inp: str, table: dict):
+    """The pre-zero-copy path: hex -> bytes -> hex selector -> bytes again -> eth-abi -> checksum."""
+    input_data = bytes.fromhex(inp[2:])
+    sig = input_data[:4].hex()
+    entry = table.get(sig)
+    if entry is None:
+        return None
+    types, extract = entry
+    data = input_data[4:]
+    vals = abi_decode(types, bytes.fromhex(data.hex()))
+    token_in, token_out = extract(vals)
+    return Web3.to_checksum_address(token_in), Web3.to_checksum_address(token_out)
+
+def _zero_copy_decode(inp: str):
+    if not ww.is_known_selector(inp):
+        return None
+    return ww.parse_uniswap_call(bytes.fromhex(inp[2:]))
+
+def _time_per_item(fn, items, repeat: int = 3) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.process_time()
+        for x in items:
+            fn(x)
+        best = min(best, time.process_time() - t0)
+    return best / len(items)
+
+def bench_decode(args):
+    rng = random.Random(args.seed)
+    legacy_table = {_sel(sig).hex(): (types, extract) for sig, types, _, extract in DECODE_CASES}
+    corpus = []
+    for i in range(args.n):
+        if i % 5 == 4:
+            # router calls we don't decode (approve etc.) still cost a selector lookup
+            corpus.append("0x095ea7b3" + rng.randbytes(64).hex())
+            continue
+        sig, types, build, _ = DECODE_CASES[i % len(DECODE_CASES)]
+        corpus.append("0x" + (_sel(sig) + abi_encode(types, build(rng))).hex())
+
+    # both paths must agree before their timings mean anything
+    for inp in corpus[:200]:
+        old, new = _legacy_decode(inp, legacy_table), _zero_copy_decode(inp)
+        assert (old is None) == (new is None), inp
+        if old:
+            assert old == (Web3.to_checksum_address(new["token_in"]), Web3.to_checksum_address(new["token_out"])), inp
+    checked = check_roundtrip(rng)
+
+    legacy = _time_per_item(lambda x: _legacy_decode(x, legacy_table), corpus)
+    zero_copy = _time_per_item(_zero_copy_decode, corpus)
+    print(f"decode: {len(corpus)} router txs ({len(DECODE_CASES)} methods + 20% unknown selectors), CPU time per tx")
+    print(f"  legacy (eth-abi + hex round-trips + checksum): {legacy * 1e6:8.2f} us")
+    print(f"  zero-copy (memoryview words, lazy checksum):   {zero_copy * 1e6:8.2f} us")
+    print(f"  speedup: {legacy / zero_copy:.1f}x")
+    print(f"  round-trip: {checked} eth-abi encoded calls over {len(ROUNDTRIP_CASES)} signatures decoded correctly")
+
+# -------------------- parse --------------------
+def _legacy_evm_frame(raw: str):
+    """Pre-fast-path evm_ws_sub: stdlib parse + dict lookups for every frame."""
+    msg = json.loads(raw)
+    if msg.get("method") == "eth_subscription":
+        res = msg.get("params", {}).get("result")
+        if isinstance(res, str):
+            return res if res.startswith("0x") and len(res) == 66 else None
+        if isinstance(res, dict) and res.get("hash"):
+            return res["hash"]
+    return None
+
+def _fast_evm_frame(raw: str):
+    h = ww.fast_pending_hash(raw)
+    if h is not None:
+        return h
+    msg = ww.json_loads(raw)
+    res = msg.get("params", {}).get("result") if msg.get("method") == "eth_subscription" else None
+    return res["hash"] if isinstance(res, dict) else None
+
+def _legacy_sol_frame(raw: str):
+    msg = json.loads(raw)
+    params = msg["params"]
+    res = params["result"]
+    value = res.get("value", res)
+    return params.get("subscription"), value.get("signature"), value.get("err")
+
+def _fast_sol_frame(raw: str):
+    fast = ww.fast_logs_notification(raw)
+    if fast is None:
+        return _legacy_sol_frame(raw)
+    sub, value = fast
+    return sub, value.get("signature"), value.get("err")
+
+def _frames(rng: random.Random, n: int):
+    compact = dict(separators=(",", ":"))
+    hashes, fulls, sols = [], [], []
+    for i in range(n):
+        h = "0x" + rng.randbytes(32).hex()
+        hashes.append(json.dumps({"jsonrpc": "2.0", "method": "eth_subscription",
+                                  "params": {"subscription": "0x" + rng.randbytes(16).hex(), "result": h}}, **compact))
+        tx = {"hash": h, "from": "0x" + rng.randbytes(20).hex(), "to": "0x" + rng.randbytes(20).hex(),
+              "value": hex(rng.randrange(10**20)), "gas": "0x5208", "nonce": hex(i), "type": "0x2",
+              "input": "0x" + rng.randbytes(rng.choice((0, 68, 260, 900))).hex()}
+        fulls.append(json.dumps({"jsonrpc": "2.0", "method": "eth_subscription",
+                                 "params": {"subscription": "0x1", "result": tx}}, **compact))
+        logs = [f"Program {rng.randbytes(16).hex()} invoke [{d}]" for d in range(1, 4)]
+        logs += [f"Program log: Instruction: Swap amount_in={rng.randrange(10**12)}" for _ in range(rng.randrange(5, 40))]
+        sols.append(json.dumps({"jsonrpc": "2.0", "method": "logsNotification",
+                                "params": {"result": {"context": {"slot": rng.randrange(10**9)},
+                                                      "value": {"signature": rng.randbytes(40).hex(), "err": None, "logs": logs}},
+                                           "subscription": rng.randrange(10**5)}}, **compact))
+    return hashes, fulls, sols
+
+def bench_parse(args):
+    rng = random.Random(args.seed)
+    hashes, fulls, sols = _frames(rng, args.n)
+    for legacy, fast, frames in ((_legacy_evm_frame, _fast_evm_frame, hashes), (_legacy_evm_frame, _fast_evm_frame, fulls),
+                                 (_legacy_sol_frame, _fast_sol_frame, sols)):
+        for raw in frames[:200]:
+            assert legacy(raw) == fast(raw), raw
+    print(f"parse: {args.n} frames per kind, json backend={ww.JSON_BACKEND}, frames/s per core (CPU time)")
+    print(f"  {'frame kind':<28} {'stdlib json':>14} {'fast layer':>14} {'speedup':>8}")
+    for label, legacy, fast, frames in (("EVM hash notification", _legacy_evm_frame, _fast_evm_frame, hashes),
+                                        ("EVM full-tx notification", _legacy_evm_frame, _fast_evm_frame, fulls),
+                                        ("Solana logsNotification", _legacy_sol_frame, _fast_sol_frame, sols)):
+        old, new = _time_per_item(legacy, frames), _time_per_item(fast, frames)
+        print(f"  {label:<28} {1 / old:14,.0f} {1 / new:14,.0f} {old / new:7.1f}x")
+
+# -------------------- replay --------------------
+WATCHER = os.path.join(os.path.dirname(os.path.abspath(__file__)), "whale_watcher.py")
+
+class Recording:
+    """A `--record` capture: config header, ws segments per source (one per connection), RPC results, prices."""
+    def __init__(self, path: str):
+        self.config: dict = {}
+        self.segments: Dict[str, List[dict]] = defaultdict(list)  # src -> [{"outs": [...], "frames": [(t, raw)]}]
+        self.rpc: Dict[Tuple[str, str], List[Tuple[object, float]]] = defaultdict(list)
+        self.price: dict = {}
+        with gzip.open(path, "rt", encoding="utf-8") as f:
+            for line in f:
+                r = json.loads(line)
+                k = r["k"]
+                if k == "in":
+                    self.segments[r["src"]][-1]["frames"].append((r["t"], r["raw"]))
+                elif k == "rpc":
+                    self.rpc[_rpc_key(r["method"], r["params"])].append((r["result"], r["dt"]))
+                elif k == "out":
+                    self.segments[r["src"]][-1]["outs"].append(r["raw"])
+                elif k == "open":
+                    self.segments[r["src"]].append({"outs": [], "frames": []})
+                elif k == "price":
+                    self.price = r["body"]
+                elif k == "meta":
+                    self.config = r["config"]
+
+    def frame_count(self) -> int:
+        return sum(len(seg["frames"]) for segs in self.segments.values() for seg in segs)
+
+def _rpc_key(method: str, params) -> Tuple[str, str]:
+    return method, json.dumps(params, sort_keys=True, separators=(",", ":"))
+
+def _first_params(raw: str):
+    try:
+        return json.loads(raw).get("params")
+    except (ValueError, AttributeError):
+        return None
+
+class ReplayServer:
+    """
+    Local stand-ins for everything the watcher talks to:
+      /ws/<chain>, /ws/solana  recorded frames, paced by their capture times / speed (0 = max)
+      /rpc                     recorded JSON-RPC results (single or batch), in capture order per call
+      /simple/price            the last recorded CoinGecko response
+      /discord                 accepts webhook posts
+    A recorded reconnect ends the served connection so the watcher reconnects into the next segment.
+    """
+    def __init__(self, rec: Recording, speed: float):
+        self.rec = rec
+        self.speed = speed
+        self._next: Dict[str, int] = defaultdict(int)   # src -> next segment to serve
+        self._rpc_pos: Dict[Tuple[str, str], int] = defaultdict(int)
+        self.total_segments = sum(len(v) for v in rec.segments.values())
+        self.done_segments = 0
+        self.connected = asyncio.Event()  # every recorded stream has a subscribed connection
+        self.go = asyncio.Event()         # playback starts once the driver has its baseline
+        self.all_done = asyncio.Event()
+        self.frames_sent = 0
+        self.rpc_hits = 0
+        self.rpc_misses = 0
+        self.discord_posts = 0
+        self.discord_embeds = 0
+        self._runner: Optional[web.AppRunner] = None
+        if not self.total_segments:
+            self.all_done.set()
+
+    async def start(self) -> int:
+        app = web.Application()
+        app.router.add_get("/ws/{src}", self._ws)
+        app.router.add_post("/rpc", self._rpc)
+        app.router.add_get("/simple/price", self._price)
+        app.router.add_post("/discord", self._discord)
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, "127.0.0.1", 0)
+        await site.start()
+        return site._server.sockets[0].getsockname()[1]
+
+    async def close(self):
+        if self._runner:
+            await self._runner.cleanup()
+
+    def _pick(self, path_src: str, first_out: Optional[str]) -> Optional[str]:
+        """EVM: the chain's own stream. Solana: the connection whose first subscribe matches the recording's."""
+        if path_src != "solana":
+            return path_src if self._next[path_src] < len(self.rec.segments.get(path_src, [])) else None
+        want = _first_params(first_out or "")
+        for src, segs in self.rec.segments.items():
+            i = self._next[src]
+            if src.startswith("solana") and i < len(segs) and segs[i]["outs"] and _first_params(segs[i]["outs"][0]) == want:
+                return src
+        return None
+
+    async def _ws(self, request):
+        ws = web.WebSocketResponse(max_msg_size=0)
+        await ws.prepare(request)
+        first = await ws.receive()
+        src = self._pick(request.match_info["src"], first.data if first.type == WSMsgType.TEXT else None)
+        if src is None:
+            await ws.receive()  # nothing (left) to replay for this connection: idle until the client goes away
+            return ws
+        seg_idx = self._next[src]
+        self._next[src] += 1
+        if all(self._next[s] for s in self.rec.segments):
+            self.connected.set()
+        drain = asyncio.ensure_future(self._drain(ws))
+        await self.go.wait()
+        try:
+            frames = self.rec.segments[src][seg_idx]["frames"]
+            loop = asyncio.get_running_loop()
+            start = loop.time()
+            t_first = frames[0][0] if frames else 0.0
+            for t, raw in frames:
+                if self.speed:
+                    delay = (t - t_first) / self.speed - (loop.time() - start)
+                    if delay > 0:
+                        await asyncio.sleep(delay)
+                await ws.send_str(raw)
+                self.frames_sent += 1
+        finally:
+            self.done_segments += 1
+            if self.done_segments >= self.total_segments:
+                self.all_done.set()
+        if seg_idx + 1 < len(self.rec.segments[src]):
+            await ws.close()  # the recording reconnected here
+        else:
+            await drain
+        drain.cancel()
+        return ws
+
+    @staticmethod
+    async def _drain(ws):
+        async for _ in ws:
+            pass
+
+    async def _rpc(self, request):
+        body = await request.json()
+        reqs = body if isinstance(body, list) else [body]
+        out = []
+        latency = 0.0
+        for r in reqs:
+            key = _rpc_key(r.get("method"), r.get("params") or [])
+            answers = self.rec.rpc.get(key)
+            result = None
+            if answers:
+                pos = self._rpc_pos[key]
+                result, dt = answers[min(pos, len(answers) - 1)]
+                self._rpc_pos[key] = pos + 1
+                latency = max(latency, dt)
+                self.rpc_hits += 1
+            else:
+                self.rpc_misses += 1
+            out.append({"jsonrpc": "2.0", "id": r.get("id"), "result": result})
+        if self.speed and latency:
+            await asyncio.sleep(latency / self.speed)
+        return web.json_response(out if isinstance(body, list) else out[0])
+
+    async def _price(self, request):
+        return web.json_response(self.rec.price)
+
+    async def _discord(self, request):
+        body = await request.json()
+        self.discord_posts += 1
+        self.discord_embeds += len(body.get("embeds") or [])
+        return web.Response(status=204)
+
+def replay_config(recorded: dict, base: str, metrics_port: int, workdir: str) -> dict:
+    """The recorded config pointed at the stand-ins, with all state files in a scratch dir."""
+    cfg = json.loads(json.dumps(recorded))
+    for name, cc in (cfg.get("chains") or {}).items():
+        if isinstance(cc.get("ws"), list) and len(cc["ws"]) > 1:
+            # racing providers were recorded per provider, under the labels the watcher derived from their hosts
+            hosts = [e["url"] if isinstance(e, dict) else e for e in cc["ws"]]
+            cc["ws"] = [{**e, "url": f"ws://{base}/ws/{name}@{label}"} if isinstance(e, dict) else f"ws://{base}/ws/{name}@{label}"
+                        for e, label in zip(cc["ws"], ww.endpoint_labels(hosts))]
+        else:
+            cc["ws"] = f"ws://{base}/ws/{name}"
+        cc["http"] = f"http://{base}/rpc"
+    if cfg.get("solana"):
+        cfg["solana"]["wss"] = f"ws://{base}/ws/solana"
+        cfg["solana"]["http"] = f"http://{base}/rpc"
+    cfg.setdefault("prices", {})["url"] = f"http://{base}/simple/price"
+    cfg["outbox"] = {"path": ""}
+    cfg["token_cache"] = {"path": os.path.join(workdir, "token_meta.sqlite3")}
+    if "autolearn" in cfg:
+        cfg["autolearn"]["state_file"] = os.path.join(workdir, "autolearn_state.json")
+        cfg["autolearn"]["learned_file"] = os.path.join(workdir, "learned_whales.txt")
+    cfg["metrics"] = {"host": "127.0.0.1", "port": metrics_port}
+    return cfg
+
+_SAMPLE = re.compile(r'^([a-zA-Z_:][a-zA-Z0-9_:]*)(?:\{(.*)\})? (\S+)$')
+_LABEL = re.compile(r'(\w+)="((?:[^"\\]|\\.)*)"')
+
+def parse_metrics(text: str) -> Dict[Tuple[str, frozenset], float]:
+    out = {}
+    for line in text.splitlines():
+        m = _SAMPLE.match(line)
+        if m:
+            out[(m.group(1), frozenset(_LABEL.findall(m.group(2) or "")))] = float(m.group(3))
+    return out
+
+def _delta(final: dict, base: dict) -> dict:
+    return {k: v - base.get(k, 0.0) for k, v in final.items()}
+
+def histogram_quantiles(samples: dict, name: str, qs=(0.5, 0.9, 0.99)) -> Dict[frozenset, Tuple[int, List[float]]]:
+    """Per label set: (count, [quantile estimates]) by linear interpolation inside the bucket."""
+    buckets: Dict[frozenset, List[Tuple[float, float]]] = defaultdict(list)
+    for (n, labels), v in samples.items():
+        if n == name + "_bucket":
+            le = dict(labels)["le"]
+            buckets[frozenset(l for l in labels if l[0] != "le")].append((float("inf") if le == "+Inf" else float(le), v))
+    out = {}
+    for labels, bs in buckets.items():
+        bs.sort()
+        total = bs[-1][1]
+        if total <= 0:
+            continue
+        est = []
+        for q in qs:
+            rank, prev_bound, prev_cum = q * total, 0.0, 0.0
+            for bound, cum in bs:
+                if cum >= rank:
+                    if bound == float("inf"):
+                        est.append(prev_bound)
+                    else:
+                        frac = (rank - prev_cum) / (cum - prev_cum) if cum > prev_cum else 1.0
+                        est.append(prev_bound + (bound - prev_bound) * frac)
+                    break
+                prev_bound, prev_cum = bound, cum
+        out[labels] = (int(total), est)
+    return out
+
+async def _scrape(session: ClientSession, url: str) -> Dict[Tuple[str, frozenset], float]:
+    async with session.get(url) as r:
+        return parse_metrics(await r.text())
+
+def _sum(samples: dict, name: str, **match) -> float:
+    return sum(v for (n, labels), v in samples.items()
+               if n == name and all((k, val) in labels for k, val in match.items()))
+
+async def _wait_idle(session: ClientSession, url: str, server: ReplayServer, timeout: float) -> Tuple[dict, float]:
+    """
+    Once every stream is sent, wait until queues are empty and no counter moves for 2s.
+    Returns the final metrics and the monotonic time progress last changed (the end of the run).
+    """
+    deadline = time.monotonic() + timeout
+    await asyncio.wait_for(server.all_done.wait(), max(1.0, deadline - time.monotonic()))
+    last, still, last_change = None, 0, time.monotonic()
+    while time.monotonic() < deadline:
+        await asyncio.sleep(0.1)
+        m = await _scrape(session, url)
+        busy = _sum(m, "whale_queue_depth") + _sum(m, "whale_discord_queue_depth")
+        progress = _sum(m, "whale_pipeline_events_total") + _sum(m, "whale_discord_posts_total")
+        if busy == 0 and progress == last:
+            still += 1
+        else:
+            still, last_change = 0, time.monotonic()
+        last = progress
+        if still >= 20:
+            return m, last_change
+    print("[replay][WARN] timed out waiting for the pipeline to drain")
+    return await _scrape(session, url), time.monotonic()
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+async def _replay(args):
+    rec = Recording(args.file)
+    speed = 0.0 if args.speed == "max" else float(args.speed)
+    print(f"replay: {args.file} | {rec.frame_count()} frames in {len(rec.segments)} stream(s), "
+          f"{sum(len(v) for v in rec.rpc.values())} RPC results | speed={args.speed}")
+    server = ReplayServer(rec, speed)
+    base = f"127.0.0.1:{await server.start()}"
+    metrics_port = _free_port()
+    metrics_url = f"http://127.0.0.1:{metrics_port}/metrics"
+    workdir = tempfile.mkdtemp(prefix="ww-replay-")
+    cfg_path = os.path.join(workdir, "config.yaml")
+    with open(cfg_path, "w", encoding="utf-8") as f:
+        yaml.safe_dump(replay_config(rec.config, base, metrics_port, workdir), f, sort_keys=False)
+    env = dict(os.environ, DISCORD_WEBHOOK_URL=f"http://{base}/discord", PYTHONUNBUFFERED="1")
+    log_path = os.path.join(workdir, "watcher.log")
+    with open(log_path, "wb") as log:
+        proc = await asyncio.create_subprocess_exec(
+            sys.executable, WATCHER, "--config", cfg_path, env=env,
+            stdout=None if args.verbose else log, stderr=None if args.verbose else log,
+        )
+    try:
+        async with ClientSession() as session:
+            try:
+                await asyncio.wait_for(server.connected.wait(), 60)
+            except asyncio.TimeoutError:
+                print("[replay][WARN] not every recorded stream connected; replaying the ones that did")
+            base_m = await _scrape(session, metrics_url)
+            server.go.set()
+            t0 = time.monotonic()
+            final_m, t_end = await _wait_idle(session, metrics_url, server, args.timeout)
+            wall = max(t_end - t0, 1e-3)
+    finally:
+        if proc.returncode is None:
+            proc.send_signal(signal.SIGINT)
+            try:
+                await asyncio.wait_for(proc.wait(), 10)
+            except asyncio.TimeoutError:
+                proc.kill()
+        await server.close()
+    _report(base_m, final_m, wall, server, log_path)
+
+def _report(base_m: dict, final_m: dict, wall: float, server: ReplayServer, log_path: str):
+    d = _delta(final_m, base_m)
+    print(f"  wall {wall:.2f}s | frames sent {server.frames_sent} | rpc hits {server.rpc_hits} misses {server.rpc_misses} "
+          f"| discord {server.discord_posts} post(s) / {server.discord_embeds} embed(s)")
+    events: Dict[str, Dict[str, float]] = defaultdict(dict)
+    for (n, labels), v in d.items():
+        if n == "whale_pipeline_events_total":
+            lab = dict(labels)
+            events[lab["chain"]][lab["event"]] = v
+    for chain, ev in sorted(events.items()):
+        intake = ev.get("recv", ev.get("candidates", 0))
+        detail = " ".join(f"{k}={v:.0f}" for k, v in ev.items())
+        print(f"  {chain:<10} {intake / wall if wall else 0:9.1f} tx/s | {detail}")
+    print("  latency ms            count      p50      p90      p99")
+    for name, label in (("whale_queue_wait_seconds", "queue_wait"), ("whale_rpc_fetch_seconds", "rpc_fetch"),
+                        ("whale_process_seconds", "process"), ("whale_alert_seconds", "alert"),
+                        ("whale_discord_post_seconds", "discord_post")):
+        for labels, (count, est) in sorted(histogram_quantiles(d, name).items(), key=lambda kv: sorted(kv[0])):
+            chain = dict(labels).get("chain")
+            tag = f"{label}[{chain}]" if chain else label
+            print(f"  {tag:<20} {count:7d} " + " ".join(f"{q * 1000:8.2f}" for q in est))
+    cpu = _sum(d, "whale_process_cpu_seconds_total")
+    rss = _sum(final_m, "whale_process_peak_rss_bytes")
+    print(f"  cpu {cpu:.2f}s ({cpu / wall:.0%} of one core) | peak rss {rss / 2**20:.1f} MiB | watcher log: {log_path}")
+
+def bench_replay(args):
+    asyncio.run(_replay(args))
+
+def main():
+    ap = argparse.ArgumentParser(description="whale_watcher microbenchmarks")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    p = sub.add_parser("decode", help="calldata decode cost per tx")
+    p.add_argument("--n", type=int, default=20000)
+    p.add_argument("--seed", type=int, default=1)
+    p.set_defaults(fn=bench_decode)
+    p = sub.add_parser("parse", help="websocket frame parse cost")
+    p.add_argument("--n", type=int, default=50000)
+    p.add_argument("--seed", type=int, default=1)
+    p.set_defaults(fn=bench_parse)
+    p = sub.add_parser("replay", help="replay a --record capture through whale_watcher.py")
+    p.add_argument("file", help="capture written by `whale_watcher.py --record`")
+    p.add_argument("--speed", default="max", help="1 = real time, N = N times faster, max = no pacing")
+    p.add_argument("--timeout", type=float, default=600, help="give up waiting for the pipeline to drain")
+    p.add_argument("--verbose", action="store_true", help="show the watcher's output instead of logging it")
+    p.set_defaults(fn=bench_replay)
+    args = ap.parse_args()
+    args.fn(args)
+
+if __name__ == "__main__":
+    main()
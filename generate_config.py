@@ -10,6 +10,19 @@ DEFAULT_SOL_PROGRAMS = [
     "JUP6LkbZbjS1jKKwapdHNy74zcZ3tLUZoi5QNyVTaV4",  # Jupiter swap
 ]
 
+# DEX routers watched per chain (mock_rpc.py aims its synthetic router traffic at the same list)
+ROUTERS = {
+    "ethereum": [
+        {"name":"UniswapV2", "address":"0x7a250d5630B4cF539739dF2C5dAcb4c659F2488D"},
+        {"name":"UniswapV3_SwapRouter02", "address":"0x68b3465833fb72A70ecDF485E0e4C7bD8665Fc45"},
+        {"name":"UniversalRouter", "address":"0x3fC91A3afd70395Cd496C647d5a6CC9D4B2b7FAD"}
+    ],
+    "base": [
+        {"name":"UniswapV3_Base", "address":"0x2626664c2603336E57B271c5C0b26F421741e481"},
+        {"name":"UniversalRouter_Base", "address":"0x3fC91A3afd70395Cd496C647d5a6CC9D4B2b7FAD"}
+    ],
+}
+
 def env(name, default=None, required=False):
     v = os.getenv(name, default)
     if required and not v:
@@ -21,16 +34,28 @@ def csv_env(name):
     v = os.getenv(name, "")
     return [x.strip() for x in v.split(",") if x.strip()]
 
+def urls_env(name):
+    """One endpoint URL, or several comma-separated ones (raced/failed over by the watcher) as a list."""
+    urls = csv_env(name)
+    if not urls:
+        print(f"[generate_config] Missing required env: {name}", file=sys.stderr)
+        sys.exit(1)
+    return urls[0] if len(urls) == 1 else urls
+
 def main():
     ap = argparse.ArgumentParser()
     ap.add_argument("--out", required=True)
     args = ap.parse_args()
 
-    # EVM RPC (WS + HTTP)
-    ETH_WS   = env("ETH_WS",   required=True)
-    ETH_HTTP = env("ETH_HTTP", required=True)
-    BASE_WS  = env("BASE_WS",  required=True)
-    BASE_HTTP= env("BASE_HTTP",required=True)
+    # EVM RPC (WS + HTTP); comma-separate several providers to race them
+    ETH_WS   = urls_env("ETH_WS")
+    ETH_HTTP = urls_env("ETH_HTTP")
+    BASE_WS  = urls_env("BASE_WS")
+    BASE_HTTP= urls_env("BASE_HTTP")
+
+    # Pending-tx subscription mode: hashes | full | alchemy
+    ETH_PENDING_MODE  = env("ETH_PENDING_MODE", "hashes")
+    BASE_PENDING_MODE = env("BASE_PENDING_MODE", "hashes")
 
     # Solana RPC (Helius)
     SOL_WSS  = env("HELIUS_WS",  required=True)   # e.g. wss://mainnet.helius-rpc.com/?api-key=XXXXX
@@ -52,29 +77,49 @@ def main():
     AUTO_MAX_DAILY = int(env("AUTOLEARN_MAX_NEW_PER_DAY", "5"))
     AUTO_STATE     = env("AUTOLEARN_STATE_FILE", "/data/autolearn_state.json")
     AUTO_PERSIST   = env("AUTOLEARN_PERSIST_TO_CONFIG", "true").lower() in ("1","true","yes")
+    AUTO_LEARNED   = env("AUTOLEARN_LEARNED_FILE", "/data/learned_whales.txt")
+
+    # Durable alert outbox (empty path disables)
+    OUTBOX_PATH    = env("OUTBOX_PATH", "/data/alert_outbox.sqlite3")
+    # Prometheus-style /metrics endpoint (port 0 disables)
+    METRICS_HOST   = env("METRICS_HOST", "127.0.0.1")
+    METRICS_PORT   = int(env("METRICS_PORT", "9108"))
+    # ERC-20 decimals/symbol cache shared by all EVM chains
+    TOKEN_CACHE    = env("TOKEN_CACHE_PATH", "/data/token_meta.sqlite3")
 
+    # Optional per-chain pipeline keys (defaults apply when omitted):
+    #   queue_size (10000)          bound on the fetch / score stage queues. Under drop_oldest and
+    #                               drop_non_router, router txs never wait: they may use up to queue_size
+    #                               extra slots, so a stage can hold up to 2 x queue_size items.
+    #   overflow_policy (drop_oldest)  block | drop_oldest | drop_non_router
+    #   alert_queue_size (1000)     accepted txs waiting for an alert worker (same 2x headroom for alerts
+    #                               that need no pricing)
     cfg = {
         "chains": {
             "ethereum": {
                 "ws": ETH_WS,
                 "http": ETH_HTTP,
+                "pending_mode": ETH_PENDING_MODE,
                 "explorer": "https://etherscan.io/tx/",
                 "native_symbol": "ETH",
                 "native_coingecko": "ethereum",
-                "routers": [
-                    {"name":"UniswapV2", "address":"0x7a250d5630B4cF539739dF2C5dAcb4c659F2488D"},
-                    {"name":"UniswapV3_SwapRouter02", "address":"0x68b3465833fb72A70ecDF485E0e4C7bD8665Fc45"}
-                ],
+                "wrapped_native": "0xC02aaA39b223FE8D0A0e5C4F27eAD9083C756Cc2",
+                "v2_factory": "0x5C69bEe701ef814a2B6a3EDD4B1652CB9cc5aA6f",
+                "v3_factory": "0x1F98431c8aD98523631AE4a59f267346ea31F984",
+                "routers": ROUTERS["ethereum"],
             },
             "base": {
                 "ws": BASE_WS,
                 "http": BASE_HTTP,
+                "pending_mode": BASE_PENDING_MODE,
                 "explorer": "https://basescan.org/tx/",
                 "native_symbol": "ETH",
                 "native_coingecko": "ethereum",
-                "routers": [
-                    {"name":"UniswapV3_Base", "address":"0x2626664c2603336E57B271c5C0b26F421741e481"}
-                ],
+                "wrapped_native": "0x4200000000000000000000000000000000000006",
+                "v2_factory": "0x8909Dc15e40173Ff4699343b6eB8132c65e18eC6",
+                "v3_factory": "0x33128a8fC17869897dcE68Ed026d694621f6FDfD",
+                "token_price_ttl": 2,
+                "routers": ROUTERS["base"],
             },
         },
         "solana": {
@@ -93,8 +138,12 @@ def main():
             "window_hours": AUTO_WINDOW_H,
             "max_new_per_day": AUTO_MAX_DAILY,
             "state_file": AUTO_STATE,
-            "persist_to_config": AUTO_PERSIST,
+            "persist_to_config": AUTO_PERSIST,  # appends to learned_file, merged into whales_evm at load
+            "learned_file": AUTO_LEARNED,
         },
+        "outbox": {"path": OUTBOX_PATH, "keep_days": 7},
+        "token_cache": {"path": TOKEN_CACHE, "warm_days": 7},
+        "metrics": {"host": METRICS_HOST, "port": METRICS_PORT},
     }
 
     Path(args.out).parent.mkdir(parents=True, exist_ok=True)
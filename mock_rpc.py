@@ -0,0 +1,389 @@
+# mock_rpc.py
+# Local stand-in for EVM/Solana providers and the Discord webhook, for load-testing whale_watcher
+# (reconnects, batching, backpressure) without spending provider credits.
+#
+#   python mock_rpc.py --port 8545 --evm-rate 2000 --router-ratio 0.05 --sol-rate 200 --discord-429-every 5
+#   (faults: --latency-ms/--jitter-ms on HTTP RPC, --ws-latency-ms/--ws-jitter-ms/--ws-drop-ratio on
+#    subscription frames, --rpc-error-ratio, --disconnect-every)
+#
+# Point a config at it (whale_watcher.py itself needs no changes):
+#   chains.<name>.ws   ws://127.0.0.1:8545/evm/<name>     (eth_subscribe: hashes, full txs, alchemy with its
+#                                                          toAddress/hashesOnly options; router txs target
+#                                                          generate_config.py's routers for <name>)
+#   chains.<name>.http http://127.0.0.1:8545/evm/<name>   (eth_getTransactionByHash single/batch, eth_chainId)
+#   solana.wss         ws://127.0.0.1:8545/solana          (logsSubscribe -> logsNotification)
+#   solana.http        http://127.0.0.1:8545/solana        (getTransaction)
+#   prices.url         http://127.0.0.1:8545/simple/price
+#   DISCORD_WEBHOOK_URL=http://127.0.0.1:8545/discord
+
+import argparse
+import asyncio
+import json
+import random
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional
+
+from aiohttp import WSMsgType, web
+
+from generate_config import ROUTERS
+
+# router txs go to the routers a generated config watches on that chain (any of them on other chains)
+CHAIN_ROUTERS = {chain: [r["address"].lower() for r in rs] for chain, rs in ROUTERS.items()}
+ALL_ROUTERS = sorted({a for rs in CHAIN_ROUTERS.values() for a in rs})
+WETH = "c02aaa39b223fe8d0a0e5c4f27ead9083c756cc2"
+SEL_SWAP_EXACT_ETH_FOR_TOKENS = "7ff36ab5"  # swapExactETHForTokens(uint256,address[],address,uint256)
+PRICES = {"ethereum": 3000.0, "solana": 150.0}
+MULTICALL3 = "0xca11bde05779ba9821e6aa5fd60a6a1d2f1b6c1b"
+SEL_TRY_BLOCK_AGGREGATE = "399542e9"  # tryBlockAndAggregate(bool,(address,bytes)[])
+SEL_DECIMALS, SEL_SYMBOL = "313ce567", "95d89b41"
+
+def _word(n: int) -> str:
+    return f"{n:064x}"
+
+def _addr_word(a: str) -> str:
+    return a.rjust(64, "0")
+
+def _multicall_answer(data: bytes, block: int) -> str:
+    """tryBlockAndAggregate: decimals() -> 18, symbol() -> "MOCK", anything else (pool lookups) fails."""
+    word = lambda off: int.from_bytes(data[off:off + 32], "big")
+    arr = 4 + word(4 + 32)
+    n = word(arr)
+    results = []
+    for i in range(n):
+        item = arr + 32 + word(arr + 32 + 32 * i)
+        call = item + word(item + 32)
+        sel = data[call + 32:call + 36].hex()
+        if sel == SEL_DECIMALS:
+            results.append((True, _word(18)))
+        elif sel == SEL_SYMBOL:
+            results.append((True, _word(32) + _word(4) + b"MOCK".hex().ljust(64, "0")))
+        else:
+            results.append((False, ""))
+    heads, tails, off = [], [], 32 * n
+    for ok, ret in results:
+        heads.append(_word(off))
+        tail = _word(int(ok)) + _word(64) + _word(len(ret) // 2) + ret
+        tails.append(tail)
+        off += len(tail) // 2
+    return "0x" + _word(block) + _word(0) + _word(96) + _word(n) + "".join(heads) + "".join(tails)
+
+class MockChains:
+    """Synthetic mempool/log traffic plus the RPC state needed to answer for it."""
+    def __init__(self, args):
+        self.a = args
+        self.rng = random.Random(args.seed)
+        self.routers_override = [r.strip().lower() for r in args.routers.split(",") if r.strip()]
+        self.txs: "OrderedDict[str, dict]" = OrderedDict()     # hash -> tx, bounded
+        self.sol_txs: "OrderedDict[str, dict]" = OrderedDict()  # signature -> tx, bounded
+        self.stats: Dict[str, int] = {
+            "ws_clients": 0, "ws_disconnects": 0, "evm_notifications": 0, "evm_filtered": 0, "sol_notifications": 0,
+            "ws_dropped": 0,
+            "rpc_posts": 0, "rpc_calls": 0, "rpc_batches": 0, "rpc_errors": 0, "null_txs": 0,
+            "discord_posts": 0, "discord_embeds": 0, "discord_429": 0,
+        }
+        self._discord_window_start = time.monotonic()
+        self._discord_window_used = 0
+        self._sub_seq = 0
+
+    # ---- generators ----
+    def _hex(self, n: int) -> str:
+        return self.rng.getrandbits(n * 8).to_bytes(n, "big").hex()
+
+    def routers(self, chain: str) -> List[str]:
+        return self.routers_override or CHAIN_ROUTERS.get(chain) or ALL_ROUTERS
+
+    def new_evm_tx(self, chain: str = "") -> dict:
+        r = self.rng
+        h = "0x" + self._hex(32)
+        frm = "0x" + self._hex(20)
+        if r.random() < self.a.router_ratio:
+            big = r.random() < self.a.big_ratio
+            value = r.randrange(10, 500) * 10**18 if big else r.randrange(10**15, 10**18)
+            token = self._hex(20)
+            data = (SEL_SWAP_EXACT_ETH_FOR_TOKENS + _word(r.randrange(10**18)) + _word(128) + _addr_word(frm[2:])
+                    + _word(2**32) + _word(2) + _addr_word(WETH) + _addr_word(token))
+            tx = {"hash": h, "from": frm, "to": r.choice(self.routers(chain)), "value": hex(value), "input": "0x" + data}
+        else:
+            tx = {"hash": h, "from": frm, "to": "0x" + self._hex(20), "value": hex(r.randrange(10**18)), "input": "0x"}
+        tx.update({"nonce": hex(r.randrange(1000)), "gas": hex(210000), "type": "0x2"})
+        self.txs[h] = tx
+        while len(self.txs) > self.a.keep:
+            self.txs.popitem(last=False)
+        return tx
+
+    def new_sol_sig(self) -> str:
+        r = self.rng
+        sig = self._hex(32)
+        big = r.random() < self.a.sol_big_ratio
+        lamports = r.randrange(400, 5000) * 10**9 if big else r.randrange(10**7, 10**10)
+        signer = self._hex(16)
+        self.sol_txs[sig] = {
+            "slot": r.randrange(10**8),
+            "meta": {"err": None, "fee": 5000, "preBalances": [10**13, 0], "postBalances": [10**13 - lamports - 5000, lamports],
+                     "preTokenBalances": [], "postTokenBalances": []},
+            "transaction": {"message": {"accountKeys": [{"pubkey": signer, "signer": True, "writable": True},
+                                                        {"pubkey": self._hex(16), "signer": False, "writable": True}]}},
+        }
+        while len(self.sol_txs) > self.a.keep:
+            self.sol_txs.popitem(last=False)
+        return sig
+
+    # ---- RPC ----
+    def answer(self, req: dict) -> dict:
+        method, params = req.get("method"), req.get("params") or []
+        result = None
+        if method == "eth_getTransactionByHash":
+            result = self.txs.get(params[0]) if params else None
+            if result is not None and self.rng.random() < self.a.null_ratio:
+                result = None  # "already mined"
+            if result is None:
+                self.stats["null_txs"] += 1
+        elif method == "eth_chainId":
+            result = hex(self.a.chain_id)
+        elif method == "eth_blockNumber":
+            result = hex(int(time.time()) // 12)
+        elif method == "eth_call" and params and str(params[0].get("to", "")).lower() == MULTICALL3:
+            data = bytes.fromhex(params[0].get("data", "0x")[2:])
+            if data[:4].hex() == SEL_TRY_BLOCK_AGGREGATE:
+                result = _multicall_answer(data, int(time.time()) // 12)
+        elif method == "getTransaction":
+            result = self.sol_txs.get(params[0]) if params else None
+        self.stats["rpc_calls"] += 1
+        return {"jsonrpc": "2.0", "id": req.get("id"), "result": result}
+
+    async def rpc(self, request: web.Request) -> web.Response:
+        self.stats["rpc_posts"] += 1
+        await self._latency()
+        if self.rng.random() < self.a.rpc_error_ratio:
+            self.stats["rpc_errors"] += 1
+            return web.Response(status=503, text="mock: injected error")
+        try:
+            body = await request.json()
+        except (ValueError, ConnectionResetError):
+            return web.Response(status=400, text="mock: unreadable request")
+        if isinstance(body, list):
+            self.stats["rpc_batches"] += 1
+            return web.json_response([self.answer(r) for r in body])
+        return web.json_response(self.answer(body))
+
+    async def _latency(self):
+        ms = self.a.latency_ms + self.rng.uniform(-self.a.jitter_ms, self.a.jitter_ms)
+        if ms > 0:
+            await asyncio.sleep(ms / 1000)
+
+    # ---- websockets ----
+    @staticmethod
+    def _alchemy_filter(opts) -> Optional[set]:
+        """Lowercased alchemy_pendingTransactions toAddress filter; None = every tx."""
+        to = opts.get("toAddress") if isinstance(opts, dict) else None
+        if not to:
+            return None
+        return {a.lower() for a in ([to] if isinstance(to, str) else to)}
+
+    def _frame_sender(self, ws):
+        """(send, task): send() applies --ws-drop-ratio and --ws-latency-ms to a notification frame.
+        Delayed frames go through one FIFO writer per connection, so a slow link delays without reordering."""
+        a = self.a
+        if a.ws_latency_ms <= 0 and a.ws_jitter_ms <= 0:
+            outq = None
+        else:
+            outq = asyncio.Queue()
+        loop = asyncio.get_running_loop()
+
+        async def send(frame: str) -> bool:
+            if a.ws_drop_ratio and self.rng.random() < a.ws_drop_ratio:
+                self.stats["ws_dropped"] += 1
+                return False
+            if outq is None:
+                await ws.send_str(frame)
+            else:
+                delay = a.ws_latency_ms + self.rng.uniform(-a.ws_jitter_ms, a.ws_jitter_ms)
+                outq.put_nowait((loop.time() + max(0.0, delay) / 1000, frame))
+            return True
+
+        async def writer():
+            while True:
+                due, frame = await outq.get()
+                wait = due - loop.time()
+                if wait > 0:
+                    await asyncio.sleep(wait)
+                await ws.send_str(frame)
+
+        return send, (asyncio.create_task(writer()) if outq is not None else None)
+
+    async def ws(self, request: web.Request) -> web.StreamResponse:
+        if request.method == "POST":
+            return await self.rpc(request)
+        ws = web.WebSocketResponse(heartbeat=20, max_msg_size=0)
+        await ws.prepare(request)
+        self.stats["ws_clients"] += 1
+        solana = request.path.startswith("/solana")
+        parts = request.path.strip("/").split("/")
+        chain = parts[1] if len(parts) > 1 and parts[0] == "evm" else ""
+        subs: List = []  # EVM: (sub_id, full, to filter or None) ; Solana: sub ids
+        emitter: Optional[asyncio.Task] = None
+        send, writer = self._frame_sender(ws)
+        lifetime = self._lifetime()
+        closer = asyncio.get_running_loop().call_later(lifetime, lambda: asyncio.ensure_future(ws.close())) if lifetime else None
+        try:
+            async for msg in ws:
+                if msg.type != WSMsgType.TEXT:
+                    continue
+                req = json.loads(msg.data)
+                method = req.get("method")
+                self._sub_seq += 1
+                if method == "eth_subscribe":
+                    params = req.get("params") or []
+                    if params and params[0] == "alchemy_pendingTransactions":
+                        opts = params[1] if len(params) > 1 and isinstance(params[1], dict) else {}
+                        full, to = not opts.get("hashesOnly", False), self._alchemy_filter(opts)
+                    else:
+                        full, to = len(params) > 1 and params[1] is True, None
+                    sub_id = hex(self._sub_seq)
+                    subs.append((sub_id, full, to))
+                    await ws.send_str(json.dumps({"jsonrpc": "2.0", "id": req.get("id"), "result": sub_id}))
+                elif method == "logsSubscribe":
+                    subs.append(self._sub_seq)
+                    await ws.send_str(json.dumps({"jsonrpc": "2.0", "id": req.get("id"), "result": self._sub_seq}))
+                else:
+                    await ws.send_str(json.dumps(self.answer(req)))
+                if emitter is None and subs:
+                    emitter = asyncio.create_task(self._emit_solana(send, subs) if solana else self._emit_evm(send, subs, chain))
+        finally:
+            if closer:
+                closer.cancel()
+            if writer:
+                writer.cancel()
+            if emitter:
+                emitter.cancel()
+            self.stats["ws_disconnects"] += 1
+        return ws
+
+    def _lifetime(self) -> float:
+        if not self.a.disconnect_every:
+            return 0.0
+        return max(0.5, self.rng.gauss(self.a.disconnect_every, self.a.disconnect_every * 0.2))
+
+    async def _paced(self, rate: float):
+        """Yield the number of events due per 10ms tick at `rate`/s (fractional rates carry over)."""
+        tick, carry = 0.01, 0.0
+        loop = asyncio.get_running_loop()
+        nxt = loop.time()
+        while True:
+            nxt += tick
+            carry += rate * tick
+            n = int(carry)
+            carry -= n
+            yield n
+            await asyncio.sleep(max(0.0, nxt - loop.time()))
+
+    async def _emit_evm(self, send, subs, chain: str):
+        async for n in self._paced(self.a.evm_rate):
+            for _ in range(n):
+                tx = self.new_evm_tx(chain)
+                for sub_id, full, to in subs:
+                    if to is not None and tx["to"] not in to:
+                        self.stats["evm_filtered"] += 1
+                        continue
+                    note = {"jsonrpc": "2.0", "method": "eth_subscription",
+                            "params": {"subscription": sub_id, "result": tx if full else tx["hash"]}}
+                    if await send(json.dumps(note)):
+                        self.stats["evm_notifications"] += 1
+
+    async def _emit_solana(self, send, subs):
+        async for n in self._paced(self.a.sol_rate):
+            for _ in range(n):
+                sig = self.new_sol_sig()
+                note = {"jsonrpc": "2.0", "method": "logsNotification",
+                        "params": {"subscription": self.rng.choice(subs),
+                                   "result": {"context": {"slot": 1}, "value": {"signature": sig, "err": None, "logs": []}}}}
+                if await send(json.dumps(note)):
+                    self.stats["sol_notifications"] += 1
+
+    # ---- prices / Discord ----
+    async def price(self, request: web.Request) -> web.Response:
+        ids = [i for i in request.query.get("ids", "").split(",") if i]
+        return web.json_response({i: {"usd": PRICES.get(i, 1.0)} for i in ids})
+
+    async def discord(self, request: web.Request) -> web.Response:
+        body = await request.json()
+        self.stats["discord_posts"] += 1
+        every = self.a.discord_429_every
+        if every and self.stats["discord_posts"] % every == 0:
+            self.stats["discord_429"] += 1
+            return web.json_response({"message": "You are being rate limited.", "retry_after": self.a.discord_retry_after,
+                                      "global": False}, status=429)
+        now = time.monotonic()
+        if now - self._discord_window_start >= self.a.discord_window:
+            self._discord_window_start, self._discord_window_used = now, 0
+        reset_after = self.a.discord_window - (now - self._discord_window_start)
+        if self._discord_window_used >= self.a.discord_bucket:
+            # client ignored X-RateLimit-Remaining: 0
+            self.stats["discord_429"] += 1
+            return web.json_response({"message": "You are being rate limited.", "retry_after": round(reset_after, 3),
+                                      "global": False}, status=429)
+        self._discord_window_used += 1
+        remaining = self.a.discord_bucket - self._discord_window_used
+        self.stats["discord_embeds"] += len(body.get("embeds") or [])
+        return web.Response(status=204, headers={"X-RateLimit-Limit": str(self.a.discord_bucket),
+                                                 "X-RateLimit-Remaining": str(remaining),
+                                                 "X-RateLimit-Reset-After": f"{reset_after:.3f}"})
+
+    async def report(self):
+        while True:
+            await asyncio.sleep(self.a.stats_interval)
+            print("[mock] " + " ".join(f"{k}={v}" for k, v in self.stats.items()), flush=True)
+
+def build_app(args) -> web.Application:
+    mock = MockChains(args)
+    app = web.Application(client_max_size=64 * 2**20)
+    app.router.add_get("/simple/price", mock.price)
+    app.router.add_post("/discord", mock.discord)
+    app.router.add_post("/api/webhooks/{tail:.*}", mock.discord)
+    app.router.add_route("*", "/{tail:.*}", mock.ws)  # websocket upgrade or JSON-RPC POST on any other path
+
+    async def background(app):
+        task = asyncio.create_task(mock.report()) if args.stats_interval > 0 else None
+        yield
+        if task:
+            task.cancel()
+    app.cleanup_ctx.append(background)
+    return app
+
+def main():
+    ap = argparse.ArgumentParser(description="mock EVM/Solana RPC + websocket + Discord webhook server")
+    ap.add_argument("--host", default="127.0.0.1")
+    ap.add_argument("--port", type=int, default=8545)
+    ap.add_argument("--seed", type=int, default=1)
+    g = ap.add_argument_group("EVM")
+    g.add_argument("--evm-rate", type=float, default=500, help="pending txs/s per subscription")
+    g.add_argument("--router-ratio", type=float, default=0.05, help="share of txs sent to a router")
+    g.add_argument("--big-ratio", type=float, default=0.02, help="share of router txs above 10 ETH")
+    g.add_argument("--routers", default="", help="comma-separated router addresses for every chain (default: generate_config.py's per chain)")
+    g.add_argument("--null-ratio", type=float, default=0.02, help="share of eth_getTransactionByHash answered null")
+    g.add_argument("--chain-id", type=int, default=1)
+    g = ap.add_argument_group("Solana")
+    g.add_argument("--sol-rate", type=float, default=50, help="logsNotification/s per connection")
+    g.add_argument("--sol-big-ratio", type=float, default=0.02, help="share of swaps moving > 400 SOL")
+    g = ap.add_argument_group("faults")
+    g.add_argument("--latency-ms", type=float, default=20, help="mean added HTTP RPC latency")
+    g.add_argument("--jitter-ms", type=float, default=10, help="uniform +/- jitter on the latency")
+    g.add_argument("--ws-latency-ms", type=float, default=0.0, help="mean added delay on each subscription frame")
+    g.add_argument("--ws-jitter-ms", type=float, default=0.0, help="uniform +/- jitter on the frame delay")
+    g.add_argument("--ws-drop-ratio", type=float, default=0.0, help="share of subscription frames silently dropped")
+    g.add_argument("--rpc-error-ratio", type=float, default=0.0, help="share of RPC POSTs answered HTTP 503")
+    g.add_argument("--disconnect-every", type=float, default=0.0, help="mean websocket lifetime in seconds (0 = never)")
+    g = ap.add_argument_group("Discord")
+    g.add_argument("--discord-429-every", type=int, default=0, help="answer every Nth webhook POST with 429")
+    g.add_argument("--discord-retry-after", type=float, default=1.0, help="retry_after sent with injected 429s")
+    g.add_argument("--discord-bucket", type=int, default=5, help="X-RateLimit-Limit per window")
+    g.add_argument("--discord-window", type=float, default=2.0, help="rate-limit window in seconds")
+    ap.add_argument("--keep", type=int, default=200_000, help="generated txs kept for lookups")
+    ap.add_argument("--stats-interval", type=float, default=10)
+    args = ap.parse_args()
+    print(f"[mock] listening on http://{args.host}:{args.port} (ws: /evm/<chain>, /solana; /simple/price; /discord)")
+    web.run_app(build_app(args), host=args.host, port=args.port, print=None)
+
+if __name__ == "__main__":
+    main()
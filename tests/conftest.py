@@ -0,0 +1,5 @@
+import os
+import sys
+
+# whale_watcher.py and friends are top-level scripts, not a package
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,159 @@
+import asyncio
+
+import pytest
+
+from whale_watcher import BoundedStage
+
+
+def run(coro):
+    return asyncio.run(coro)
+
+
+async def fill(stage, items, keep=False):
+    return [await stage.put(i, keep=keep) for i in items]
+
+
+def drain(stage):
+    out = []
+    while stage.depth():
+        out.append(stage.get_nowait())
+    return out
+
+
+def test_unknown_policy_rejected():
+    with pytest.raises(ValueError):
+        BoundedStage("q", 10, "drop_newest")
+
+
+def test_fifo_across_keep_and_plain_items():
+    async def go():
+        q = BoundedStage("q", 10)
+        await q.put("a")
+        await q.put("R1", keep=True)
+        await q.put("b")
+        await q.put("R2", keep=True)
+        return drain(q)
+    assert run(go()) == ["a", "R1", "b", "R2"]
+
+
+def test_get_nowait_on_empty_raises_queue_empty():
+    with pytest.raises(asyncio.QueueEmpty):
+        BoundedStage("q", 1).get_nowait()
+
+
+def test_block_waits_for_room():
+    async def go():
+        q = BoundedStage("q", 1, "block")
+        await q.put(1)
+        waiter = asyncio.create_task(q.put(2))
+        await asyncio.sleep(0)
+        blocked = not waiter.done()
+        first = await q.get()
+        assert await waiter
+        return blocked, first, await q.get(), q.dropped, q.high_water
+    assert run(go()) == (True, 1, 2, 0, 1)
+
+
+def test_block_keep_items_wait_too():
+    async def go():
+        q = BoundedStage("q", 1, "block")
+        await q.put(1, keep=True)
+        waiter = asyncio.create_task(q.put(2, keep=True))
+        await asyncio.sleep(0)
+        blocked = not waiter.done()
+        waiter.cancel()
+        return blocked, q.depth()
+    assert run(go()) == (True, 1)
+
+
+def test_drop_oldest_evicts_oldest_plain_item():
+    async def go():
+        q = BoundedStage("q", 3, "drop_oldest")
+        await fill(q, ["a", "b", "c"])
+        assert await q.put("d")
+        return drain(q), q.dropped
+    assert run(go()) == (["b", "c", "d"], 1)
+
+
+def test_drop_oldest_never_evicts_keep_items():
+    async def go():
+        q = BoundedStage("q", 3, "drop_oldest")
+        await q.put("R1", keep=True)
+        await q.put("a")
+        await q.put("R2", keep=True)
+        assert await q.put("b")       # evicts "a", not R1
+        return drain(q), q.dropped
+    assert run(go()) == (["R1", "R2", "b"], 1)
+
+
+def test_drop_oldest_drops_newcomer_when_only_keep_items_queued():
+    async def go():
+        q = BoundedStage("q", 2, "drop_oldest")
+        await fill(q, ["R1", "R2"], keep=True)
+        accepted = await q.put("a")
+        return accepted, drain(q), q.dropped, q.dropped_keep
+    assert run(go()) == (False, ["R1", "R2"], 1, 0)
+
+
+def test_drop_oldest_keep_item_displaces_plain_item():
+    async def go():
+        q = BoundedStage("q", 2, "drop_oldest")
+        await fill(q, ["a", "b"])
+        assert await q.put("R", keep=True)
+        return drain(q), q.dropped
+    assert run(go()) == (["b", "R"], 1)
+
+
+@pytest.mark.parametrize("policy", ["drop_oldest", "drop_non_router"])
+def test_keep_items_overflow_to_twice_maxsize_then_drop(policy):
+    async def go():
+        q = BoundedStage("q", 2, policy)
+        accepted = await fill(q, ["R1", "R2", "R3", "R4", "R5"], keep=True)
+        return accepted, q.depth(), q.high_water, q.dropped, q.dropped_keep
+    assert run(go()) == ([True, True, True, True, False], 4, 4, 1, 1)
+
+
+@pytest.mark.parametrize("policy", ["drop_oldest", "drop_non_router"])
+def test_keep_put_never_blocks(policy):
+    async def go():
+        q = BoundedStage("q", 1, policy)
+        await q.put("R1", keep=True)
+        # no consumer: this would hang if a keep put waited for room
+        return await asyncio.wait_for(q.put("R2", keep=True), 1)
+    assert run(go()) is True
+
+
+def test_drop_non_router_drops_plain_newcomer():
+    async def go():
+        q = BoundedStage("q", 2, "drop_non_router")
+        await fill(q, ["a", "b"])
+        accepted = await q.put("c")
+        return accepted, drain(q), q.dropped
+    assert run(go()) == (False, ["a", "b"], 1)
+
+
+def test_drop_non_router_keep_item_displaces_plain_item():
+    async def go():
+        q = BoundedStage("q", 2, "drop_non_router")
+        await q.put("a")
+        await q.put("R1", keep=True)
+        assert await q.put("R2", keep=True)
+        return drain(q), q.dropped, q.dropped_keep
+    assert run(go()) == (["R1", "R2"], 1, 0)
+
+
+def test_put_nowait_on_full_block_stage_evicts_instead_of_waiting():
+    q = BoundedStage("q", 1, "block")
+    assert q.put_nowait("a")
+    assert q.put_nowait("b")
+    assert (drain(q), q.dropped) == (["b"], 1)
+
+
+def test_get_wakes_on_put():
+    async def go():
+        q = BoundedStage("q", 4)
+        getter = asyncio.create_task(q.get())
+        await asyncio.sleep(0)
+        await q.put("x")
+        return await asyncio.wait_for(getter, 1)
+    assert run(go()) == "x"
@@ -0,0 +1,190 @@
+import asyncio
+
+import pytest
+
+import whale_watcher as ww
+from whale_watcher import (
+    DISCORD_MAX_EMBED_CHARS, DISCORD_MAX_EMBEDS, AlertOutbox, DiscordDispatcher, _clamp_embed, _embed_chars,
+    _fit_embeds,
+)
+
+pack = DiscordDispatcher._pack
+
+
+def msg(*titles, content="", key=None, desc=""):
+    return {"content": content, "embeds": [{"title": t, "description": desc} for t in titles], "key": key}
+
+
+def titles(payload):
+    return [e["title"] for e in payload.get("embeds", [])]
+
+
+def test_pack_coalesces_up_to_ten_embeds():
+    pending = [msg(f"t{i}") for i in range(12)]
+    payload, taken, rest = pack(pending)
+    assert titles(payload) == [f"t{i}" for i in range(DISCORD_MAX_EMBEDS)]
+    assert taken == pending[:10] and rest == pending[10:]
+
+
+def test_pack_respects_total_embed_chars():
+    pending = [msg(f"t{i}", desc="x" * 2500) for i in range(3)]
+    payload, taken, rest = pack(pending)
+    assert titles(payload) == ["t0", "t1"]
+    assert sum(_embed_chars(e) for e in payload["embeds"]) <= DISCORD_MAX_EMBED_CHARS
+    assert rest == pending[2:]
+
+
+def test_pack_skips_messages_that_do_not_fit_but_keeps_packing_smaller_ones():
+    pending = [msg("a", desc="x" * 3000), msg("big", desc="x" * 3500), msg("b")]
+    payload, taken, rest = pack(pending)
+    assert titles(payload) == ["a", "b"]
+    assert rest == [pending[1]]
+
+
+def test_pack_sends_content_message_alone():
+    pending = [msg("e", content="hello"), msg("x")]
+    payload, taken, rest = pack(pending)
+    assert payload["content"] == "hello" and titles(payload) == ["e"]
+    assert taken == pending[:1] and rest == pending[1:]
+
+
+def test_pack_leaves_content_messages_for_later_when_packing_embeds():
+    pending = [msg("a"), msg(content="text"), msg("b")]
+    payload, taken, rest = pack(pending)
+    assert titles(payload) == ["a", "b"] and rest == [pending[1]]
+
+
+def test_pack_always_takes_an_empty_message():
+    # nothing to send is still progress: an untaken first message used to spin forever
+    pending = [{"content": "", "embeds": [], "key": None}, msg("a")]
+    payload, taken, rest = pack(pending)
+    assert payload == {"content": ""}
+    assert taken == pending[:1] and rest == pending[1:]
+
+
+def test_pack_cuts_oversized_embed_only_message_down_to_one_payload():
+    pending = [msg(*(f"t{i}" for i in range(13))), msg("next")]
+    payload, taken, rest = pack(pending)
+    assert titles(payload) == [f"t{i}" for i in range(DISCORD_MAX_EMBEDS)]
+    assert taken == pending[:1] and rest == pending[1:]
+
+
+def test_pack_clips_a_lone_oversized_embed():
+    e = {"title": "t", "description": "d" * 4000, "fields": [{"name": "n", "value": "v" * 1024}] * 5}
+    payload, taken, _ = pack([{"content": "", "embeds": [e], "key": None}])
+    (out,) = payload["embeds"]
+    assert _embed_chars(out) <= DISCORD_MAX_EMBED_CHARS
+    assert len(taken) == 1
+
+
+def test_fit_embeds_keeps_leading_embeds_that_fit():
+    es = [{"title": f"t{i}", "description": "x" * 2000} for i in range(4)]
+    assert [e["title"] for e in _fit_embeds(es)] == ["t0", "t1"]
+
+
+def test_fit_embeds_sheds_fields_before_description():
+    e = {"title": "t", "description": "d" * 5000, "fields": [{"name": "n" * 300, "value": "v" * 2000}] * 30}
+    (out,) = _fit_embeds([e])
+    assert _embed_chars(out) <= DISCORD_MAX_EMBED_CHARS
+    assert 0 < len(out["fields"]) < 25 and out["description"]
+
+
+def test_clamp_embed_applies_discord_field_limits():
+    e = {
+        "title": "t" * 300, "description": "d" * 5000, "footer": {"text": "f" * 3000}, "author": {"name": "a" * 300},
+        "fields": [{"name": "n" * 300, "value": "v" * 2000, "inline": True}] * 30,
+    }
+    out = _clamp_embed(e)
+    assert len(out["title"]) == 256 and len(out["description"]) == 4096
+    assert len(out["footer"]["text"]) == 2048 and len(out["author"]["name"]) == 256
+    assert len(out["fields"]) == 25
+    assert all(len(f["name"]) == 256 and len(f["value"]) == 1024 and f["inline"] for f in out["fields"])
+    assert len(e["title"]) == 300  # input untouched
+
+
+@pytest.mark.parametrize("headers,body,expected", [
+    ({}, {"retry_after": 2.5}, 2.5),
+    ({"Retry-After": "3"}, {}, 3.0),
+    ({"Retry-After": "soon"}, "not json", 1.0),
+    ({}, {"retry_after": "nan"}, 1.0),
+    ({}, {"retry_after": 10_000}, ww.DISCORD_MAX_RATELIMIT_WAIT),
+])
+def test_retry_after_parsing(headers, body, expected):
+    assert DiscordDispatcher._retry_after(headers, body) == expected
+
+
+# ---- outbox ----
+
+def test_outbox_dedups_by_key_and_replays_undelivered(tmp_path):
+    async def go():
+        ob = AlertOutbox(str(tmp_path / "outbox.sqlite3"))
+        kept = await ob.add([msg("a", key="k1"), msg("b", key="k2"), msg("dup", key="k1")])
+        assert [m["key"] for m in kept] == ["k1", "k2"]
+        await ob.mark_delivered([kept[0]["_id"]])
+        # a fresh instance sees what survives a restart
+        replay = await AlertOutbox(str(tmp_path / "outbox.sqlite3")).pending()
+        return [(m["key"], titles(m)) for m in replay]
+    assert asyncio.run(go()) == [("k2", ["b"])]
+
+
+class FakeWebhook:
+    def __init__(self, statuses=()):
+        self.statuses = list(statuses)
+        self.posts = []
+
+    async def post_json(self, url, payload):
+        self.posts.append(payload)
+        status = self.statuses.pop(0) if self.statuses else 204
+        return status, {}, None
+
+
+async def run_until(d, cond, timeout=5.0):
+    task = d.start()
+    try:
+        loop = asyncio.get_running_loop()
+        end = loop.time() + timeout
+        while not cond() and loop.time() < end:
+            await asyncio.sleep(0.01)
+    finally:
+        task.cancel()
+    assert cond()
+
+
+def test_dispatcher_replays_outbox_rows_after_restart(tmp_path, monkeypatch):
+    path = str(tmp_path / "outbox.sqlite3")
+    hook = FakeWebhook()
+    monkeypatch.setattr(ww, "http_client", lambda: hook)
+
+    async def go():
+        await AlertOutbox(path).add([msg("a", key="k1"), msg("b", key="k2")])  # left undelivered
+        ob = AlertOutbox(path)
+        d = DiscordDispatcher("http://hook", coalesce_ms=0, outbox=ob)
+        await run_until(d, lambda: hook.posts)
+        await asyncio.sleep(0.05)  # let mark_delivered commit
+        return await ob.pending()
+
+    assert asyncio.run(go()) == []
+    assert [titles(p) for p in hook.posts] == [["a", "b"]]
+
+
+def test_dispatcher_keeps_persisted_messages_through_5xx(tmp_path, monkeypatch):
+    hook = FakeWebhook([503])
+    monkeypatch.setattr(ww, "http_client", lambda: hook)
+    monkeypatch.setattr(ww, "DISCORD_MAX_BACKOFF", 0.05)
+
+    async def go():
+        d = DiscordDispatcher("http://hook", coalesce_ms=0, outbox=AlertOutbox(str(tmp_path / "o.sqlite3")))
+        d.submit(msg("a", key="k1"))
+        await run_until(d, lambda: len(hook.posts) >= 2)
+
+    asyncio.run(go())
+    assert [titles(p) for p in hook.posts[:2]] == [["a"], ["a"]]
+
+
+def test_submit_spills_instead_of_dropping_when_outbox_configured(tmp_path):
+    async def go():
+        d = DiscordDispatcher("http://hook", max_queue=1, outbox=AlertOutbox(str(tmp_path / "o.sqlite3")))
+        for i in range(3):
+            d.submit(msg(f"t{i}", key=f"k{i}"))
+        return d.q.qsize(), len(d._spill)
+    assert asyncio.run(go()) == (1, 2)
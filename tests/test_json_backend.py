@@ -0,0 +1,15 @@
+import pytest
+
+from whale_watcher import _pick_json_backend
+
+
+@pytest.mark.parametrize("name", ["json", "orjson", "msgspec"])
+def test_backend_decode_errors_cover_non_json_bodies(name):
+    if name != "json":
+        pytest.importorskip(name)
+    backend, loads, errors = _pick_json_backend(name)
+    assert backend == name
+    assert loads(b'{"a": 1}') == {"a": 1}
+    for body in (b"<html>502 Bad Gateway</html>", b"\xff\xfe", b'{"a": '):
+        with pytest.raises(errors):
+            loads(body)
@@ -0,0 +1,25 @@
+from whale_watcher import WhaleRegistry, load_evm_whales
+
+GOOD = "0x" + "ab" * 20
+
+
+def test_mixed_case_addresses_are_one_key():
+    w = WhaleRegistry([GOOD, GOOD.upper().replace("0X", "0x")])
+    assert len(w) == 1 and GOOD.upper().replace("0X", "0x") in w
+
+
+def test_malformed_entries_are_logged_and_skipped(capsys):
+    w = WhaleRegistry([GOOD, "0x12", "notanaddress", "0x" + "zz" * 20, None], source="whales_evm")
+    out = capsys.readouterr().out
+    assert len(w) == 1 and w.version == 1
+    for bad in ("'0x12'", "'notanaddress'", "'0x" + "zz" * 20 + "'", "None"):
+        assert f"ignoring malformed address in whales_evm: {bad}" in out
+    assert "+1 address(es)" in out
+
+
+def test_load_evm_whales_merges_learned_file_and_names_bad_lines(tmp_path, capsys):
+    learned = tmp_path / "learned_whales.txt"
+    learned.write_text("# learned\n0x" + "cd" * 20 + "\n0xdeadbeef\n", encoding="utf-8")
+    w = load_evm_whales({"whales_evm": [GOOD], "autolearn": {"learned_file": str(learned)}})
+    assert len(w) == 2
+    assert f"ignoring malformed address in {learned}: '0xdeadbeef'" in capsys.readouterr().out
@@ -1,6 +1,7 @@
 # whale_watcher.py
 # Discord alerts for whale flow across EVM (pending mempool) + Solana (logs).
 # Uses websockets for EVM subscriptions (works with Web3 v6+), HTTP RPC for tx lookups.
+# All network I/O is async (aiohttp + websockets) so one slow endpoint never stalls the other watchers.
 # Includes: ABI decode shim, auto-learn (EVM), dotenv loader, robust reconnect loops, verbose boot logs.
 
 import argparse
@@ -10,12 +11,29 @@ import time
 import yaml
 import os
 import datetime
-from dataclasses import dataclass
+import gzip
+import sqlite3
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from bisect import bisect_left
+from collections import OrderedDict, deque
+from dataclasses import dataclass, field
 from pathlib import Path
-from typing import Dict, Any, Optional, List
+from typing import Dict, Any, Optional, List, Tuple, Callable, Union
+from urllib.parse import urlsplit
 
-import requests
+try:
+    import fcntl  # POSIX only; learned-whale appends are unlocked elsewhere
+except ImportError:
+    fcntl = None
+try:
+    import resource  # POSIX only; peak RSS metric is omitted elsewhere
+except ImportError:
+    resource = None
+
+import aiohttp
 import websockets
+from aiohttp import web
 
 from dotenv import load_dotenv
 from web3 import Web3
@@ -27,113 +45,1247 @@ WEBHOOK = os.getenv("DISCORD_WEBHOOK_URL")
 print("[boot] file:", __file__)
 print("[boot] webhook loaded?", bool(WEBHOOK))
 
-# -------------------- Discord helper --------------------
-def discord_send(content: str = "", embeds: Optional[List[dict]] = None):
-    """Send a Discord message or embeds via webhook."""
+# -------------------- State file locations --------------------
+# State files a config does not name (learned whales, outbox, caches) default to the config's directory,
+# so a config on a mounted volume (/data in the container) keeps its state there across redeploys.
+_state_dir = ""
+
+def set_state_dir(config_path: str) -> None:
+    global _state_dir
+    _state_dir = os.path.dirname(os.path.abspath(config_path))
+
+def default_state_path(name: str) -> str:
+    return os.path.join(_state_dir, name) if _state_dir else name
+
+# -------------------- Fast JSON parsing --------------------
+# Optional C parsers; both accept str or bytes. Override with WHALE_JSON=json|orjson|msgspec.
+# JSON_DECODE_ERRORS is what the chosen backend raises on malformed input (catch it, not just ValueError).
+def _pick_json_backend(name: str) -> Tuple[str, Callable[[Any], Any], Tuple[type, ...]]:
+    if name in ("", "orjson"):
+        try:
+            import orjson
+            return "orjson", orjson.loads, (orjson.JSONDecodeError, ValueError)
+        except ImportError:
+            pass
+    if name in ("", "msgspec"):
+        try:
+            import msgspec
+            return "msgspec", msgspec.json.decode, (msgspec.DecodeError, ValueError)
+        except ImportError:
+            pass
+    return "json", json.loads, (ValueError,)
+
+JSON_BACKEND, json_loads, JSON_DECODE_ERRORS = _pick_json_backend(os.getenv("WHALE_JSON", "").lower())
+
+def fast_pending_hash(raw) -> Optional[str]:
+    """
+    Tx hash from an eth_subscription hash notification, by scanning for the 66-char "result" string
+    without building a dict. None if the frame is anything else (full tx, subscribe reply, odd
+    spacing...) - callers then fall back to a full parse.
+    """
+    if isinstance(raw, bytes):
+        raw = raw.decode("ascii", "replace")
+    i = raw.find('"result":"0x')
+    if i < 0:
+        return None
+    i += 10
+    if raw[i + 66:i + 67] != '"' or raw.find('"eth_subscription"') < 0:
+        return None
+    return raw[i:i + 66]
+
+class LazyLogsValue:
+    """
+    The `value` of a logsNotification with signature and err scanned straight from the frame;
+    anything else (logs, or a non-null err) parses the frame on first access. Dict-style get() only.
+    """
+    __slots__ = ("raw", "signature", "err_null", "_value")
+
+    def __init__(self, raw: str, signature: str, err_null: bool):
+        self.raw = raw
+        self.signature = signature
+        self.err_null = err_null
+        self._value: Optional[dict] = None
+
+    def get(self, key: str, default: Any = None) -> Any:
+        if key == "signature":
+            return self.signature
+        if key == "err" and self.err_null:
+            return None
+        if self._value is None:
+            res = json_loads(self.raw)["params"]["result"]
+            self._value = res.get("value", res)
+        return self._value.get(key, default)
+
+def fast_logs_notification(raw) -> Optional[Tuple[int, LazyLogsValue]]:
+    """(subscription id, lazy value) for a logsNotification frame; None means do a full parse."""
+    if isinstance(raw, bytes):
+        raw = raw.decode("utf-8", "replace")
+    if raw.find('"logsNotification"') < 0:
+        return None
+    # log lines are JSON strings, so their quotes are escaped and can't fake these keys
+    i = raw.rfind('"subscription":')
+    s = raw.find('"signature":"')
+    e = raw.find('"err":')
+    if i < 0 or s < 0 or e < 0:
+        return None
+    i += 15
+    j = i
+    while j < len(raw) and raw[j].isdigit():
+        j += 1
+    s += 13
+    s_end = raw.find('"', s)
+    if j == i or s_end < 0:
+        return None
+    return int(raw[i:j]), LazyLogsValue(raw, raw[s:s_end], raw.startswith("null", e + 6))
+
+# -------------------- Async HTTP client --------------------
+class AsyncHttp:
+    """
+    Shared aiohttp session for every HTTP call (RPC, webhook, price API):
+    keep-alive connection pool per host, per-request timeouts and a global concurrency cap.
+    """
+    def __init__(self, max_concurrency: int = 64, per_host: int = 16, timeout: float = 10, keepalive: float = 60):
+        self.max_concurrency = int(max_concurrency)
+        self.per_host = int(per_host)
+        self.timeout = float(timeout)
+        self.keepalive = float(keepalive)
+        self._sem = asyncio.Semaphore(self.max_concurrency)
+        self._session: Optional[aiohttp.ClientSession] = None
+
+    def _get_session(self) -> aiohttp.ClientSession:
+        if self._session is None or self._session.closed:
+            connector = aiohttp.TCPConnector(
+                limit=self.max_concurrency,
+                limit_per_host=self.per_host,
+                keepalive_timeout=self.keepalive,
+                ttl_dns_cache=300,
+            )
+            self._session = aiohttp.ClientSession(connector=connector)
+        return self._session
+
+    async def request(self, method: str, url: str, *, json_body: Any = None, params: Optional[dict] = None,
+                      timeout: Optional[float] = None) -> Tuple[int, Any, Any]:
+        """Return (status, headers, body); body is parsed JSON when possible, else text."""
+        t = aiohttp.ClientTimeout(total=timeout or self.timeout)
+        async with self._sem:
+            async with self._get_session().request(method, url, json=json_body, params=params, timeout=t) as r:
+                data = await r.read()
+                try:
+                    body = json_loads(data) if data else None
+                except JSON_DECODE_ERRORS:
+                    body = data.decode("utf-8", "replace")
+                return r.status, r.headers, body
+
+    async def post_json(self, url: str, payload: Any, timeout: Optional[float] = None) -> Tuple[int, Any, Any]:
+        return await self.request("POST", url, json_body=payload, timeout=timeout)
+
+    async def get_json(self, url: str, params: Optional[dict] = None, timeout: Optional[float] = None) -> Tuple[int, Any, Any]:
+        return await self.request("GET", url, params=params, timeout=timeout)
+
+    async def close(self):
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+
+_http: Optional[AsyncHttp] = None
+
+def init_http_client(opts: Optional[dict] = None) -> AsyncHttp:
+    """(Re)configure the shared client from the `http_client` config section."""
+    global _http
+    o = opts or {}
+    _http = AsyncHttp(
+        max_concurrency=int(o.get("max_concurrency", 64)),
+        per_host=int(o.get("per_host", 16)),
+        timeout=float(o.get("timeout", 10)),
+        keepalive=float(o.get("keepalive", 60)),
+    )
+    return _http
+
+def http_client() -> AsyncHttp:
+    return _http or init_http_client()
+
+async def rpc_call(url: str, method: str, params: Optional[list] = None, timeout: Optional[float] = None) -> Any:
+    """Single JSON-RPC call over HTTP; raises on transport or RPC errors."""
+    t0 = time.monotonic()
+    status, _, body = await http_client().post_json(
+        url, {"jsonrpc":"2.0","id":1,"method":method,"params":params or []}, timeout=timeout
+    )
+    if status >= 300 or not isinstance(body, dict):
+        raise RuntimeError(f"{method}: HTTP {status} {str(body)[:200]}")
+    if body.get("error"):
+        raise RuntimeError(f"{method}: {body['error']}")
+    rec = recorder()
+    if rec:
+        rec.rpc(method, params or [], body.get("result"), time.monotonic() - t0)
+    return body.get("result")
+
+# -------------------- Metrics --------------------
+LATENCY_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+class _Value:
+    __slots__ = ("value",)
+
+    def __init__(self):
+        self.value = 0
+
+    def inc(self, n: float = 1):
+        self.value += n
+
+    def set(self, v: float):
+        self.value = v
+
+class _Tracked:
+    """Sampled at scrape time from a callable, so existing counters/queues cost nothing extra per event."""
+    __slots__ = ("fn",)
+
+    def __init__(self, fn: Callable[[], float]):
+        self.fn = fn
+
+    @property
+    def value(self) -> float:
+        return self.fn()
+
+class _Hist:
+    __slots__ = ("bounds", "counts", "sum", "count")
+
+    def __init__(self, bounds: Tuple[float, ...]):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, v: float):
+        self.counts[bisect_left(self.bounds, v)] += 1
+        self.sum += v
+        self.count += 1
+
+class Metric:
+    """
+    A counter, gauge or histogram family. labels(*values) returns a cached child; hot paths should
+    look the child up once and keep it (child.inc()/set()/observe() is a single attribute update).
+    track(fn, *values) exposes a value computed at scrape time instead.
+    """
+    def __init__(self, kind: str, name: str, help: str, labelnames: Tuple[str, ...] = (),
+                 buckets: Tuple[float, ...] = LATENCY_BUCKETS):
+        self.kind = kind
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        self.children: Dict[Tuple[str, ...], Any] = {}
+
+    def labels(self, *values) -> Any:
+        key = tuple(str(v) for v in values)
+        child = self.children.get(key)
+        if child is None:
+            if len(key) != len(self.labelnames):
+                raise ValueError(f"{self.name}: expected labels {self.labelnames}, got {key}")
+            child = self.children[key] = _Hist(self.buckets) if self.kind == "histogram" else _Value()
+        return child
+
+    def track(self, fn: Callable[[], float], *values):
+        self.children[tuple(str(v) for v in values)] = _Tracked(fn)
+
+    def inc(self, n: float = 1):
+        self.labels().inc(n)
+
+    def set(self, v: float):
+        self.labels().set(v)
+
+    def observe(self, v: float):
+        self.labels().observe(v)
+
+def _label_str(names: Tuple[str, ...], values: Tuple[str, ...], extra: str = "") -> str:
+    esc = lambda v: v.replace("\\", "\\\\").replace('"', '\\"').replace("\n", " ")
+    parts = [f'{n}="{esc(v)}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+class MetricsRegistry:
+    """Process-wide metric families, rendered in the Prometheus text format on GET /metrics."""
+    def __init__(self):
+        self._metrics: Dict[str, Metric] = {}
+        self._task: Optional[asyncio.Task] = None
+
+    def _get(self, kind: str, name: str, help: str, labelnames=(), **kw) -> Metric:
+        m = self._metrics.get(name)
+        if m is None:
+            m = self._metrics[name] = Metric(kind, name, help, tuple(labelnames), **kw)
+        return m
+
+    def counter(self, name: str, help: str, labelnames=()) -> Metric:
+        return self._get("counter", name, help, labelnames)
+
+    def gauge(self, name: str, help: str, labelnames=()) -> Metric:
+        return self._get("gauge", name, help, labelnames)
+
+    def histogram(self, name: str, help: str, labelnames=(), buckets: Tuple[float, ...] = LATENCY_BUCKETS) -> Metric:
+        return self._get("histogram", name, help, labelnames, buckets=buckets)
+
+    def render(self) -> str:
+        out: List[str] = []
+        for m in self._metrics.values():
+            out.append(f"# HELP {m.name} {m.help}")
+            out.append(f"# TYPE {m.name} {m.kind}")
+            for values, child in list(m.children.items()):
+                if isinstance(child, _Hist):
+                    cum = 0
+                    for bound, n in zip(m.buckets + (float("inf"),), child.counts):
+                        cum += n
+                        le = 'le="+Inf"' if bound == float("inf") else f'le="{bound}"'
+                        out.append(f"{m.name}_bucket{_label_str(m.labelnames, values, le)} {cum}")
+                    out.append(f"{m.name}_sum{_label_str(m.labelnames, values)} {child.sum}")
+                    out.append(f"{m.name}_count{_label_str(m.labelnames, values)} {child.count}")
+                    continue
+                try:
+                    v = child.value
+                except Exception:
+                    continue
+                out.append(f"{m.name}{_label_str(m.labelnames, values)} {v}")
+        return "\n".join(out) + "\n"
+
+    async def serve(self, host: str, port: int):
+        async def handler(_request):
+            return web.Response(text=self.render(), content_type="text/plain", charset="utf-8",
+                                headers={"X-Content-Type-Options": "nosniff"})
+        app = web.Application()
+        app.router.add_get("/metrics", handler)
+        runner = web.AppRunner(app, access_log=None)
+        await runner.setup()
+        await web.TCPSite(runner, host, port).start()
+        print(f"[metrics] serving http://{host}:{port}/metrics")
+        try:
+            await asyncio.Event().wait()
+        finally:
+            await runner.cleanup()
+
+    def start(self, opts: Optional[dict] = None) -> Optional[asyncio.Task]:
+        """Serve /metrics per the `metrics` config section (port 0 or missing section disables)."""
+        o = opts or {}
+        port = int(o.get("port", 0))
+        if not port:
+            return None
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self.serve(o.get("host", "127.0.0.1"), port))
+        return self._task
+
+METRICS = MetricsRegistry()
+METRICS.counter("whale_process_cpu_seconds_total", "CPU time used by this process").track(time.process_time)
+if resource:
+    _RSS_UNIT = 1 if sys.platform == "darwin" else 1024  # ru_maxrss is bytes on macOS, KiB on Linux
+    METRICS.gauge("whale_process_peak_rss_bytes", "Peak resident set size").track(
+        lambda: resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * _RSS_UNIT
+    )
+
+# -------------------- Traffic recorder --------------------
+class TrafficRecorder:
+    """
+    Captures what the watchers receive - raw websocket frames, JSON-RPC results and price responses -
+    to a gzip JSONL file that `bench.py replay` serves back from local stand-in servers.
+    Lines are buffered and appended as one gzip member per flush on a dedicated thread, so recording
+    costs the hot path a dict build and a list append. Record kinds (all carry `t`, seconds since start):
+      meta {config}  open/out/in {src, raw}  rpc {method, params, result, dt}  price {body}
+    """
+    def __init__(self, path: str, flush_seconds: float = 1.0):
+        self.path = path
+        self.flush_seconds = float(flush_seconds)
+        self.t0 = time.monotonic()
+        self.records = 0
+        self._buf: List[str] = []
+        self._exec = ThreadPoolExecutor(max_workers=1, thread_name_prefix="recorder")
+        self._task: Optional[asyncio.Task] = None
+
+    def _add(self, rec: dict):
+        rec["t"] = round(time.monotonic() - self.t0, 6)
+        self._buf.append(json.dumps(rec, separators=(",", ":")))
+        self.records += 1
+
+    def meta(self, cfg: dict):
+        """Header with endpoint URLs cut down to scheme://host (paths and queries often embed API keys)."""
+        def endpoints(v):
+            if isinstance(v, str):
+                return redact_url(v)
+            if isinstance(v, dict):
+                return {**v, "url": redact_url(v.get("url") or "")}
+            return [endpoints(e) for e in v] if isinstance(v, list) else v
+
+        def redact(o):
+            if isinstance(o, dict):
+                return {k: (endpoints(v) if k in ("ws", "wss", "http") else redact(v)) for k, v in o.items()}
+            if isinstance(o, list):
+                return [redact(v) for v in o]
+            return o
+        self._add({"k": "meta", "v": 1, "config": redact(cfg)})
+
+    def ws_open(self, src: str):
+        self._add({"k": "open", "src": src})
+
+    def ws_out(self, src: str, raw: str):
+        self._add({"k": "out", "src": src, "raw": raw})
+
+    def ws_in(self, src: str, raw):
+        self._add({"k": "in", "src": src, "raw": raw if isinstance(raw, str) else raw.decode("utf-8", "replace")})
+
+    def rpc(self, method: str, params: list, result: Any, dt: float):
+        self._add({"k": "rpc", "method": method, "params": params, "result": result, "dt": round(dt, 6)})
+
+    def price(self, body: dict):
+        self._add({"k": "price", "body": body})
+
+    def _write(self, lines: List[str]):
+        with gzip.open(self.path, "at", encoding="utf-8") as f:
+            f.write("\n".join(lines) + "\n")
+
+    async def flush(self):
+        if self._buf:
+            lines, self._buf = self._buf, []
+            await asyncio.get_running_loop().run_in_executor(self._exec, self._write, lines)
+
+    async def run(self):
+        try:
+            while True:
+                await asyncio.sleep(self.flush_seconds)
+                try:
+                    await self.flush()
+                except Exception as e:
+                    print("[record] write failed:", e)
+        finally:
+            if self._buf:
+                self._write(self._buf)
+                self._buf = []
+
+    def start(self) -> asyncio.Task:
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self.run())
+        return self._task
+
+_recorder: Optional[TrafficRecorder] = None
+
+def init_recorder(path: Optional[str]) -> Optional[TrafficRecorder]:
+    global _recorder
+    _recorder = TrafficRecorder(path) if path else None
+    return _recorder
+
+def recorder() -> Optional[TrafficRecorder]:
+    """The active recorder, or None when not recording (the common case)."""
+    return _recorder
+
+# -------------------- Durable alert outbox --------------------
+class AlertOutbox:
+    """
+    Append-only SQLite (WAL) outbox for Discord messages. Messages are committed before
+    delivery and marked delivered after a 2xx, so a restart replays whatever was still pending.
+    `key` (tx hash / signature) is unique, so the same alert is never stored or sent twice.
+    All DB work runs on one dedicated thread; callers batch rows so each commit/fsync covers many alerts.
+    """
+    def __init__(self, path: str, keep_days: float = 7):
+        self.path = path
+        self.keep_seconds = float(keep_days) * 86400
+        self._exec = ThreadPoolExecutor(max_workers=1, thread_name_prefix="outbox")
+        self._db: Optional[sqlite3.Connection] = None
+
+    def _conn(self) -> sqlite3.Connection:
+        if self._db is None:
+            parent = os.path.dirname(self.path)
+            if parent:
+                os.makedirs(parent, exist_ok=True)
+            db = sqlite3.connect(self.path, isolation_level=None, check_same_thread=False)
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute("PRAGMA synchronous=FULL")
+            db.execute(
+                "CREATE TABLE IF NOT EXISTS outbox ("
+                " id INTEGER PRIMARY KEY AUTOINCREMENT,"
+                " key TEXT UNIQUE,"
+                " payload TEXT NOT NULL,"
+                " created REAL NOT NULL,"
+                " delivered REAL)"
+            )
+            db.execute("CREATE INDEX IF NOT EXISTS outbox_pending ON outbox(delivered, id)")
+            self._db = db
+        return self._db
+
+    def _add(self, msgs: List[dict]) -> List[dict]:
+        db = self._conn()
+        kept: List[dict] = []
+        now = time.time()
+        db.execute("BEGIN")
+        try:
+            for m in msgs:
+                body = json.dumps({"content": m.get("content", ""), "embeds": m.get("embeds") or []})
+                cur = db.execute("INSERT OR IGNORE INTO outbox(key, payload, created) VALUES (?,?,?)", (m.get("key"), body, now))
+                if cur.rowcount:
+                    m["_id"] = cur.lastrowid
+                    kept.append(m)
+            db.execute("COMMIT")
+        except Exception:
+            db.execute("ROLLBACK")
+            raise
+        return kept
+
+    def _mark(self, ids: List[int]):
+        db = self._conn()
+        db.execute("BEGIN")
+        db.executemany("UPDATE outbox SET delivered=? WHERE id=?", [(time.time(), i) for i in ids])
+        db.execute("COMMIT")
+
+    def _pending(self) -> List[dict]:
+        rows = self._conn().execute("SELECT id, key, payload FROM outbox WHERE delivered IS NULL ORDER BY id").fetchall()
+        out = []
+        for i, key, body in rows:
+            m = json.loads(body)
+            m.update({"_id": i, "key": key})
+            out.append(m)
+        return out
+
+    def _prune(self) -> int:
+        db = self._conn()
+        cur = db.execute("DELETE FROM outbox WHERE delivered IS NOT NULL AND delivered < ?", (time.time() - self.keep_seconds,))
+        return cur.rowcount
+
+    async def _run(self, fn, *args):
+        return await asyncio.get_running_loop().run_in_executor(self._exec, fn, *args)
+
+    async def add(self, msgs: List[dict]) -> List[dict]:
+        """Persist a batch in one transaction; returns the messages that were new (not duplicates)."""
+        return await self._run(self._add, msgs)
+
+    async def mark_delivered(self, ids: List[int]):
+        if ids:
+            await self._run(self._mark, ids)
+
+    async def pending(self) -> List[dict]:
+        return await self._run(self._pending)
+
+    async def prune(self) -> int:
+        return await self._run(self._prune)
+
+# -------------------- Discord dispatcher --------------------
+DISCORD_MAX_EMBEDS = 10        # per webhook message
+DISCORD_MAX_EMBED_CHARS = 6000 # combined title/description/field/footer/author text per message
+DISCORD_MAX_FIELDS = 25        # per embed
+# per-field caps; a payload over any of them is a 400, which the dispatcher treats as final
+DISCORD_EMBED_LIMITS = {"title": 256, "description": 4096}
+DISCORD_FIELD_LIMITS = {"name": 256, "value": 1024}
+DISCORD_FOOTER_CHARS = 2048
+DISCORD_AUTHOR_CHARS = 256
+DISCORD_MAX_RATELIMIT_WAIT = 60.0  # seconds of 429s one delivery attempt sits through before giving up
+DISCORD_MAX_BACKOFF = 30.0         # cap on a message's exponential retry backoff after 5xx/network errors
+
+M_DISCORD_POSTS = METRICS.counter("whale_discord_posts_total", "Webhook POSTs by HTTP status (0 = network error)", ("status",))
+M_DISCORD_POST_SECONDS = METRICS.histogram("whale_discord_post_seconds", "Webhook POST latency")
+M_DISCORD_MESSAGES = METRICS.counter("whale_discord_messages_total", "Discord messages by outcome", ("outcome",))
+M_DISCORD_QUEUE = METRICS.gauge("whale_discord_queue_depth", "Messages waiting in the dispatcher", ("queue",))
+
+def _clip(v: Any, n: int) -> Any:
+    return v[:n - 1] + "…" if isinstance(v, str) and len(v) > n else v
+
+def _clamp_embed(e: dict) -> dict:
+    """Copy of an embed cut down to Discord's per-field limits."""
+    out = dict(e)
+    for k, n in DISCORD_EMBED_LIMITS.items():
+        if k in out:
+            out[k] = _clip(out[k], n)
+    if isinstance(out.get("footer"), dict) and "text" in out["footer"]:
+        out["footer"] = {**out["footer"], "text": _clip(out["footer"]["text"], DISCORD_FOOTER_CHARS)}
+    if isinstance(out.get("author"), dict) and "name" in out["author"]:
+        out["author"] = {**out["author"], "name": _clip(out["author"]["name"], DISCORD_AUTHOR_CHARS)}
+    if isinstance(out.get("fields"), list):
+        out["fields"] = [{**f, **{k: _clip(f[k], n) for k, n in DISCORD_FIELD_LIMITS.items() if k in f}}
+                         for f in out["fields"][:DISCORD_MAX_FIELDS]]
+    return out
+
+def _clamp_message(msg: dict) -> dict:
+    if not msg.get("embeds"):
+        return msg
+    return {**msg, "embeds": [_clamp_embed(e) for e in msg["embeds"]]}
+
+def _embed_chars(e: dict) -> int:
+    n = len(e.get("title", "")) + len(e.get("description", ""))
+    n += len((e.get("footer") or {}).get("text", "")) + len((e.get("author") or {}).get("name", ""))
+    for f in e.get("fields") or []:
+        n += len(f.get("name", "")) + len(f.get("value", ""))
+    return n
+
+def _fit_embeds(embeds: List[dict]) -> List[dict]:
+    """The leading embeds one webhook message can carry; a lone oversized embed has its description clipped."""
+    out: List[dict] = []
+    chars = 0
+    embeds = [_clamp_embed(e) for e in embeds]
+    for e in embeds[:DISCORD_MAX_EMBEDS]:
+        chars += _embed_chars(e)
+        if chars > DISCORD_MAX_EMBED_CHARS:
+            break
+        out.append(e)
+    if not out and embeds:
+        e = embeds[0]
+        e = dict(e)
+        # 25 maxed-out fields alone can exceed the total: shed trailing fields first
+        while e.get("fields") and _embed_chars(e) - len(e.get("description", "")) > DISCORD_MAX_EMBED_CHARS:
+            e["fields"] = e["fields"][:-1]
+        room = DISCORD_MAX_EMBED_CHARS - (_embed_chars(e) - len(e.get("description", "")))
+        e["description"] = e.get("description", "")[:max(0, room)]
+        out = [e]
+        print("[WARN] Discord embed too large; clipping its description")
+    if len(out) < len(embeds):
+        print(f"[WARN] Discord message too large; sending {len(out)} of {len(embeds)} embed(s)")
+    return out
+
+class DiscordDispatcher:
+    """
+    Background webhook sender. Watchers enqueue messages and move on; a writer task group-commits
+    them to the outbox (if configured), and the sender packs ready embeds into as few webhook calls
+    as possible (≤10 embeds / 6000 chars each, every embed clamped to Discord's per-field limits), honors
+    429 `retry_after` (for at most DISCORD_MAX_RATELIMIT_WAIT per attempt) and the X-RateLimit-* bucket
+    headers, and retries 5xx/network errors with per-message exponential backoff, so one failing payload
+    never holds up the rest. With an outbox, a full inbound queue spills to the writer rather than
+    dropping anything unpersisted. Undelivered outbox rows are replayed on start.
+    """
+    def __init__(self, url: Optional[str], max_queue: int = 5000, coalesce_ms: int = 250, max_retries: int = 5,
+                 outbox: Optional[AlertOutbox] = None):
+        self.url = url
+        self.q: asyncio.Queue = asyncio.Queue(maxsize=max(1, int(max_queue)))
+        self.coalesce = max(0, int(coalesce_ms)) / 1000
+        self.max_retries = int(max_retries)
+        self.outbox = outbox
+        self._ready: List[dict] = []   # persisted, awaiting delivery
+        self._spill: List[dict] = []   # arrived while the inbound queue was full; persisted by the writer next
+        self._ready_evt = asyncio.Event()
+        self._blocked_until = 0.0      # monotonic time the current rate-limit bucket resets
+        self._task: Optional[asyncio.Task] = None
+        M_DISCORD_QUEUE.track(self.q.qsize, "inbound")
+        M_DISCORD_QUEUE.track(lambda: len(self._ready), "ready")
+        M_DISCORD_QUEUE.track(lambda: len(self._spill), "spill")
+        self._m_submitted = M_DISCORD_MESSAGES.labels("submitted")
+        self._m_overflow = M_DISCORD_MESSAGES.labels("dropped_queue_full")
+
+    def start(self) -> asyncio.Task:
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self.run())
+        return self._task
+
+    def submit(self, msg: dict):
+        """Queue a {"content": str, "embeds": [...], "key": str|None} message without blocking."""
+        msg = _clamp_message(msg)
+        self._m_submitted.inc()
+        if not self.q.full():
+            self.q.put_nowait(msg)
+        elif self.outbox:
+            # nothing may be lost before it is persisted: the writer (busy, since the queue is full)
+            # commits the spill along with its next batch
+            self._spill.append(msg)
+        else:
+            self.q.get_nowait()
+            self._m_overflow.inc()
+            print("[WARN] Discord outbound queue full; dropped oldest message")
+            self.q.put_nowait(msg)
+
+    @staticmethod
+    def _pack(pending: List[dict]) -> Tuple[dict, List[dict], List[dict]]:
+        """Take the next webhook payload off `pending`; returns (payload, taken, rest).
+        The first message is always taken, cut down to what one payload can carry if need be."""
+        first = pending[0]
+        if first.get("content") or not first.get("embeds"):
+            payload = {"content": (first.get("content") or "")[:1900]}
+            if first.get("embeds"):
+                payload["embeds"] = _fit_embeds(first["embeds"])
+            return payload, [first], pending[1:]
+        es = first["embeds"]
+        if len(es) > DISCORD_MAX_EMBEDS or sum(_embed_chars(e) for e in es) > DISCORD_MAX_EMBED_CHARS:
+            # would never fit alongside others (or alone): send what fits, by itself
+            return {"content": "", "embeds": _fit_embeds(es)}, [first], pending[1:]
+        embeds: List[dict] = []
+        chars = 0
+        taken: List[dict] = []
+        rest: List[dict] = []
+        for m in pending:
+            es = m.get("embeds") or []
+            n = sum(_embed_chars(e) for e in es)
+            fits = len(embeds) + len(es) <= DISCORD_MAX_EMBEDS and chars + n <= DISCORD_MAX_EMBED_CHARS
+            if m.get("content") or not es or not fits:
+                rest.append(m)
+                continue
+            embeds.extend(es)
+            chars += n
+            taken.append(m)
+        return {"content": "", "embeds": embeds}, taken, rest
+
+    async def _writer(self):
+        """Drain the inbound queue in batches: one outbox commit per batch, then hand off to the sender."""
+        while True:
+            batch = [await self.q.get()]
+            while True:
+                try:
+                    batch.append(self.q.get_nowait())
+                except asyncio.QueueEmpty:
+                    break
+            if self._spill:
+                batch.extend(self._spill)
+                self._spill = []
+            if self.outbox:
+                try:
+                    n = len(batch)
+                    batch = await self.outbox.add(batch)
+                    M_DISCORD_MESSAGES.labels("deduped").inc(n - len(batch))
+                except Exception as e:
+                    print("[ERR] outbox write failed; delivering without persistence:", e)
+            if batch:
+                self._ready.extend(batch)
+                self._ready_evt.set()
+
+    async def _wait_ready(self, timeout: Optional[float] = None) -> bool:
+        self._ready_evt.clear()
+        try:
+            await asyncio.wait_for(self._ready_evt.wait(), timeout)
+            return True
+        except asyncio.TimeoutError:
+            return False
+
+    async def run(self):
+        loop = asyncio.get_running_loop()
+        last_prune = 0.0
+        if self.outbox:
+            try:
+                replay = await self.outbox.pending()
+                if replay:
+                    print(f"[discord] replaying {len(replay)} undelivered alert(s) from outbox")
+                    self._ready[:0] = [_clamp_message(m) for m in replay]
+            except Exception as e:
+                print("[ERR] outbox replay failed:", e)
+        writer = asyncio.create_task(self._writer())
+        try:
+            while True:
+                while not self._ready:
+                    await self._wait_ready()
+                deadline = loop.time() + self.coalesce
+                while sum(len(m.get("embeds") or []) for m in self._ready) < DISCORD_MAX_EMBEDS:
+                    timeout = deadline - loop.time()
+                    if timeout <= 0 or not await self._wait_ready(timeout):
+                        break
+                now = loop.time()
+                due = [m for m in self._ready if m.get("_retry_at", 0.0) <= now]
+                if not due:
+                    # everything is backing off: sleep until the first retry, or until something new arrives
+                    await self._wait_ready(min(m["_retry_at"] for m in self._ready) - now)
+                    continue
+                payload, taken, rest = self._pack(due)
+                self._ready = rest + [m for m in self._ready if m.get("_retry_at", 0.0) > now]
+                try:
+                    ok = await self._deliver(payload)
+                    if ok is None:
+                        # back these messages off exponentially and carry on with the rest; persisted
+                        # messages are never given up on, the others after max_retries rounds
+                        now = loop.time()
+                        for m in taken:
+                            m["_rounds"] = m.get("_rounds", 0) + 1
+                            m["_retry_at"] = now + min(2 ** m["_rounds"], DISCORD_MAX_BACKOFF)
+                        again = [m for m in taken if self.outbox and "_id" in m or m["_rounds"] <= self.max_retries]
+                        if len(again) < len(taken):
+                            M_DISCORD_MESSAGES.labels("failed").inc(len(taken) - len(again))
+                            print(f"[ERR] Discord dropped {len(taken) - len(again)} message(s)")
+                        self._ready[:0] = again
+                        continue
+                    M_DISCORD_MESSAGES.labels("delivered" if ok else "failed").inc(len(taken))
+                    if not ok:
+                        print(f"[ERR] Discord dropped {len(taken)} message(s)")
+                    if self.outbox:
+                        # rejected payloads (4xx) are marked too, so they aren't replayed forever
+                        await self.outbox.mark_delivered([m["_id"] for m in taken if "_id" in m])
+                        if time.time() - last_prune > 3600:
+                            last_prune = time.time()
+                            await self.outbox.prune()
+                except Exception as e:
+                    print("[ERR] Discord dispatcher:", e)
+        finally:
+            writer.cancel()
+
+    @staticmethod
+    def _retry_after(headers, body) -> float:
+        """Seconds a 429 asks us to wait: body `retry_after`, else the Retry-After header, else 1s."""
+        for v in ((body.get("retry_after") if isinstance(body, dict) else None), headers.get("Retry-After")):
+            try:
+                f = float(v) if v is not None else -1.0
+            except (TypeError, ValueError):
+                continue
+            if f >= 0:  # also rejects NaN
+                return min(f, DISCORD_MAX_RATELIMIT_WAIT)
+        return 1.0
+
+    def _note_bucket(self, headers):
+        try:
+            remaining = headers.get("X-RateLimit-Remaining")
+            reset_after = headers.get("X-RateLimit-Reset-After")
+            if remaining is not None and reset_after is not None and int(remaining) <= 0:
+                self._blocked_until = time.monotonic() + float(reset_after)
+        except (TypeError, ValueError):
+            pass
+
+    async def _deliver(self, payload: dict) -> Optional[bool]:
+        """POST one payload: True once accepted, False if rejected (4xx), None to retry it later (5xx, network,
+        or still rate limited). Only 429s are waited out here; other retries are the caller's backoff."""
+        if not self.url:
+            print("[WARN] DISCORD_WEBHOOK_URL not set. Skipping Discord send.")
+            return False
+        limited = 0.0  # seconds spent waiting out 429s
+        while True:
+            wait = self._blocked_until - time.monotonic()
+            if wait > 0:
+                await asyncio.sleep(wait)
+            t0 = time.monotonic()
+            try:
+                status, headers, body = await http_client().post_json(self.url, payload)
+            except Exception as e:
+                status, headers, body = 0, {}, str(e)
+            M_DISCORD_POST_SECONDS.observe(time.monotonic() - t0)
+            M_DISCORD_POSTS.labels(status).inc()
+            if status and status < 300:
+                self._note_bucket(headers)
+                return True
+            if status == 429:
+                retry_after = self._retry_after(headers, body)
+                limited += retry_after
+                self._blocked_until = time.monotonic() + retry_after
+                if limited > DISCORD_MAX_RATELIMIT_WAIT:
+                    print(f"[ERR] Discord still rate limited after {limited:.0f}s; giving up on this attempt")
+                    return None
+                print(f"[WARN] Discord rate limited; retrying in {retry_after:.2f}s")
+                continue  # 429s are bounded by total wait, not max_retries
+            if status and status < 500:
+                print("[ERR] Discord webhook:", status, str(body)[:300])
+                return False
+            print("[WARN] Discord send failed; backing off:", status, str(body)[:300])
+            return None
+
+_discord: Optional[DiscordDispatcher] = None
+
+def init_discord(opts: Optional[dict] = None, outbox_opts: Optional[dict] = None) -> DiscordDispatcher:
+    """(Re)configure the shared dispatcher from the `discord` and `outbox` config sections.
+    The outbox lives next to the config unless `outbox.path` says otherwise ("" disables it)."""
+    global _discord
+    o = opts or {}
+    ob = outbox_opts or {}
+    outbox_path = ob.get("path", default_state_path("alert_outbox.sqlite3"))
+    _discord = DiscordDispatcher(
+        WEBHOOK,
+        max_queue=int(o.get("max_queue", 5000)),
+        coalesce_ms=int(o.get("coalesce_ms", 250)),
+        max_retries=int(o.get("max_retries", 5)),
+        outbox=AlertOutbox(outbox_path, keep_days=float(ob.get("keep_days", 7))) if outbox_path else None,
+    )
+    return _discord
+
+async def discord_send(content: str = "", embeds: Optional[List[dict]] = None, key: Optional[str] = None):
+    """Queue a Discord message or embeds for the background dispatcher; `key` dedups alerts (tx hash / signature)."""
     if not WEBHOOK:
         print("[WARN] DISCORD_WEBHOOK_URL not set. Skipping Discord send.")
         return
-    payload = {"content": content[:1900]}
-    if embeds:
-        payload["embeds"] = embeds[:10]  # Discord limit
-    try:
-        r = requests.post(WEBHOOK, json=payload, timeout=10)
-        if r.status_code >= 300:
-            print("[ERR] Discord webhook:", r.status_code, r.text[:300])
-    except Exception as e:
-        print("[ERR] Discord send failed:", e)
+    d = _discord or init_discord()
+    d.start()
+    d.submit({"content": content, "embeds": list(embeds or []), "key": key})
 
 # -------------------- ABI decode shim (eth-abi v2/v3/v4/v5) --------------------
 try:
     # eth-abi >= 4
-    from eth_abi import decode as _abi_decode
+    from eth_abi import decode as _abi_decode, encode as _abi_encode
 except Exception:  # pragma: no cover
     # eth-abi <= 3
-    from eth_abi import decode_abi as _abi_decode
-
-# -------------------- Minimal selectors for Uniswap-style routers --------------------
-from web3 import Web3 as _W3
-SIG_V2_SWAP_EXACT_ETH_FOR_TOKENS = _W3.keccak(
-    text="swapExactETHForTokens(uint256,address[],address,uint256)"
-)[:4].hex()
-SIG_V2_SWAP_EXACT_TOKENS_FOR_TOKENS = _W3.keccak(
-    text="swapExactTokensForTokens(uint256,uint256,address[],address,uint256)"
-)[:4].hex()
-SIG_V3_EXACT_INPUT_SINGLE = _W3.keccak(
-    text="exactInputSingle((address,address,uint24,address,uint256,uint256,uint256,uint160))"
-)[:4].hex()
-
-def parse_uniswap_call(input_data: bytes) -> Optional[Dict[str, Any]]:
-    """Decode a few common swap methods to identify token_in/token_out."""
-    if len(input_data) < 4:
-        return None
-    sig = input_data[:4].hex()
-    data = input_data[4:]
+    from eth_abi import decode_abi as _abi_decode, encode_abi as _abi_encode
 
-    if sig == SIG_V2_SWAP_EXACT_ETH_FOR_TOKENS:
-        try:
-            types = ["uint256", "address[]", "address", "uint256"]
-            vals = _abi_decode(types, bytes.fromhex(data.hex()))
-            path = [Web3.to_checksum_address(p.hex()) for p in vals[1]]
-            return {"dex": "V2", "method": "swapExactETHForTokens", "token_in": path[0], "token_out": path[-1]}
-        except Exception:
-            return None
+# -------------------- Router calldata decoders --------------------
+# Zero-copy decoding: calldata is wrapped in a memoryview once, selectors are compared as 4-byte ints,
+# and decoders read only the ABI words they need by direct slicing (no eth-abi, no hex round-trips).
+# Addresses come back as lowercase 0x-hex; checksumming is left to whoever renders an alert.
+#
+# selector (int) -> (method name, dex, decoder). Decoders take the calldata after the selector and
+# return {"token_in", "token_out", "amount_in", "amount_out_min"} or None. For exact-output swaps
+# amount_in is the maximum input and amount_out_min the exact output; amount_in None means tx.value.
+_DECODERS: Dict[int, Tuple[str, str, Callable[..., Optional[Dict[str, Any]]]]] = {}
 
-    if sig == SIG_V2_SWAP_EXACT_TOKENS_FOR_TOKENS:
-        try:
-            types = ["uint256", "uint256", "address[]", "address", "uint256"]
-            vals = _abi_decode(types, bytes.fromhex(data.hex()))
-            path = [Web3.to_checksum_address(p.hex()) for p in vals[2]]
-            return {"dex": "V2", "method": "swapExactTokensForTokens", "token_in": path[0], "token_out": path[-1]}
-        except Exception:
-            return None
+MAX_MULTICALL_DEPTH = 3
 
-    if sig == SIG_V3_EXACT_INPUT_SINGLE:
-        try:
-            types = ["address","address","uint24","address","uint256","uint256","uint256","uint160"]
-            vals = _abi_decode(types, bytes.fromhex(data.hex()))
-            token_in  = Web3.to_checksum_address(vals[0].hex())
-            token_out = Web3.to_checksum_address(vals[1].hex())
-            return {"dex": "V3", "method": "exactInputSingle", "token_in": token_in, "token_out": token_out}
-        except Exception:
-            return None
+def _selector(signature: str) -> int:
+    return int.from_bytes(bytes(Web3.keccak(text=signature)[:4]), "big")
+
+def register_decoder(*signatures: str, dex: str):
+    """Register `fn` as the decoder for every ABI signature given."""
+    def deco(fn):
+        for sig in signatures:
+            _DECODERS[_selector(sig)] = (sig.split("(", 1)[0], dex, fn)
+        return fn
+    return deco
+
+# ---- ABI word readers (all offsets in bytes, relative to the view passed in) ----
+def _u256(d: memoryview, off: int) -> int:
+    end = off + 32
+    if end > len(d):
+        raise ValueError("calldata too short")
+    return int.from_bytes(d[off:end], "big")
+
+def _addr(d: memoryview, off: int) -> str:
+    if off + 32 > len(d):
+        raise ValueError("calldata too short")
+    return "0x" + d[off + 12:off + 32].hex()
+
+def _dyn(d: memoryview, head_off: int, base: int = 0) -> int:
+    """Absolute position of a dynamic value whose offset word sits at `head_off` (offsets relative to `base`)."""
+    return base + _u256(d, head_off)
+
+def _bytes_at(d: memoryview, pos: int) -> memoryview:
+    n = _u256(d, pos)
+    if pos + 32 + n > len(d):
+        raise ValueError("bytes out of range")
+    return d[pos + 32:pos + 32 + n]
+
+def _addr_path_ends(d: memoryview, pos: int) -> Tuple[str, str]:
+    """First and last entry of an address[] at `pos`."""
+    n = _u256(d, pos)
+    if n < 2:
+        raise ValueError("short path")
+    return _addr(d, pos + 32), _addr(d, pos + 32 * n)
+
+def _v3_path_ends(path: memoryview) -> Tuple[str, str]:
+    """First and last token of a packed V3 path (token | fee(3) | token ...)."""
+    if len(path) < 43 or (len(path) - 20) % 23:
+        raise ValueError("bad v3 path")
+    return "0x" + path[:20].hex(), "0x" + path[-20:].hex()
+
+def _array_items(d: memoryview, pos: int) -> List[memoryview]:
+    """Elements of a bytes[] at `pos` as sub-views (element offsets are relative to the first head word)."""
+    n = _u256(d, pos)
+    base = pos + 32
+    return [_bytes_at(d, _dyn(d, base + 32 * i, base)) for i in range(n)]
+
+def _swap(token_in: str, token_out: str, amount_in: Optional[int], amount_out_min: Optional[int]) -> Dict[str, Any]:
+    return {"token_in": token_in, "token_out": token_out, "amount_in": amount_in, "amount_out_min": amount_out_min}
+
+# ---- Uniswap V2 router (and SwapRouter02 V2 methods) ----
+@register_decoder(
+    "swapExactETHForTokens(uint256,address[],address,uint256)",
+    "swapExactETHForTokensSupportingFeeOnTransferTokens(uint256,address[],address,uint256)",
+    dex="V2",
+)
+def _dec_v2_exact_eth_in(d: memoryview):
+    return _swap(*_addr_path_ends(d, _dyn(d, 32)), None, _u256(d, 0))
+
+@register_decoder("swapETHForExactTokens(uint256,address[],address,uint256)", dex="V2")
+def _dec_v2_eth_exact_out(d: memoryview):
+    return _swap(*_addr_path_ends(d, _dyn(d, 32)), None, _u256(d, 0))
+
+@register_decoder(
+    "swapExactTokensForTokens(uint256,uint256,address[],address,uint256)",
+    "swapExactTokensForTokensSupportingFeeOnTransferTokens(uint256,uint256,address[],address,uint256)",
+    "swapExactTokensForETH(uint256,uint256,address[],address,uint256)",
+    "swapExactTokensForETHSupportingFeeOnTransferTokens(uint256,uint256,address[],address,uint256)",
+    "swapExactTokensForTokens(uint256,uint256,address[],address)",
+    dex="V2",
+)
+def _dec_v2_exact_tokens_in(d: memoryview):
+    return _swap(*_addr_path_ends(d, _dyn(d, 64)), _u256(d, 0), _u256(d, 32))
+
+@register_decoder(
+    "swapTokensForExactTokens(uint256,uint256,address[],address,uint256)",
+    "swapTokensForExactETH(uint256,uint256,address[],address,uint256)",
+    "swapTokensForExactTokens(uint256,uint256,address[],address)",
+    dex="V2",
+)
+def _dec_v2_tokens_exact_out(d: memoryview):
+    return _swap(*_addr_path_ends(d, _dyn(d, 64)), _u256(d, 32), _u256(d, 0))
+
+# ---- Uniswap V3 SwapRouter (with deadline) and SwapRouter02 (without) ----
+# Single-hop params are static tuples (inline); path-based params are dynamic tuples behind an offset.
+@register_decoder("exactInputSingle((address,address,uint24,address,uint256,uint256,uint256,uint160))", dex="V3")
+def _dec_v3_exact_input_single(d: memoryview):
+    return _swap(_addr(d, 0), _addr(d, 32), _u256(d, 160), _u256(d, 192))
+
+@register_decoder("exactInputSingle((address,address,uint24,address,uint256,uint256,uint160))", dex="V3")
+def _dec_v3_exact_input_single_02(d: memoryview):
+    return _swap(_addr(d, 0), _addr(d, 32), _u256(d, 128), _u256(d, 160))
 
+@register_decoder("exactOutputSingle((address,address,uint24,address,uint256,uint256,uint256,uint160))", dex="V3")
+def _dec_v3_exact_output_single(d: memoryview):
+    return _swap(_addr(d, 0), _addr(d, 32), _u256(d, 192), _u256(d, 160))
+
+@register_decoder("exactOutputSingle((address,address,uint24,address,uint256,uint256,uint160))", dex="V3")
+def _dec_v3_exact_output_single_02(d: memoryview):
+    return _swap(_addr(d, 0), _addr(d, 32), _u256(d, 160), _u256(d, 128))
+
+@register_decoder("exactInput((bytes,address,uint256,uint256,uint256))", dex="V3")
+def _dec_v3_exact_input(d: memoryview):
+    t = _dyn(d, 0)
+    return _swap(*_v3_path_ends(_bytes_at(d, _dyn(d, t, t))), _u256(d, t + 96), _u256(d, t + 128))
+
+@register_decoder("exactInput((bytes,address,uint256,uint256))", dex="V3")
+def _dec_v3_exact_input_02(d: memoryview):
+    t = _dyn(d, 0)
+    return _swap(*_v3_path_ends(_bytes_at(d, _dyn(d, t, t))), _u256(d, t + 64), _u256(d, t + 96))
+
+@register_decoder("exactOutput((bytes,address,uint256,uint256,uint256))", dex="V3")
+def _dec_v3_exact_output(d: memoryview):
+    # exact-output paths are encoded in reverse (tokenOut first)
+    t = _dyn(d, 0)
+    first, last = _v3_path_ends(_bytes_at(d, _dyn(d, t, t)))
+    return _swap(last, first, _u256(d, t + 128), _u256(d, t + 96))
+
+@register_decoder("exactOutput((bytes,address,uint256,uint256))", dex="V3")
+def _dec_v3_exact_output_02(d: memoryview):
+    t = _dyn(d, 0)
+    first, last = _v3_path_ends(_bytes_at(d, _dyn(d, t, t)))
+    return _swap(last, first, _u256(d, t + 96), _u256(d, t + 64))
+
+# ---- multicall: decode inner calls, report the first swap ----
+def _first_inner_swap(calls: List[memoryview], depth: int) -> Optional[Dict[str, Any]]:
+    for inner in calls:
+        r = _decode_call(inner, depth + 1)
+        if r:
+            return r
+    return None
+
+@register_decoder("multicall(bytes[])", dex="multicall")
+def _dec_multicall(d: memoryview, depth: int = 0):
+    return _first_inner_swap(_array_items(d, _dyn(d, 0)), depth)
+
+@register_decoder("multicall(uint256,bytes[])", "multicall(bytes32,bytes[])", dex="multicall")
+def _dec_multicall_with_deadline(d: memoryview, depth: int = 0):
+    return _first_inner_swap(_array_items(d, _dyn(d, 32)), depth)
+
+# ---- Universal Router: execute(commands, inputs[, deadline]) ----
+UR_V3_SWAP_EXACT_IN = 0x00
+UR_V3_SWAP_EXACT_OUT = 0x01
+UR_V2_SWAP_EXACT_IN = 0x08
+UR_V2_SWAP_EXACT_OUT = 0x09
+UR_COMMAND_MASK = 0x3F
+UR_CONTRACT_BALANCE = 1 << 255  # "use the router's balance" sentinel (e.g. after WRAP_ETH)
+UR_SWAP_NAMES = {
+    UR_V3_SWAP_EXACT_IN: "V3_SWAP_EXACT_IN",
+    UR_V3_SWAP_EXACT_OUT: "V3_SWAP_EXACT_OUT",
+    UR_V2_SWAP_EXACT_IN: "V2_SWAP_EXACT_IN",
+    UR_V2_SWAP_EXACT_OUT: "V2_SWAP_EXACT_OUT",
+}
+
+def _ur_swap(command: int, inp: memoryview) -> Optional[Dict[str, Any]]:
+    # every swap input is (address recipient, uint256 a, uint256 b, path, bool payerIsUser)
+    if command not in UR_SWAP_NAMES:
+        return None
+    a, b = _u256(inp, 32), _u256(inp, 64)
+    if command in (UR_V3_SWAP_EXACT_IN, UR_V3_SWAP_EXACT_OUT):
+        first, last = _v3_path_ends(_bytes_at(inp, _dyn(inp, 96)))
+        if command == UR_V3_SWAP_EXACT_OUT:
+            return _swap(last, first, b, a)
+    else:
+        first, last = _addr_path_ends(inp, _dyn(inp, 96))
+        if command == UR_V2_SWAP_EXACT_OUT:
+            return _swap(first, last, b, a)
+    return _swap(first, last, None if a == UR_CONTRACT_BALANCE else a, b)
+
+def _dec_ur_commands(commands: memoryview, inputs: List[memoryview]) -> Optional[Dict[str, Any]]:
+    for command, inp in zip(commands, inputs):
+        command &= UR_COMMAND_MASK
+        r = _ur_swap(command, inp)
+        if r:
+            r["method"] = f"execute>{UR_SWAP_NAMES[command]}"
+            return r
     return None
 
-# -------------------- Simple native-coin USD pricing via CoinGecko --------------------
-_price_cache: Dict[str, Dict[str, float]] = {}
+@register_decoder("execute(bytes,bytes[],uint256)", "execute(bytes,bytes[])", dex="UniversalRouter")
+def _dec_ur_execute(d: memoryview):
+    return _dec_ur_commands(_bytes_at(d, _dyn(d, 0)), _array_items(d, _dyn(d, 32)))
 
-def get_native_usd(coingecko_id: str, cache_seconds: int = 60) -> Optional[float]:
-    if not coingecko_id:
+def _decode_call(data: memoryview, depth: int = 0) -> Optional[Dict[str, Any]]:
+    if len(data) < 4 or depth > MAX_MULTICALL_DEPTH:
+        return None
+    entry = _DECODERS.get(int.from_bytes(data[:4], "big"))
+    if entry is None:
         return None
-    now = time.time()
-    if coingecko_id in _price_cache and now - _price_cache[coingecko_id]["t"] < cache_seconds:
-        return _price_cache[coingecko_id]["p"]
+    name, dex, fn = entry
     try:
-        r = requests.get(
-            "https://api.coingecko.com/api/v3/simple/price",
-            params={"ids": coingecko_id, "vs_currencies": "usd"},
-            timeout=10,
-        )
-        usd = r.json()[coingecko_id]["usd"]
-        _price_cache[coingecko_id] = {"p": usd, "t": now}
-        return usd
-    except Exception:
+        r = fn(data[4:], depth) if dex == "multicall" else fn(data[4:])
+    except (ValueError, IndexError):
         return None
+    if not r:
+        return None
+    if dex == "multicall":
+        r["method"] = f"{name}>{r['method']}"
+        return r
+    r.setdefault("method", name)
+    r["dex"] = dex
+    return r
+
+def is_known_selector(input_hex: str) -> bool:
+    """Cheap pre-check on 0x-prefixed calldata hex before converting it to bytes."""
+    try:
+        return len(input_hex) >= 10 and int(input_hex[2:10], 16) in _DECODERS
+    except ValueError:
+        return False
+
+def parse_uniswap_call(input_data) -> Optional[Dict[str, Any]]:
+    """
+    Decode router calldata (bytes or memoryview) via the selector table: token_in/token_out
+    (lowercase hex) plus amount_in/amount_out_min.
+    Covers Uniswap V2, V3 SwapRouter/SwapRouter02 (incl. multicall) and Universal Router execute().
+    """
+    return _decode_call(memoryview(input_data))
+
+# -------------------- Price oracle (CoinGecko) --------------------
+COINGECKO_SIMPLE_PRICE = "https://api.coingecko.com/api/v3/simple/price"
+
+M_PRICE_AGE = METRICS.gauge("whale_price_age_seconds", "Seconds since the last good USD price (absent until first priced)",
+                            ("coin",))
+M_PRICE_STALE = METRICS.gauge("whale_price_stale", "1 while a USD price is missing or older than stale_after", ("coin",))
+
+class PriceOracle:
+    """
+    Background USD price service. Every `refresh_seconds` it fetches all registered CoinGecko ids
+    in one batched simple/price call, keeps the last good value per id when the API fails, and pushes
+    each new price to subscribers. Hot-path lookups (get/age) are plain dict reads.
+    Every id's price age and staleness are exported as gauges, so a stuck feed can alert.
+    """
+    def __init__(self, refresh_seconds: float = 60, stale_after: float = 600, url: str = COINGECKO_SIMPLE_PRICE):
+        self.refresh_seconds = max(5.0, float(refresh_seconds))
+        self.stale_after = float(stale_after)
+        self.url = url
+        self.prices: Dict[str, float] = {}
+        self.updated: Dict[str, float] = {}  # id -> monotonic time of last good value
+        self._ids: set = set()
+        self._subs: Dict[str, List[Callable[[float], None]]] = {}
+        self._first = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+
+    def add_ids(self, ids) -> None:
+        for i in ids:
+            if i and i not in self._ids:
+                self._ids.add(i)
+                # age() is None until first priced; raising makes the scrape omit the sample
+                M_PRICE_AGE.track(lambda i=i: self.age(i) + 0.0, i)
+                M_PRICE_STALE.track(lambda i=i: int(self.is_stale(i)), i)
+
+    def subscribe(self, coingecko_id: str, cb: Callable[[float], None]) -> None:
+        """Call `cb(price)` on every update for `coingecko_id` (immediately if a price is already known)."""
+        self.add_ids([coingecko_id])
+        self._subs.setdefault(coingecko_id, []).append(cb)
+        if coingecko_id in self.prices:
+            cb(self.prices[coingecko_id])
+
+    def get(self, coingecko_id: str) -> Optional[float]:
+        return self.prices.get(coingecko_id)
+
+    def age(self, coingecko_id: str) -> Optional[float]:
+        """Seconds since the last good price, None if never priced."""
+        t = self.updated.get(coingecko_id)
+        return time.monotonic() - t if t is not None else None
+
+    def is_stale(self, coingecko_id: str) -> bool:
+        age = self.age(coingecko_id)
+        return age is None or age > self.stale_after
+
+    def describe(self, coingecko_id: str) -> str:
+        p, age = self.get(coingecko_id), self.age(coingecko_id)
+        if p is None:
+            return f"{coingecko_id}=n/a"
+        return f"{coingecko_id}=${p:,.2f} age={age:.0f}s{' STALE' if self.is_stale(coingecko_id) else ''}"
+
+    async def refresh(self) -> bool:
+        if not self._ids:
+            return True
+        ids = sorted(self._ids)
+        try:
+            status, _, body = await http_client().get_json(
+                self.url, params={"ids": ",".join(ids), "vs_currencies": "usd"}, timeout=10
+            )
+            if status >= 300 or not isinstance(body, dict):
+                raise RuntimeError(f"HTTP {status} {str(body)[:200]}")
+        except Exception as e:
+            print("[prices] refresh failed; keeping last good values:", e)
+            return False
+        rec = recorder()
+        if rec:
+            rec.price(body)
+        now = time.monotonic()
+        for i in ids:
+            usd = (body.get(i) or {}).get("usd")
+            if usd is None:
+                continue
+            self.prices[i] = float(usd)
+            self.updated[i] = now
+            for cb in self._subs.get(i, ()):
+                try:
+                    cb(self.prices[i])
+                except Exception as e:
+                    print("[prices] subscriber error:", e)
+        return True
+
+    async def run(self):
+        while True:
+            ok = await self.refresh()
+            self._first.set()
+            for i in sorted(self._ids):
+                if self.is_stale(i):
+                    print("[prices][WARN] stale price:", self.describe(i))
+            await asyncio.sleep(self.refresh_seconds if ok else min(30.0, self.refresh_seconds))
+
+    def start(self) -> asyncio.Task:
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self.run())
+        return self._task
+
+    async def wait_ready(self, timeout: float = 15) -> None:
+        """Wait (bounded) for the first refresh attempt so watchers start with a price."""
+        try:
+            await asyncio.wait_for(self._first.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+
+_oracle: Optional[PriceOracle] = None
+
+def init_price_oracle(opts: Optional[dict] = None) -> PriceOracle:
+    """(Re)configure the shared oracle from the `prices` config section."""
+    global _oracle
+    o = opts or {}
+    _oracle = PriceOracle(
+        refresh_seconds=float(o.get("refresh_seconds", 60)),
+        stale_after=float(o.get("stale_after", 600)),
+        url=o.get("url", COINGECKO_SIMPLE_PRICE),
+    )
+    return _oracle
+
+def price_oracle() -> PriceOracle:
+    return _oracle or init_price_oracle()
 
 # -------------------- Config dataclasses --------------------
 @dataclass
 class EvmChainCfg:
     name: str
-    ws: str              # WebSocket RPC (for eth_subscribe)
-    http: Optional[str]  # HTTP RPC (for eth_getTransactionByHash) - strongly recommended
+    ws: str              # WebSocket RPC (for eth_subscribe); the first of ws_endpoints
+    http: Optional[str]  # HTTP RPC (for eth_getTransactionByHash) - strongly recommended; the first of http_urls
     explorer: str
     native_symbol: str
     native_coingecko: str
     routers: Dict[str, str]
     min_usd: float
     min_native: float
-    whales: set
+    whales: "WhaleRegistry"       # shared by all chains and AutoLearn
+    pending_mode: str = "hashes"  # "hashes" | "full" | "alchemy" (see evm_ws_sub)
+    fetch_batch_size: int = 50    # max hashes per eth_getTransactionByHash batch
+    fetch_batch_ms: int = 25      # max time a hash waits for its batch to fill
+    fetch_workers: int = 4        # concurrent batch fetchers between subscription and scoring
+    queue_size: int = 10000       # bound on each pipeline stage queue; under the drop policies router txs
+                                  # may use up to queue_size more slots rather than wait (see BoundedStage)
+    overflow_policy: str = "drop_oldest"  # "block" | "drop_oldest" | "drop_non_router"
+    stats_interval: int = 60      # seconds between pipeline stats lines (0 = off)
+    # on-chain token pricing (TokenPricer); disabled unless wrapped_native and a factory are set
+    wrapped_native: Optional[str] = None
+    v2_factory: Optional[str] = None
+    v3_factory: Optional[str] = None
+    v3_fees: List[int] = field(default_factory=lambda: [100, 500, 3000, 10000])
+    min_pool_native: float = 2.0     # ignore pools with less native-side liquidity than this
+    token_price_ttl: float = 12.0    # seconds a pool quote is reused (~ one block)
+    token_price_cache: int = 5000    # max tokens kept in the quote / pool caches
+    token_price_timeout: float = 2.0 # seconds a pool eth_call batch may take (an unpriced swap just doesn't alert)
+    alert_workers: int = 8           # concurrent alert tasks (token pricing, metadata, Discord) behind the scorer
+    alert_queue_size: int = 1000     # accepted txs waiting for an alert worker (up to 2x for whale/big-value alerts)
+    dedup_ttl: int = 600             # seconds a pending hash stays in the seen set (re-announcements are dropped)
+    dedup_max: int = 200000          # max hashes remembered (~ a fixed memory ceiling)
+    # several providers: every ws is subscribed at once (first announcement wins), http goes to the healthiest
+    ws_endpoints: List[Tuple[str, str]] = field(default_factory=list)  # (url, pending_mode)
+    http_urls: List[str] = field(default_factory=list)
 
 @dataclass
 class SolanaCfg:
@@ -142,277 +1294,1773 @@ class SolanaCfg:
     explorer_tx: str
     program_ids: List[str]
     whales: List[str]
+    ws_connections: int = 1  # websocket connections the logsSubscribe filters are multiplexed over
+    dedup_ttl: int = 600     # seconds a signature stays in the cross-filter dedup set
+    dedup_max: int = 200000  # max signatures remembered
+    stats_interval: int = 60 # seconds between stats lines (0 = off)
+    native_coingecko: str = "solana"
+    min_usd: float = 50000   # thresholds.min_usd; whale signers alert regardless
+    enrich_workers: int = 4      # concurrent getTransaction batchers
+    enrich_batch_size: int = 20  # signatures per getTransaction batch
+    enrich_batch_ms: int = 50    # max time a signature waits for its batch to fill
+    enrich_retries: int = 3      # getTransaction attempts for a signature the RPC does not have yet
+    enrich_retry_delay: float = 1.0  # seconds before a null signature is re-queued
+    queue_size: int = 5000       # bound on the enrichment queue (drop-oldest)
 
 # -------------------- Auto-learn (EVM) --------------------
+def learned_whales_path(cfg: dict) -> str:
+    """`autolearn.learned_file`; by default next to the autolearn state file, else next to the config."""
+    a = cfg.get("autolearn") or {}
+    if a.get("learned_file"):
+        return a["learned_file"]
+    if a.get("state_file"):
+        return os.path.join(os.path.dirname(a["state_file"]), "learned_whales.txt")
+    return default_state_path("learned_whales.txt")
+
+def load_learned_whales(path: str) -> List[str]:
+    """Addresses from the append-only learned-whales file (one per line, '#' comments); [] if missing."""
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return [ln.strip() for ln in f if ln.strip() and not ln.lstrip().startswith("#")]
+    except FileNotFoundError:
+        return []
+    except Exception as e:
+        print("[autolearn] read learned whales error:", e)
+        return []
+
+def append_learned_whales(path: str, addresses: List[str]):
+    """Append a batch of addresses under an exclusive lock so concurrent writers never interleave lines."""
+    parent = os.path.dirname(path)
+    if parent:
+        os.makedirs(parent, exist_ok=True)
+    with open(path, "a", encoding="utf-8") as f:
+        if fcntl:
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+        try:
+            f.write("".join(a + "\n" for a in addresses))
+            f.flush()
+            os.fsync(f.fileno())
+        finally:
+            if fcntl:
+                fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+
+# -------------------- Whale registry (EVM) --------------------
+class WhaleRegistry:
+    """
+    The single set of watched EVM addresses, shared by reference by every chain watcher and AutoLearn.
+    Addresses are held as 20-byte keys (about half the memory of 42-char hex strings) and accept any
+    hex casing. add() bumps `version` and is visible to all holders immediately.
+    """
+    def __init__(self, addresses=(), source: str = ""):
+        self._keys: set = set()
+        self.version = 0
+        self.update(addresses, source)
+
+    @staticmethod
+    def key(address) -> Optional[bytes]:
+        if isinstance(address, (bytes, bytearray)):
+            return bytes(address) if len(address) == 20 else None
+        if not isinstance(address, str) or len(address) != 42 or address[:2] not in ("0x", "0X"):
+            return None
+        try:
+            return bytes.fromhex(address[2:])
+        except ValueError:
+            return None
+
+    def add(self, address) -> bool:
+        """True if the address was new."""
+        k = self.key(address)
+        if k is None or k in self._keys:
+            return False
+        self._keys.add(k)
+        self.version += 1
+        return True
+
+    def update(self, addresses, source: str = "") -> int:
+        """Add many addresses; entries that are not 0x-prefixed 20-byte hex are logged and skipped."""
+        n = 0
+        for a in addresses:
+            if self.key(a) is None:
+                print(f"[whales][WARN] ignoring malformed address{' in ' + source if source else ''}: {a!r}")
+            elif self.add(a):
+                n += 1
+        if n:
+            print(f"[whales] +{n} address(es), {len(self._keys)} total (v{self.version})")
+        return n
+
+    def __contains__(self, address) -> bool:
+        return self.key(address) in self._keys
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+    def snapshot(self) -> str:
+        return f"whales={len(self._keys)} v{self.version}"
+
+def load_evm_whales(c: dict) -> WhaleRegistry:
+    """whales_evm from config plus everything AutoLearn has appended to its learned file."""
+    whales = WhaleRegistry(c.get("whales_evm") or [], source="whales_evm")
+    path = learned_whales_path(c)
+    whales.update(load_learned_whales(path), source=path)
+    return whales
+
+M_AUTOLEARN = METRICS.counter("whale_autolearn_events_total", "AutoLearn qualifying buys, promotions and evictions", ("event",))
+M_AUTOLEARN_TRACKED = METRICS.gauge("whale_autolearn_tracked_addresses", "Addresses with qualifying buys inside the window")
+M_WHALES = METRICS.gauge("whale_registry_addresses", "Watched EVM whale addresses")
+
 class AutoLearn:
-    """Promote repeat large EVM buyers to whales_evm and persist to config.yaml."""
-    def __init__(self, cfg: dict, config_path: str, whales_set: set):
+    """
+    Promote repeat large EVM buyers to whales and persist them to the append-only `learned_file`
+    (merged with config whales_evm by load_evm_whales at startup; config.yaml is never rewritten).
+    Each tracked address keeps only its last `occurrences` qualifying timestamps (a fixed-size deque),
+    in an LRU-ordered map, so consider() is O(1). run() evicts addresses idle for longer than the window
+    (and the least recently seen beyond `max_tracked`) and writes the state file when dirty, at most
+    every `save_interval` seconds, atomically and off the event loop.
+    """
+    def __init__(self, cfg: dict, whales: "WhaleRegistry"):
         a = cfg.get("autolearn", {})
         self.enabled = bool(a.get("enabled", False))
         self.min_usd = float(a.get("min_usd", 250000))
-        self.occurrences = int(a.get("occurrences", 3))
+        self.occurrences = max(1, int(a.get("occurrences", 3)))
         self.window_hours = int(a.get("window_hours", 24))
         self.max_new_per_day = int(a.get("max_new_per_day", 5))
-        self.state_file = a.get("state_file", "autolearn_state.json")
+        self.state_file = a.get("state_file") or default_state_path("autolearn_state.json")
         self.persist_to_config = bool(a.get("persist_to_config", True))
-        self.config_path = config_path
-        self.whales_set = whales_set
-        self.state = {"counters": {}, "day": self._today(), "added_today": 0}
-        try:
-            if os.path.exists(self.state_file):
-                import json as _json
-                with open(self.state_file, "r", encoding="utf-8") as f:
-                    self.state = _json.load(f)
-        except Exception:
-            pass
+        self.learned_file = learned_whales_path(cfg)
+        self.save_interval = float(a.get("save_interval", 5))
+        self.max_tracked = int(a.get("max_tracked", 100000))
+        self.whales = whales
+        self.window = self.window_hours * 3600
+        self.counters: "OrderedDict[str, deque]" = OrderedDict()
+        self.day = self._today()
+        self.added_today = 0
+        self.evicted = 0
+        self._dirty = False
+        self._learned: List[str] = []  # promoted since the last flush
+        self._exec = ThreadPoolExecutor(max_workers=1, thread_name_prefix="autolearn")
+        self._task: Optional[asyncio.Task] = None
+        self._m_considered = M_AUTOLEARN.labels("considered")
+        self._m_promoted = M_AUTOLEARN.labels("promoted")
+        M_AUTOLEARN.track(lambda: self.evicted, "evicted")
+        M_AUTOLEARN_TRACKED.track(self.counters.__len__)
+        self._load_state()
 
     def _today(self) -> str:
         return datetime.date.today().isoformat()
 
-    def _save_state(self):
+    def _load_state(self):
         try:
-            import json as _json
-            with open(self.state_file, "w", encoding="utf-8") as f:
-                _json.dump(self.state, f)
+            if not os.path.exists(self.state_file):
+                return
+            with open(self.state_file, "r", encoding="utf-8") as f:
+                st = json.load(f)
         except Exception as e:
-            print("[autolearn] save state error:", e)
+            print("[autolearn] load state error:", e)
+            return
+        if st.get("day") == self.day:
+            self.added_today = int(st.get("added_today", 0))
+        cutoff = time.time() - self.window
+        recent = []
+        for addr, ts in (st.get("counters") or {}).items():
+            ts = sorted(t for t in ts if t >= cutoff)
+            if ts:
+                recent.append((ts[-1], addr, ts))
+        for _, addr, ts in sorted(recent):  # oldest first, so LRU order survives restarts
+            self.counters[addr] = deque(ts, maxlen=self.occurrences)
+        self._evict(time.time())
 
     def _reset_day_if_needed(self):
         today = self._today()
-        if self.state.get("day") != today:
-            self.state["day"] = today
-            self.state["added_today"] = 0
+        if self.day != today:
+            self.day = today
+            self.added_today = 0
+            self._dirty = True
 
     def consider(self, address: str, est_usd: Optional[float]) -> Optional[str]:
         """Return address if newly learned; else None."""
         if not self.enabled:
             return None
         addr = (address or "").lower()
-        if addr in self.whales_set:
+        if addr in self.whales:
             return None
         if (est_usd or 0) < self.min_usd:
             return None
 
+        self._m_considered.inc()
         now = time.time()
-        window = self.window_hours * 3600
-        c = self.state.setdefault("counters", {}).setdefault(addr, [])
-        # prune & append
-        c = [t for t in c if now - t <= window]
+        c = self.counters.get(addr)
+        if c is None:
+            c = self.counters[addr] = deque(maxlen=self.occurrences)
+            if len(self.counters) > self.max_tracked:
+                self.counters.popitem(last=False)
+                self.evicted += 1
+        else:
+            self.counters.move_to_end(addr)
         c.append(now)
-        self.state["counters"][addr] = c
+        self._dirty = True
         self._reset_day_if_needed()
 
-        if len(c) >= self.occurrences and self.state["added_today"] < self.max_new_per_day:
-            # promote
-            self.whales_set.add(addr)
-            self.state["added_today"] += 1
-            if self.persist_to_config:
-                try:
-                    with open(self.config_path, "r", encoding="utf-8") as f:
-                        cfg_full = yaml.safe_load(f) or {}
-                    lst = cfg_full.get("whales_evm", [])
-                    if addr not in [a.lower() for a in lst]:
-                        lst.append(address)  # preserve original case
-                        cfg_full["whales_evm"] = lst
-                        with open(self.config_path, "w", encoding="utf-8") as f:
-                            yaml.safe_dump(cfg_full, f, sort_keys=False)
-                except Exception as e:
-                    print("[autolearn] persist-to-config error:", e)
-            self._save_state()
-            return address
-        else:
-            self._save_state()
+        # the deque holds the last `occurrences` hits; all of them inside the window means promote
+        if len(c) < self.occurrences or now - c[0] > self.window or self.added_today >= self.max_new_per_day:
             return None
+        self.whales.add(addr)
+        self.added_today += 1
+        self._m_promoted.inc()
+        del self.counters[addr]
+        if self.persist_to_config:
+            self._learned.append(address)  # preserve original case
+        return address
+
+    def _evict(self, now: float) -> int:
+        """Drop addresses whose newest hit left the window; LRU order means we stop at the first live one."""
+        cutoff = now - self.window
+        n = 0
+        while self.counters:
+            addr, c = next(iter(self.counters.items()))
+            if c and c[-1] >= cutoff:
+                break
+            self.counters.popitem(last=False)
+            n += 1
+        self.evicted += n
+        return n
+
+    def _snapshot(self) -> dict:
+        return {
+            "counters": {a: list(c) for a, c in self.counters.items()},
+            "day": self.day,
+            "added_today": self.added_today,
+        }
+
+    def _write_state(self, state: dict):
+        tmp = f"{self.state_file}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(state, f, separators=(",", ":"))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, self.state_file)
+
+    async def save(self):
+        loop = asyncio.get_running_loop()
+        if self._learned:
+            learned, self._learned = self._learned, []
+            try:
+                await loop.run_in_executor(self._exec, append_learned_whales, self.learned_file, learned)
+            except Exception as e:
+                self._learned[:0] = learned
+                print("[autolearn] persist learned whales error:", e)
+        if self._evict(time.time()):
+            self._dirty = True
+        if not self._dirty:
+            return
+        self._dirty = False
+        try:
+            await loop.run_in_executor(self._exec, self._write_state, self._snapshot())
+        except Exception as e:
+            self._dirty = True
+            print("[autolearn] save state error:", e)
+
+    async def run(self):
+        try:
+            while True:
+                await asyncio.sleep(self.save_interval)
+                await self.save()
+        finally:
+            if self._learned:
+                append_learned_whales(self.learned_file, self._learned)
+                self._learned = []
+            if self._dirty:
+                self._write_state(self._snapshot())
+
+    def start(self) -> asyncio.Task:
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self.run())
+        return self._task
+
+# -------------------- JSON-RPC endpoints --------------------
+def endpoint_labels(urls: List[str]) -> List[str]:
+    """Metric/log names for provider URLs: the host (URLs often embed API keys), suffixed on collisions."""
+    hosts = [urlsplit(u).hostname or "?" for u in urls]
+    return [h if hosts.count(h) == 1 else f"{h}#{i}" for i, h in enumerate(hosts)]
+
+def redact_url(url: str) -> str:
+    """scheme://host[:port] - drops credentials, path and query, where providers put API keys."""
+    p = urlsplit(url)
+    return f"{p.scheme}://{p.hostname}{f':{p.port}' if p.port else ''}" if p.hostname else ""
+
+M_HTTP_REQUESTS = METRICS.counter("whale_http_endpoint_requests_total", "Batched JSON-RPC requests per HTTP endpoint",
+                                  ("chain", "endpoint", "outcome"))
+M_HTTP_LATENCY = METRICS.gauge("whale_http_endpoint_latency_seconds", "Rolling (EWMA) request latency per HTTP endpoint",
+                               ("chain", "endpoint"))
+M_HTTP_ERROR_RATIO = METRICS.gauge("whale_http_endpoint_error_ratio", "Rolling (EWMA) error ratio per HTTP endpoint",
+                                   ("chain", "endpoint"))
+
+class HttpEndpoint:
+    __slots__ = ("url", "label", "latency", "errors", "ok", "failed", "last_pick")
+
+    def __init__(self, url: str, label: str):
+        self.url = url
+        self.label = label
+        self.latency: Optional[float] = None  # EWMA seconds of successful requests
+        self.errors = 0.0                     # EWMA of failed requests (0..1)
+        self.ok = 0
+        self.failed = 0
+        self.last_pick = 0
+
+class HttpEndpoints:
+    """
+    The HTTP RPC endpoints of one chain, ranked by rolling health. Every request reports its latency
+    and outcome into per-endpoint EWMAs and `pick()` returns the lowest latency + error_penalty * error
+    ratio (seconds), so a slow or failing provider loses traffic within a few requests. Untried
+    endpoints go first, and every `explore_every`th pick goes to the least recently used one so a
+    recovered provider can win its traffic back.
+    """
+    def __init__(self, chain: str, urls: List[str], alpha: float = 0.2, error_penalty: float = 1.0,
+                 explore_every: int = 20):
+        self.chain = chain
+        self.endpoints = [HttpEndpoint(u, l) for u, l in zip(urls, endpoint_labels(urls))]
+        self.alpha = float(alpha)
+        self.error_penalty = float(error_penalty)
+        self.explore_every = max(2, int(explore_every))
+        self._picks = 0
+
+    def __len__(self) -> int:
+        return len(self.endpoints)
+
+    def _score(self, ep: HttpEndpoint) -> float:
+        if not ep.ok and not ep.failed:
+            return -1.0
+        return (ep.latency or 0.0) + self.error_penalty * ep.errors
+
+    def pick(self, exclude: Tuple[HttpEndpoint, ...] = ()) -> HttpEndpoint:
+        candidates = [ep for ep in self.endpoints if ep not in exclude] or self.endpoints
+        self._picks += 1
+        if len(candidates) > 1 and self._picks % self.explore_every == 0:
+            ep = min(candidates, key=lambda e: e.last_pick)
+        else:
+            ep = min(candidates, key=self._score)
+        ep.last_pick = self._picks
+        return ep
+
+    def report(self, ep: HttpEndpoint, dt: float, failed: float):
+        """One request's latency and the share (0..1) of its calls that failed, transport errors being 1."""
+        a = self.alpha
+        ep.errors += a * (failed - ep.errors)
+        if failed < 1.0:
+            ep.latency = dt if ep.latency is None else ep.latency + a * (dt - ep.latency)
+        if failed:
+            ep.failed += 1
+        else:
+            ep.ok += 1
+
+    def track_metrics(self):
+        for ep in self.endpoints:
+            M_HTTP_REQUESTS.track(lambda ep=ep: ep.ok, self.chain, ep.label, "ok")
+            M_HTTP_REQUESTS.track(lambda ep=ep: ep.failed, self.chain, ep.label, "error")
+            M_HTTP_LATENCY.track(lambda ep=ep: ep.latency or 0.0, self.chain, ep.label)
+            M_HTTP_ERROR_RATIO.track(lambda ep=ep: ep.errors, self.chain, ep.label)
+
+    def snapshot(self) -> str:
+        return "http " + " ".join(
+            f"{ep.label}={(ep.latency or 0) * 1000:.0f}ms/err={ep.errors:.0%}/n={ep.ok + ep.failed}" for ep in self.endpoints
+        )
+
+_http_endpoints: Dict[str, HttpEndpoints] = {}
+
+def http_endpoints(cfg: "EvmChainCfg") -> Optional[HttpEndpoints]:
+    """The chain's shared endpoint set (None without http), so fetches, pricing and metadata share health stats."""
+    if not cfg.http_urls:
+        return None
+    eps = _http_endpoints.get(cfg.name)
+    if eps is None:
+        eps = _http_endpoints[cfg.name] = HttpEndpoints(cfg.name, cfg.http_urls)
+        eps.track_metrics()
+    return eps
+
+# -------------------- JSON-RPC batching --------------------
+class RpcBatcher:
+    """
+    Coalesce single JSON-RPC calls into batch requests.
+    A batch is sent when `batch_size` calls are queued or `batch_ms` after the first one,
+    whichever comes first; each caller gets its own `result` (None on any error).
+    `url` may be an HttpEndpoints set: each batch goes to its healthiest endpoint, and the calls
+    that failed there (transport errors, or per-call `error` entries such as rate limits inside
+    a batch) are retried once on the next best.
+    """
+    def __init__(self, url: Union[str, HttpEndpoints], method: str, batch_size: int = 50, batch_ms: int = 25, timeout: float = 10):
+        self.endpoints = url if isinstance(url, HttpEndpoints) else None
+        self.url = self.endpoints.endpoints[0].url if self.endpoints else url
+        self.method = method
+        self.batch_size = max(1, int(batch_size))
+        self.batch_ms = max(0, int(batch_ms))
+        self.timeout = timeout
+        self._pending: List[Tuple[list, asyncio.Future]] = []
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._sends: set = set()
+
+    async def call(self, *params) -> Any:
+        loop = asyncio.get_running_loop()
+        fut = loop.create_future()
+        self._pending.append((list(params), fut))
+        if len(self._pending) >= self.batch_size:
+            self._flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.batch_ms / 1000, self._flush)
+        return await fut
+
+    def _flush(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        batch, self._pending = self._pending, []
+        if batch:
+            t = asyncio.ensure_future(self._send(batch))
+            self._sends.add(t)
+            t.add_done_callback(self._sends.discard)
+
+    async def _send(self, batch: List[Tuple[list, asyncio.Future]]):
+        results: Dict[int, Any] = {}
+        pending = list(range(len(batch)))  # calls without an answer yet
+        eps = self.endpoints
+        tried: Tuple[HttpEndpoint, ...] = ()
+        for _ in range(min(2, len(eps)) if eps else 1):
+            ep = eps.pick(tried) if eps else None
+            where = f" via {ep.label}" if ep and len(eps) > 1 else ""
+            payload = [{"jsonrpc":"2.0","id":i,"method":self.method,"params":batch[i][0]} for i in pending]
+            asked = len(pending)
+            t0 = time.monotonic()
+            try:
+                _, _, resp = await http_client().post_json(ep.url if ep else self.url, payload, timeout=self.timeout)
+                if isinstance(resp, list):
+                    errors = [r for r in resp if isinstance(r, dict) and r.get("error") is not None]
+                    answered = {r.get("id"): r.get("result") for r in resp if isinstance(r, dict) and r.get("error") is None}
+                    results.update(answered)
+                    pending = [i for i in pending if i not in results]
+                    if errors:
+                        # per-call errors (rate limits, ...) would otherwise read as null results
+                        print(f"[rpc] {self.method} {len(errors)}/{asked} calls failed{where}:", str(errors[0].get("error"))[:200])
+                    rec = recorder()
+                    if rec:
+                        dt = time.monotonic() - t0
+                        for i in answered:
+                            if isinstance(i, int) and 0 <= i < len(batch):
+                                rec.rpc(self.method, batch[i][0], answered[i], dt)
+                else:
+                    # some providers answer a rejected batch with a single error object
+                    print(f"[rpc] {self.method} batch rejected{where}:", str(resp)[:200])
+            except Exception as e:
+                print(f"[rpc] {self.method} batch of {asked} failed{where}:", e)
+            if ep:
+                eps.report(ep, time.monotonic() - t0, len(pending) / asked)
+                tried += (ep,)
+            if not pending:
+                break
+        for i, (_, fut) in enumerate(batch):
+            if not fut.done():
+                fut.set_result(results.get(i))
+
+# -------------------- Pipeline stages --------------------
+OVERFLOW_POLICIES = ("block", "drop_oldest", "drop_non_router")
+
+M_QUEUE_DEPTH = METRICS.gauge("whale_queue_depth", "Items waiting in a pipeline stage", ("pipeline", "stage"))
+M_QUEUE_ITEMS = METRICS.counter("whale_queue_items_total", "Items enqueued into / dropped by a pipeline stage",
+                                ("pipeline", "stage", "outcome"))
+
+class BoundedStage:
+    """
+    Bounded FIFO between pipeline stages with an explicit overflow policy:
+      block           - producer waits for room (backpressure all the way to the socket)
+      drop_oldest     - evict the oldest queued non-`keep` item to make room, else drop the new item
+      drop_non_router - drop the new item unless it is known to be a router tx (`keep=True`)
+    Under the drop policies a `keep=True` item never waits and never evicts another keep item: it
+    displaces the oldest non-keep item, or else takes one of `maxsize` extra overflow slots. Only when
+    those are full too is it dropped, and counted in `dropped_keep`. The hard bound on depth (and
+    `high_water`) is therefore 2 * maxsize under the drop policies, and maxsize under `block`.
+    """
+    def __init__(self, name: str, maxsize: int, policy: str = "drop_oldest"):
+        if policy not in OVERFLOW_POLICIES:
+            raise ValueError(f"unknown overflow policy {policy!r} (expected one of {OVERFLOW_POLICIES})")
+        self.name = name
+        self.policy = policy
+        self.maxsize = max(1, int(maxsize))
+        # keep and non-keep items queue separately so eviction can skip keep items in O(1);
+        # the sequence number restores arrival order across the two on get
+        self._keep: deque = deque()
+        self._rest: deque = deque()
+        self._seq = 0
+        self._readable = asyncio.Event()
+        self._writable = asyncio.Event()
+        self._writable.set()
+        self.enqueued = 0
+        self.dropped = 0
+        self.dropped_keep = 0
+        self.high_water = 0
+
+    async def put(self, item: Any, keep: bool = False) -> bool:
+        """Enqueue per policy; returns False if the new item was dropped instead."""
+        if self.policy == "block":
+            while self.depth() >= self.maxsize:
+                self._writable.clear()
+                await self._writable.wait()
+        return self.put_nowait(item, keep)
+
+    def put_nowait(self, item: Any, keep: bool = False) -> bool:
+        """Enqueue without waiting: a full `block` stage is treated like `drop_oldest`."""
+        if self.depth() >= self.maxsize:
+            if self._rest and (keep or self.policy != "drop_non_router"):
+                self._rest.popleft()
+                self.dropped += 1
+            elif not keep or self.depth() >= 2 * self.maxsize:
+                self.dropped += 1
+                if keep:
+                    self.dropped_keep += 1
+                return False
+        self._seq += 1
+        (self._keep if keep else self._rest).append((self._seq, item))
+        self._readable.set()
+        self.enqueued += 1
+        depth = self.depth()
+        if depth > self.high_water:
+            self.high_water = depth
+        return True
+
+    async def get(self) -> Any:
+        while not (self._keep or self._rest):
+            await self._readable.wait()
+        return self.get_nowait()
+
+    def get_nowait(self) -> Any:
+        k, r = self._keep, self._rest
+        if not k and not r:
+            raise asyncio.QueueEmpty
+        item = (k if not r or (k and k[0][0] < r[0][0]) else r).popleft()[1]
+        if not k and not r:
+            self._readable.clear()
+        if len(k) + len(r) < self.maxsize:
+            self._writable.set()
+        return item
+
+    def depth(self) -> int:
+        return len(self._keep) + len(self._rest)
+
+    def track_metrics(self, pipeline: str):
+        M_QUEUE_DEPTH.track(self.depth, pipeline, self.name)
+        M_QUEUE_ITEMS.track(lambda: self.enqueued, pipeline, self.name, "enqueued")
+        M_QUEUE_ITEMS.track(lambda: self.dropped, pipeline, self.name, "dropped")
+        M_QUEUE_ITEMS.track(lambda: self.dropped_keep, pipeline, self.name, "dropped_keep")
+
+    def snapshot(self) -> str:
+        s = f"{self.name}={self.depth()}/{self.maxsize} hw={self.high_water} drop={self.dropped}"
+        if self.dropped_keep:
+            s += f" drop_keep={self.dropped_keep}"
+        self.high_water = self.depth()
+        return s
+
+# -------------------- Dedup cache --------------------
+M_DEDUP_SIZE = METRICS.gauge("whale_dedup_size", "Keys held by a dedup cache", ("pipeline",))
+M_DEDUP_LOOKUPS = METRICS.counter("whale_dedup_lookups_total", "Dedup cache lookups by result", ("pipeline", "result"))
+
+class SeenCache:
+    """
+    Time- and size-bounded "seen" set made of two rotating generations.
+    A key is remembered for at least `ttl` seconds (at most 2*ttl), unless `max_size`
+    newer keys push its generation out first; memory never exceeds ~max_size keys.
+    """
+    def __init__(self, ttl: float = 600, max_size: int = 200_000):
+        self.ttl = float(ttl)
+        self.max_size = max(2, int(max_size))
+        self._half = self.max_size // 2
+        self._cur: Dict[Any, Any] = {}  # key -> mark stored when first seen
+        self._old: Dict[Any, Any] = {}
+        self._rotated = time.monotonic()
+        self.hits = 0
+        self.misses = 0
+
+    def first_seen(self, key, mark: Any = True) -> Any:
+        """None for a new key (remembered with `mark`); for a duplicate, the mark stored when it was first seen."""
+        now = time.monotonic()
+        if len(self._cur) >= self._half or now - self._rotated >= self.ttl:
+            self._old, self._cur = self._cur, {}
+            self._rotated = now
+        m = self._cur.get(key)
+        if m is None:
+            m = self._old.get(key)
+        if m is not None:
+            self.hits += 1
+            return m
+        self._cur[key] = mark
+        self.misses += 1
+        return None
+
+    def check_and_add(self, key) -> bool:
+        """True if `key` was already seen (a duplicate); otherwise remember it and return False."""
+        return self.first_seen(key) is not None
+
+    def __contains__(self, key) -> bool:
+        """Membership test that neither remembers `key` nor counts as a lookup."""
+        return key in self._cur or key in self._old
+
+    def __len__(self) -> int:
+        return len(self._cur) + len(self._old)
+
+    def hit_rate(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    def track_metrics(self, pipeline: str):
+        M_DEDUP_SIZE.track(self.__len__, pipeline)
+        M_DEDUP_LOOKUPS.track(lambda: self.hits, pipeline, "hit")
+        M_DEDUP_LOOKUPS.track(lambda: self.misses, pipeline, "miss")
+
+    def snapshot(self) -> str:
+        return f"size={len(self)}/{self.max_size} hits={self.hits} misses={self.misses} hit_rate={self.hit_rate():.1%}"
+
+# -------------------- Filter chains --------------------
+# predicate outcomes
+REJECT, PASS, ACCEPT = 0, 1, 2
+
+M_FILTER = METRICS.counter("whale_filter_total", "Filter predicate outcomes", ("pipeline", "predicate", "result"))
+
+class FilterChain:
+    """
+    Ordered predicate pipeline. Each predicate returns REJECT (drop, stop), PASS (undecided, go on)
+    or ACCEPT (qualifies, skip the remaining predicates); reaching the end after PASSes also qualifies.
+    Per-predicate counters show where items are filtered, so the order can be tuned from metrics:
+    put the cheapest, most selective checks first.
+    """
+    def __init__(self, stages: List[Tuple[str, Callable[[Any], int]]]):
+        self.names = [name for name, _ in stages]
+        self.fns = [fn for _, fn in stages]
+        self.counts = {name: [0, 0, 0] for name in self.names}  # [reject, pass, accept]
+        self._counts = [self.counts[name] for name in self.names]
+
+    def run(self, item: Any) -> bool:
+        for fn, counts in zip(self.fns, self._counts):
+            r = fn(item)
+            counts[r] += 1
+            if r == REJECT:
+                return False
+            if r == ACCEPT:
+                return True
+        return True
+
+    def track_metrics(self, pipeline: str):
+        for name, c in self.counts.items():
+            for i, result in enumerate(("reject", "pass", "accept")):
+                M_FILTER.track(lambda c=c, i=i: c[i], pipeline, name, result)
+
+    def snapshot(self) -> str:
+        return " ".join(f"{n}={c[1] + c[2]}/{c[0]}" for n, c in self.counts.items())  # passed/rejected
 
 # -------------------- EVM: WS subscribe helper --------------------
-async def evm_ws_sub(ws_url: str):
+def _pending_sub_params(mode: str, to_addresses: Optional[List[str]] = None) -> list:
+    """eth_subscribe params for a pending-tx subscription mode."""
+    if mode == "full":
+        # geth/erigon/reth: full tx objects instead of hashes
+        return ["newPendingTransactions", True]
+    if mode == "alchemy":
+        # Alchemy: full tx objects, filtered server-side by destination
+        opts: Dict[str, Any] = {"hashesOnly": False}
+        if to_addresses:
+            opts["toAddress"] = list(to_addresses)
+        return ["alchemy_pendingTransactions", opts]
+    return ["newPendingTransactions"]
+
+M_WS_CONNECTS = METRICS.counter("whale_ws_connects_total", "Websocket connection attempts", ("chain", "provider"))
+M_WS_ERRORS = METRICS.counter("whale_ws_errors_total", "Websocket sessions ended by an error", ("chain", "provider"))
+M_WS_NOTIFICATIONS = METRICS.counter("whale_ws_notifications_total", "Subscription notifications received", ("chain", "provider"))
+
+async def evm_ws_sub(ws_url: str, mode: str = "hashes", to_addresses: Optional[List[str]] = None, chain: str = "evm",
+                     provider: str = "", src: Optional[str] = None):
     """
-    Async generator yielding pending tx hashes from eth_subscribe 'newPendingTransactions'.
-    Reconnects on failures.
+    Async generator yielding pending txs from eth_subscribe.
+    mode="hashes" yields tx hashes (str); "full"/"alchemy" yield full tx objects (dict).
+    Falls back to hashes if the provider rejects the full-tx subscription. Reconnects on failures.
+    `provider` labels the metrics; `src` names the stream in recordings (default: the chain).
     """
+    m_connects, m_errors, m_notes = (m.labels(chain, provider) for m in (M_WS_CONNECTS, M_WS_ERRORS, M_WS_NOTIFICATIONS))
+    rec = recorder()
+    src = src or chain
     backoff = 2
     while True:
         try:
+            m_connects.inc()
             print("[evm_sub] connecting:", ws_url)
             async with websockets.connect(ws_url, ping_interval=20, ping_timeout=20) as ws:
-                sub_req = {"jsonrpc":"2.0","id":1,"method":"eth_subscribe","params":["newPendingTransactions"]}
-                await ws.send(json.dumps(sub_req))
-                print("[evm_sub] subscribed to newPendingTransactions")
+                params = _pending_sub_params(mode, to_addresses)
+                sub_req = json.dumps({"jsonrpc":"2.0","id":1,"method":"eth_subscribe","params":params})
+                if rec:
+                    rec.ws_open(src)
+                    rec.ws_out(src, sub_req)
+                await ws.send(sub_req)
+                print(f"[evm_sub] subscribed to {params[0]} (mode={mode})")
                 while True:
                     raw = await ws.recv()
-                    msg = json.loads(raw)
+                    if rec:
+                        rec.ws_in(src, raw)
+                    h = fast_pending_hash(raw)
+                    if h is not None:
+                        m_notes.inc()
+                        yield h
+                        continue
+                    try:
+                        msg = json_loads(raw)
+                    except JSON_DECODE_ERRORS as e:
+                        m_errors.inc()
+                        print(f"[evm_sub] {provider or chain} skipped unparseable frame:", e)
+                        continue
                     if msg.get("method") == "eth_subscription":
+                        m_notes.inc()
                         params = msg.get("params", {})
-                        txh = params.get("result")
-                        if isinstance(txh, str) and txh.startswith("0x") and len(txh) == 66:
-                            yield txh
+                        res = params.get("result")
+                        if isinstance(res, str):
+                            if res.startswith("0x") and len(res) == 66:
+                                yield res
+                        elif isinstance(res, dict) and res.get("hash"):
+                            yield res
+                    elif msg.get("id") == 1 and msg.get("error"):
+                        print(f"[evm_sub] subscribe rejected (mode={mode}):", msg["error"])
+                        if mode == "hashes":
+                            raise RuntimeError("newPendingTransactions subscription rejected")
+                        print("[evm_sub] falling back to newPendingTransactions hashes")
+                        fallback = json.dumps({"jsonrpc":"2.0","id":2,"method":"eth_subscribe","params":["newPendingTransactions"]})
+                        if rec:
+                            rec.ws_out(src, fallback)
+                        await ws.send(fallback)
         except Exception as e:
-            print("[evm_sub] error, will reconnect:", e)
+            m_errors.inc()
+            print(f"[evm_sub] {provider or chain} error, will reconnect:", e)
             await asyncio.sleep(backoff)
             backoff = min(backoff * 2, 30)
 
+# -------------------- EVM value thresholds --------------------
+WEI_PER_NATIVE = 10**18
+
+class WeiThresholds:
+    """
+    Per-chain value thresholds pre-converted to wei, so the hot path compares raw ints
+    (no Decimal/float per tx). `min_wei` is the smaller of min_native and min_usd at the
+    current price, i.e. "big_native or big_usd". Call set_price() whenever the price refreshes.
+    """
+    def __init__(self, min_native: float, min_usd: float):
+        self.min_native_wei = int(round(min_native * WEI_PER_NATIVE))
+        self.min_usd = float(min_usd)
+        self.usd_per_native: Optional[float] = None
+        self.min_usd_wei: Optional[int] = None
+        self.min_wei = self.min_native_wei
+
+    def set_price(self, usd_per_native: Optional[float]):
+        self.usd_per_native = usd_per_native or None
+        if self.usd_per_native:
+            self.min_usd_wei = int(self.min_usd / self.usd_per_native * WEI_PER_NATIVE)
+            self.min_wei = min(self.min_native_wei, self.min_usd_wei)
+        else:
+            self.min_usd_wei = None
+            self.min_wei = self.min_native_wei
+
+    def native(self, wei: int) -> float:
+        return wei / WEI_PER_NATIVE
+
+    def usd(self, wei: int) -> Optional[float]:
+        return wei / WEI_PER_NATIVE * self.usd_per_native if self.usd_per_native else None
+
+# -------------------- On-chain token pricing (EVM) --------------------
+MULTICALL3 = "0xcA11bde05779ba9821e6aa5fd60a6a1d2F1b6C1b"  # same address on every supported chain
+_SEL_TRY_BLOCK_AGGREGATE = _selector("tryBlockAndAggregate(bool,(address,bytes)[])").to_bytes(4, "big")
+_SEL_GET_PAIR = _selector("getPair(address,address)").to_bytes(4, "big")
+_SEL_GET_POOL = _selector("getPool(address,address,uint24)").to_bytes(4, "big")
+_SEL_GET_RESERVES = _selector("getReserves()").to_bytes(4, "big")
+_SEL_SLOT0 = _selector("slot0()").to_bytes(4, "big")
+_SEL_LIQUIDITY = _selector("liquidity()").to_bytes(4, "big")
+
+async def multicall3(rpc: "RpcBatcher", calls: List[Tuple[str, bytes]]) -> Tuple[int, List[Optional[bytes]]]:
+    """One eth_call to Multicall3.tryBlockAndAggregate; returns (block, [returnData or None if the call failed])."""
+    data = _SEL_TRY_BLOCK_AGGREGATE + _abi_encode(["bool", "(address,bytes)[]"], [False, calls])
+    res = await rpc.call({"to": MULTICALL3, "data": "0x" + data.hex()}, "latest")
+    if not isinstance(res, str) or len(res) < 3:
+        raise RuntimeError("multicall eth_call failed")
+    block, _, results = _abi_decode(["uint256", "bytes32", "(bool,bytes)[]"], bytes.fromhex(res[2:]))
+    return block, [rd if ok else None for ok, rd in results]
+
+def _word_addr(a: str) -> bytes:
+    return bytes(12) + bytes.fromhex(a[2:])
+
+def _word_uint(n: int) -> bytes:
+    return n.to_bytes(32, "big")
+
+class TokenPricer:
+    """
+    Prices ERC-20 amounts in the chain's native coin from on-chain pools against the wrapped native
+    token: Uniswap V2 getReserves and V3 slot0/liquidity, read through Multicall3 tryBlockAndAggregate
+    (concurrent eth_calls are further coalesced into JSON-RPC batches). The deepest pool wins.
+    Pool addresses are cached indefinitely (LRU-bounded), quotes for `token_price_ttl` seconds; a token
+    without pools is rediscovered once its no-pool quote expires (NO_POOL_TTL), so pools created after
+    a launch are picked up. Concurrent lookups for the same token share one in-flight call.
+    Quotes are exact raw-unit ratios, so no token decimals are needed.
+    """
+    NO_POOL_TTL = 600  # seconds to remember that a token has no usable pool
+
+    def __init__(self, cfg: "EvmChainCfg"):
+        self.name = cfg.name
+        self.weth = (cfg.wrapped_native or "").lower()
+        self.v2_factory = cfg.v2_factory
+        self.v3_factory = cfg.v3_factory
+        self.v3_fees = list(cfg.v3_fees)
+        self.min_depth_wei = int(cfg.min_pool_native * WEI_PER_NATIVE)
+        self.ttl = float(cfg.token_price_ttl)
+        self.max_entries = max(1, int(cfg.token_price_cache))
+        self._rpc = RpcBatcher(http_endpoints(cfg), "eth_call", batch_size=20, batch_ms=10,
+                               timeout=cfg.token_price_timeout) if cfg.http else None
+        self._pools: "OrderedDict[str, List[Tuple[str, str]]]" = OrderedDict()
+        self._quotes: "OrderedDict[str, Tuple[int, int, Optional[int], float]]" = OrderedDict()  # num, den, block, t
+        self._inflight: Dict[str, asyncio.Future] = {}
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self._rpc and self.weth and (self.v2_factory or self.v3_factory))
+
+    @staticmethod
+    def _lru_put(cache: OrderedDict, key, value, max_entries: int):
+        cache[key] = value
+        cache.move_to_end(key)
+        while len(cache) > max_entries:
+            cache.popitem(last=False)
+
+    async def _multicall(self, calls: List[Tuple[str, bytes]]) -> Tuple[int, List[Optional[bytes]]]:
+        return await multicall3(self._rpc, calls)
+
+    async def _discover(self, token: str) -> List[Tuple[str, str]]:
+        """[(kind, pool address)] of existing token/wrapped-native pools."""
+        calls: List[Tuple[str, bytes]] = []
+        kinds: List[str] = []
+        if self.v2_factory:
+            calls.append((self.v2_factory, _SEL_GET_PAIR + _word_addr(token) + _word_addr(self.weth)))
+            kinds.append("v2")
+        if self.v3_factory:
+            for fee in self.v3_fees:
+                calls.append((self.v3_factory, _SEL_GET_POOL + _word_addr(token) + _word_addr(self.weth) + _word_uint(fee)))
+                kinds.append("v3")
+        _, results = await self._multicall(calls)
+        pools = []
+        for kind, rd in zip(kinds, results):
+            if rd and len(rd) >= 32 and any(rd[12:32]):
+                pools.append((kind, "0x" + rd[12:32].hex()))
+        return pools
+
+    async def _fetch_quote(self, token: str) -> Optional[Tuple[int, int, int]]:
+        """(num, den, block): native raw units per token raw unit from the deepest pool, None if unpriceable."""
+        pools = self._pools.get(token)
+        if pools is None:
+            pools = await self._discover(token)
+            if not pools:
+                return None  # not cached: retried when the no-pool quote expires
+            self._lru_put(self._pools, token, pools, self.max_entries)
+        calls: List[Tuple[str, bytes]] = []
+        for kind, addr in pools:
+            if kind == "v2":
+                calls.append((addr, _SEL_GET_RESERVES))
+            else:
+                calls += [(addr, _SEL_SLOT0), (addr, _SEL_LIQUIDITY)]
+        block, res = await self._multicall(calls)
+        token_is_0 = token < self.weth  # pool token0 is the lower address
+        best: Optional[Tuple[int, int, int]] = None  # (native depth, num, den)
+        i = 0
+        for kind, _ in pools:
+            if kind == "v2":
+                rd = res[i]
+                i += 1
+                if not rd or len(rd) < 64:
+                    continue
+                r0, r1 = int.from_bytes(rd[0:32], "big"), int.from_bytes(rd[32:64], "big")
+                r_tok, r_nat = (r0, r1) if token_is_0 else (r1, r0)
+                if not r_tok:
+                    continue
+                depth, num, den = r_nat, r_nat, r_tok
+            else:
+                s0, liq = res[i], res[i + 1]
+                i += 2
+                if not s0 or not liq or len(s0) < 32 or len(liq) < 32:
+                    continue
+                sp, L = int.from_bytes(s0[:32], "big"), int.from_bytes(liq[:32], "big")
+                if not sp or not L:
+                    continue
+                # sqrtPriceX96^2 / 2^192 = token1 per token0; virtual reserves: x = L*2^96/sp, y = L*sp/2^96
+                if token_is_0:
+                    depth, num, den = (L * sp) >> 96, sp * sp, 1 << 192
+                else:
+                    depth, num, den = (L << 96) // sp, 1 << 192, sp * sp
+            if depth >= self.min_depth_wei and (best is None or depth > best[0]):
+                best = (depth, num, den)
+        return (best[1], best[2], block) if best else None
+
+    async def quote(self, token: str) -> Optional[Tuple[int, int, Optional[int], float]]:
+        token = token.lower()
+        now = time.monotonic()
+        e = self._quotes.get(token)
+        if e is not None and now - e[3] < (self.ttl if e[0] else self.NO_POOL_TTL):
+            self._quotes.move_to_end(token)
+            self.hits += 1
+            return e
+        fut = self._inflight.get(token)
+        if fut is not None:
+            return await asyncio.shield(fut)
+        self.misses += 1
+        fut = asyncio.get_running_loop().create_future()
+        self._inflight[token] = fut
+        entry = None
+        try:
+            q = await self._fetch_quote(token)
+            entry = (q[0], q[1], q[2], time.monotonic()) if q else (0, 1, None, time.monotonic())
+            self._lru_put(self._quotes, token, entry, self.max_entries)
+        except Exception as e:
+            print(f"[{self.name}] token price lookup failed for {token}:", e)
+        finally:
+            del self._inflight[token]
+            fut.set_result(entry)
+        return entry
+
+    async def native_value(self, token: Optional[str], amount: Optional[int]) -> Optional[int]:
+        """Value of `amount` raw units of `token` in native wei; None if unknown."""
+        if not token or amount is None:
+            return None
+        if self.weth and token.lower() == self.weth:
+            return amount  # wrapped native needs no pool, even with pricing off
+        if not self.enabled:
+            return None
+        e = await self.quote(token)
+        if not e or not e[0]:
+            return None
+        return amount * e[0] // e[1]
+
+    def snapshot(self) -> str:
+        return f"token_quotes={len(self._quotes)} pools={len(self._pools)} hits={self.hits} misses={self.misses}"
+
+# -------------------- ERC-20 metadata cache --------------------
+_SEL_DECIMALS = _selector("decimals()").to_bytes(4, "big")
+_SEL_SYMBOL = _selector("symbol()").to_bytes(4, "big")
+
+def _decode_symbol(rd: Optional[bytes]) -> Optional[str]:
+    """symbol() returns an ABI string, or bytes32 on some old tokens (MKR, SAI...)."""
+    if not rd:
+        return None
+    try:
+        if len(rd) == 32:
+            raw = rd.rstrip(b"\0")
+        else:
+            off = int.from_bytes(rd[0:32], "big")
+            n = int.from_bytes(rd[off:off + 32], "big")
+            raw = rd[off + 32:off + 32 + n]
+        return raw.decode("utf-8", "replace").strip()[:32] or None
+    except Exception:
+        return None
+
+class TokenMetadataStore:
+    """
+    ERC-20 decimals/symbol keyed by (chain, address), shared by every EVM chain and persisted in SQLite
+    so it survives restarts. Lookups hit memory first, then disk (lazy, on a dedicated thread), then the
+    chain: misses arriving within `batch_ms` are filled with one Multicall3 call per chain.
+    warmup() bulk-loads tokens seen in the last `warm_days` at boot; last-seen times are flushed in batches.
+    Memory is an LRU of `max_entries` tokens. A fetch that yields neither decimals nor symbol (often a
+    transient per-call failure) is only trusted for `unknown_ttl` seconds, then fetched again.
+    """
+    def __init__(self, path: str, warm_days: float = 7, batch_ms: int = 20, max_entries: int = 50000,
+                 unknown_ttl: float = 600):
+        self.path = path
+        self.warm_seconds = float(warm_days) * 86400
+        self.batch_ms = max(0, int(batch_ms))
+        self.max_entries = max(1, int(max_entries))
+        self.unknown_ttl = float(unknown_ttl)
+        self._mem: "OrderedDict[Tuple[str, str], Tuple[Optional[int], Optional[str]]]" = OrderedDict()
+        self._unknown_at: Dict[Tuple[str, str], float] = {}  # fetch time of (None, None) entries in _mem
+        self._rpc: Dict[str, RpcBatcher] = {}
+        self._pending: Dict[str, Dict[str, asyncio.Future]] = {}
+        self._timers: Dict[str, asyncio.TimerHandle] = {}
+        self._fetches: set = set()
+        self._touched: Dict[Tuple[str, str], float] = {}
+        self._exec = ThreadPoolExecutor(max_workers=1, thread_name_prefix="tokenmeta")
+        self._db: Optional[sqlite3.Connection] = None
+        self._flusher: Optional[asyncio.Task] = None
+        self.hits = 0
+        self.disk_hits = 0
+        self.fetched = 0
+
+    def register_chain(self, chain: str, http: Optional[Union[str, HttpEndpoints]]):
+        if http and chain not in self._rpc:
+            self._rpc[chain] = RpcBatcher(http, "eth_call", batch_size=20, batch_ms=10)
+
+    # ---- disk (runs on the store thread) ----
+    def _conn(self) -> sqlite3.Connection:
+        if self._db is None:
+            parent = os.path.dirname(self.path)
+            if parent:
+                os.makedirs(parent, exist_ok=True)
+            db = sqlite3.connect(self.path, isolation_level=None, check_same_thread=False)
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute(
+                "CREATE TABLE IF NOT EXISTS token_meta ("
+                " chain TEXT NOT NULL, address TEXT NOT NULL, decimals INTEGER, symbol TEXT,"
+                " fetched REAL NOT NULL, last_seen REAL NOT NULL, PRIMARY KEY (chain, address))"
+            )
+            self._db = db
+        return self._db
+
+    def _load_one(self, chain: str, address: str):
+        return self._conn().execute(
+            "SELECT decimals, symbol, fetched FROM token_meta WHERE chain=? AND address=?", (chain, address)
+        ).fetchone()
+
+    def _load_recent(self, since: float, limit: int):
+        # most recently seen first, so the LRU keeps the hottest tokens when the table is larger than memory
+        return self._conn().execute(
+            "SELECT chain, address, decimals, symbol, fetched FROM token_meta WHERE last_seen >= ?"
+            " ORDER BY last_seen DESC LIMIT ?", (since, limit)
+        ).fetchall()
+
+    def _save(self, rows: List[Tuple[str, str, Optional[int], Optional[str]]]):
+        db = self._conn()
+        now = time.time()
+        db.execute("BEGIN")
+        db.executemany(
+            "INSERT OR REPLACE INTO token_meta(chain, address, decimals, symbol, fetched, last_seen) VALUES (?,?,?,?,?,?)",
+            [(c, a, d, sym, now, now) for c, a, d, sym in rows],
+        )
+        db.execute("COMMIT")
+
+    def _touch(self, seen: List[Tuple[float, str, str]]):
+        db = self._conn()
+        db.execute("BEGIN")
+        db.executemany("UPDATE token_meta SET last_seen=? WHERE chain=? AND address=?", seen)
+        db.execute("COMMIT")
+
+    async def _run(self, fn, *args):
+        return await asyncio.get_running_loop().run_in_executor(self._exec, fn, *args)
+
+    # ---- memory ----
+    def _remember(self, key: Tuple[str, str], decimals: Optional[int], symbol: Optional[str], fetched: float):
+        self._mem[key] = (decimals, symbol)
+        self._mem.move_to_end(key)
+        if decimals is None and symbol is None:
+            self._unknown_at[key] = fetched
+        else:
+            self._unknown_at.pop(key, None)
+        while len(self._mem) > self.max_entries:
+            old, _ = self._mem.popitem(last=False)
+            self._unknown_at.pop(old, None)
+
+    def _expired_unknown(self, fetched: float) -> bool:
+        return time.time() - fetched >= self.unknown_ttl
+
+    # ---- public ----
+    async def warmup(self) -> int:
+        """Bulk-load recently seen tokens into memory; returns how many were loaded."""
+        try:
+            rows = await self._run(self._load_recent, time.time() - self.warm_seconds, self.max_entries)
+        except Exception as e:
+            print("[tokens] warmup failed:", e)
+            return 0
+        n = 0
+        for chain, address, decimals, symbol, fetched in reversed(rows):
+            if decimals is None and symbol is None and self._expired_unknown(fetched):
+                continue
+            self._remember((chain, address), decimals, symbol, fetched)
+            n += 1
+        return n
+
+    def start(self) -> asyncio.Task:
+        if self._flusher is None or self._flusher.done():
+            self._flusher = asyncio.create_task(self._flush_touched())
+        return self._flusher
+
+    async def _flush_touched(self):
+        while True:
+            await asyncio.sleep(60)
+            if self._touched:
+                seen = [(t, c, a) for (c, a), t in self._touched.items()]
+                self._touched = {}
+                try:
+                    await self._run(self._touch, seen)
+                except Exception as e:
+                    print("[tokens] last-seen flush failed:", e)
+
+    async def get(self, chain: str, address: str) -> Tuple[Optional[int], Optional[str]]:
+        """(decimals, symbol) for a token; (None, None) if unknown."""
+        key = (chain, address.lower())
+        self._touched[key] = time.time()
+        meta = self._mem.get(key)
+        if meta is not None:
+            if key not in self._unknown_at or not self._expired_unknown(self._unknown_at[key]):
+                self.hits += 1
+                self._mem.move_to_end(key)
+                return meta
+            del self._mem[key], self._unknown_at[key]
+        try:
+            row = await self._run(self._load_one, *key)
+        except Exception as e:
+            print("[tokens] disk lookup failed:", e)
+            row = None
+        if row is not None and not (row[0] is None and row[1] is None and self._expired_unknown(row[2])):
+            self.disk_hits += 1
+            self._remember(key, *row)
+            return row[0], row[1]
+        if chain not in self._rpc:
+            return None, None
+        return await self._queue_fetch(chain, key[1])
+
+    def _queue_fetch(self, chain: str, address: str) -> asyncio.Future:
+        pending = self._pending.setdefault(chain, {})
+        fut = pending.get(address)
+        if fut is None:
+            fut = pending[address] = asyncio.get_running_loop().create_future()
+            if chain not in self._timers:
+                self._timers[chain] = asyncio.get_running_loop().call_later(self.batch_ms / 1000, self._start_fetch, chain)
+        return fut
+
+    def _start_fetch(self, chain: str):
+        # the loop only holds tasks weakly: keep the batch alive until its futures are resolved
+        t = asyncio.ensure_future(self._fetch_batch(chain))
+        self._fetches.add(t)
+        t.add_done_callback(self._fetches.discard)
+
+    async def _fetch_batch(self, chain: str):
+        self._timers.pop(chain, None)
+        batch = self._pending.pop(chain, {})
+        if not batch:
+            return
+        addrs = list(batch)
+        calls: List[Tuple[str, bytes]] = []
+        for a in addrs:
+            calls += [(a, _SEL_DECIMALS), (a, _SEL_SYMBOL)]
+        rows: List[Tuple[str, str, Optional[int], Optional[str]]] = []
+        try:
+            _, res = await multicall3(self._rpc[chain], calls)
+            for i, a in enumerate(addrs):
+                dec_rd, sym_rd = res[2 * i], res[2 * i + 1]
+                decimals = int.from_bytes(dec_rd[:32], "big") if dec_rd and len(dec_rd) >= 32 else None
+                if decimals is not None and decimals > 77:
+                    decimals = None
+                rows.append((chain, a, decimals, _decode_symbol(sym_rd)))
+        except Exception as e:
+            print(f"[tokens] {chain} metadata fetch failed for {len(addrs)} token(s):", e)
+            for fut in batch.values():
+                if not fut.done():
+                    fut.set_result((None, None))
+            return
+        now = time.time()
+        for c, a, decimals, symbol in rows:
+            self._remember((c, a), decimals, symbol, now)
+            if not batch[a].done():
+                batch[a].set_result((decimals, symbol))
+        self.fetched += len(rows)
+        try:
+            await self._run(self._save, rows)
+        except Exception as e:
+            print("[tokens] metadata save failed:", e)
+
+    def snapshot(self) -> str:
+        return f"tokens mem={len(self._mem)} hits={self.hits} disk={self.disk_hits} fetched={self.fetched}"
+
+_token_meta: Optional[TokenMetadataStore] = None
+
+def init_token_meta(opts: Optional[dict] = None) -> TokenMetadataStore:
+    """(Re)configure the shared store from the `token_cache` config section."""
+    global _token_meta
+    o = opts or {}
+    _token_meta = TokenMetadataStore(
+        o.get("path", default_state_path("token_meta.sqlite3")),
+        warm_days=float(o.get("warm_days", 7)),
+        batch_ms=int(o.get("batch_ms", 20)),
+        max_entries=int(o.get("max_entries", 50000)),
+        unknown_ttl=float(o.get("unknown_ttl", 600)),
+    )
+    return _token_meta
+
+def token_meta() -> TokenMetadataStore:
+    return _token_meta or init_token_meta()
+
+def format_token_amount(amount: Optional[int], decimals: Optional[int], symbol: Optional[str], address: str) -> str:
+    label = symbol or f"`{Web3.to_checksum_address(address)}`"
+    if amount is None or decimals is None:
+        return label
+    return f"{amount / 10**decimals:,.4f} {label}"
+
+class TxCtx:
+    """Per-tx scratch state shared by the filter predicates (fields are filled lazily)."""
+    __slots__ = ("tx", "to", "frm", "value", "by_decode", "_swap", "_decoded")
+
+    def __init__(self, tx: dict):
+        self.tx = tx
+        self.to = ""
+        self.frm: Optional[str] = None
+        self.value = 0
+        self.by_decode = False  # qualified only because the calldata decoded as a swap
+        self._swap: Optional[Dict[str, Any]] = None
+        self._decoded = False
+
+    def decode(self) -> Optional[Dict[str, Any]]:
+        """Router calldata decode, done at most once per tx."""
+        if not self._decoded:
+            self._decoded = True
+            inp = self.tx.get("input") or ""
+            if isinstance(inp, str) and inp.startswith("0x") and is_known_selector(inp):
+                try:
+                    self._swap = parse_uniswap_call(bytes.fromhex(inp[2:]))
+                except ValueError:
+                    self._swap = None
+        return self._swap
+
 # -------------------- EVM watcher --------------------
+M_PIPELINE = METRICS.counter("whale_pipeline_events_total", "Pipeline event counts per chain", ("chain", "event"))
+M_QUEUE_WAIT_SECONDS = METRICS.histogram("whale_queue_wait_seconds", "Time an item waited before its fetch batch started", ("chain",))
+M_RPC_FETCH_SECONDS = METRICS.histogram("whale_rpc_fetch_seconds", "Batched transaction fetch latency", ("chain",))
+M_PROCESS_SECONDS = METRICS.histogram("whale_process_seconds", "Filter and score time per transaction", ("chain",))
+M_ALERT_SECONDS = METRICS.histogram("whale_alert_seconds", "Pricing, metadata and Discord time per accepted transaction",
+                                    ("chain",))
+M_PROVIDER_FIRST = METRICS.counter("whale_provider_first_seen_total", "Pending txs a websocket provider announced first",
+                                   ("chain", "provider"))
+M_PROVIDER_LAG = METRICS.histogram("whale_provider_lag_seconds", "How long after the first announcement a provider repeated a tx",
+                                   ("chain", "provider"))
+
+def tx_hash_key(h: str):
+    """Seen-set key for a tx hash: its first 64 bits as an int, ~1/4 the memory of the hex string.
+    Among a few hundred thousand random hashes a prefix collision is ~1e-9 likely."""
+    try:
+        return int(h[2:18], 16)
+    except ValueError:
+        return h
+
+def track_pipeline_stats(chain: str, stats: Dict[str, Any]):
+    for k, v in stats.items():
+        if isinstance(v, int):
+            M_PIPELINE.track(lambda k=k: stats[k], chain, k)
+
 async def watch_evm(cfg: EvmChainCfg, price_cache_id: str, autolearn: Optional[AutoLearn]):
     print(f"[{cfg.name}] starting watcher…")
-    # HTTP provider for tx details
-    w3_http = None
+    # batched HTTP RPC for tx details
+    fetcher = None
     if cfg.http:
-        try:
-            w3_http = Web3(Web3.HTTPProvider(cfg.http, request_kwargs={"timeout": 15}))
-            ok = w3_http.is_connected()
-            print(f"[{cfg.name}] HTTP connected? ->", ok)
-        except Exception as e:
-            print(f"[{cfg.name}][WARN] HTTP provider init failed:", e)
+        fetcher = RpcBatcher(http_endpoints(cfg), "eth_getTransactionByHash", cfg.fetch_batch_size, cfg.fetch_batch_ms)
+        print(f"[{cfg.name}] tx fetch: workers={cfg.fetch_workers} batch={fetcher.batch_size} "
+              f"window={fetcher.batch_ms}ms queue={cfg.queue_size} overflow={cfg.overflow_policy} "
+              f"endpoints={len(fetcher.endpoints)}")
+    elif cfg.pending_mode == "hashes":
+        # no HTTP → nothing to resolve hashes with (we avoid mixing requests on the ws subscription connection)
+        print(f"[{cfg.name}][WARN] no http RPC configured; hash-only subscription cannot be resolved")
 
-    native_usd = get_native_usd(price_cache_id) or 0.0
+    # thresholds follow the oracle: every price refresh recomputes the wei cutoffs
+    gate = WeiThresholds(cfg.min_native, cfg.min_usd)
+    oracle = price_oracle()
+    oracle.subscribe(price_cache_id, gate.set_price)
+    oracle.start()
+    await oracle.wait_ready()
     routers_lc = {addr.lower(): name for name, addr in cfg.routers.items()}
-    whales_lc = set(a.lower() for a in cfg.whales)
+    whales = cfg.whales
+    pricer = TokenPricer(cfg)
+    tokens = token_meta()
+    tokens.register_chain(cfg.name, http_endpoints(cfg))
+    if not pricer.enabled:
+        print(f"[{cfg.name}] on-chain token pricing off (needs http, wrapped_native and a v2/v3 factory); "
+              f"token-in swaps only alert for whales")
 
-    async for tx_hash in evm_ws_sub(cfg.ws):
+    # filter: ordered predicates, cheapest & most selective first; every alert needs a router target
+    def p_router(c: TxCtx) -> int:
+        c.to = (c.tx.get("to") or "").lower()
+        return PASS if c.to in routers_lc else REJECT
+
+    def p_value(c: TxCtx) -> int:
+        # value in wei (raw JSON: hex; tolerate ints)
         try:
-            # fetch tx via HTTP RPC if available
-            tx = None
-            if w3_http:
+            v = c.tx.get("value") or 0
+            c.value = int(v, 16) if isinstance(v, str) else int(v)
+        except ValueError:
+            c.value = 0
+        return ACCEPT if c.value >= gate.min_wei else PASS
+
+    def p_whale(c: TxCtx) -> int:
+        c.frm = (c.tx.get("from") or "").lower()
+        return ACCEPT if c.frm in whales else PASS
+
+    def p_decode(c: TxCtx) -> int:
+        # a decoded swap must still clear the value bar, through its priced input (checked in alert()).
+        # amount_in None means the input is tx.value (ETH-in swaps, Universal Router balance sentinels),
+        # which p_value already found too small
+        swap = c.decode()
+        if not swap or swap["amount_in"] is None:
+            return REJECT
+        c.by_decode = True
+        return ACCEPT
+
+    chain = FilterChain([("router", p_router), ("value", p_value), ("whale", p_whale), ("decode", p_decode)])
+
+    def score(tx: dict, tx_hash: str) -> Optional[TxCtx]:
+        """Synchronous filter step on the scorer; returns the ctx of an accepted, not yet alerted tx."""
+        c = TxCtx(tx)
+        if not chain.run(c):
+            return None
+        # fill in what predicates skipped after an early ACCEPT would have computed
+        if c.frm is None:
+            c.frm = (tx.get("from") or "").lower()
+        if tx_hash in alerted:
+            stats["dup_alerts"] += 1  # re-announced after leaving the seen set
+            return None
+        return c
+
+    async def alert(c: TxCtx, tx_hash: str):
+        swap_info = c.decode()
+        # token-in swaps: price the input on-chain; decode-only matches must clear the value bar too
+        token_wei = await pricer.native_value(swap_info["token_in"], swap_info["amount_in"]) if swap_info else None
+        # an input we cannot price cannot be shown to be big: decoding alone never alerts (whales still do)
+        if c.by_decode and token_wei is None:
+            stats["token_unpriced"] += 1
+            return
+        if c.by_decode and token_wei < gate.min_wei:
+            stats["token_below_min"] += 1
+            return
+        to_addr, frm = c.to, c.frm
+        # human-readable values only for txs that alert
+        value_native = gate.native(c.value)
+        est_usd = gate.usd(max(c.value, token_wei or 0))
+        link = f"{cfg.explorer}{tx_hash}"
+        usd_str = f" (~${est_usd:,.0f})" if est_usd else ""
+        desc = (
+            f"**From:** `{frm}`\n"
+            f"**To:** {routers_lc.get(to_addr,'Router')} (`{to_addr}`)\n"
+            f"**Value:** {value_native:.4f} {cfg.native_symbol}{usd_str}\n"
+        )
+        if swap_info:
+            (dec_in, sym_in), (dec_out, sym_out) = await asyncio.gather(
+                tokens.get(cfg.name, swap_info["token_in"]), tokens.get(cfg.name, swap_info["token_out"])
+            )
+            desc += (
+                f"**Method:** {swap_info['method']} • "
+                f"**In:** {format_token_amount(swap_info['amount_in'] if swap_info['amount_in'] is not None else c.value, dec_in, sym_in, swap_info['token_in'])} • "
+                f"**Out (min):** {format_token_amount(swap_info['amount_out_min'], dec_out, sym_out, swap_info['token_out'])}\n"
+            )
+
+        embed = {
+            "title": f"{cfg.name.upper()} • Possible Whale Buy",
+            "description": desc,
+            "color": 0x2ECC71,
+            "url": link,
+            "footer": {"text": tx_hash},
+        }
+        # remembered only now: a candidate rejected by pricing or shed from alert_q may alert on a re-announce;
+        # checked again because another alert worker may have sent the same tx meanwhile
+        if alerted.check_and_add(tx_hash):
+            stats["dup_alerts"] += 1
+            return
+        await discord_send(embeds=[embed], key=tx_hash)
+        stats["alerts"] += 1
+        print(f"[{cfg.name}] alert sent:", tx_hash)
+
+        if autolearn:
+            learned = autolearn.consider(frm, est_usd)
+            if learned:
+                await discord_send(
+                    f"🧠 **Auto-learned new EVM whale:** `{learned}` "
+                    f"(≥{autolearn.min_usd:,.0f} USD x{autolearn.occurrences} in {autolearn.window_hours}h). "
+                    f"Saved to `{autolearn.learned_file}`."
+                )
+
+    # staged pipeline: receiver -> fetch_q -> fetch workers -> score_q -> scorer -> alert_q -> alert workers
+    fetch_q = BoundedStage("fetch_q", cfg.queue_size, cfg.overflow_policy)
+    score_q = BoundedStage("score_q", cfg.queue_size, cfg.overflow_policy)
+    # keep=True marks alerts that need no pricing (whale / big value): they displace decode-only
+    # candidates or use the overflow slots, so those are what get shed when the alert workers fall behind
+    alert_q = BoundedStage("alert_q", cfg.alert_queue_size, "drop_non_router")
+    stats = {"recv": 0, "dup": 0, "fetched": 0, "null": 0, "scored": 0, "token_below_min": 0, "token_unpriced": 0, "alerts": 0,
+             "dup_alerts": 0, "wait_max_ms": 0.0}
+    track_pipeline_stats(cfg.name, stats)
+    fetch_q.track_metrics(cfg.name)
+    score_q.track_metrics(cfg.name)
+    alert_q.track_metrics(cfg.name)
+    chain.track_metrics(cfg.name)
+    m_wait = M_QUEUE_WAIT_SECONDS.labels(cfg.name)
+    m_fetch = M_RPC_FETCH_SECONDS.labels(cfg.name)
+    m_process = M_PROCESS_SECONDS.labels(cfg.name)
+    m_alert = M_ALERT_SECONDS.labels(cfg.name)
+
+    async def fetch_worker():
+        while True:
+            chunk = [await fetch_q.get()]
+            while len(chunk) < cfg.fetch_batch_size:
                 try:
-                    tx = w3_http.eth.get_transaction(tx_hash)
-                except Exception:
-                    tx = None
-            if not tx:
-                # fallback: fetch via JSON-RPC over HTTP using requests (if cfg.http provided)
-                if cfg.http:
-                    try:
-                        r = requests.post(cfg.http, json={"jsonrpc":"2.0","id":1,"method":"eth_getTransactionByHash","params":[tx_hash]}, timeout=10)
-                        tx = r.json().get("result")
-                    except Exception:
-                        tx = None
-                # else: no HTTP → skip (we avoid mixing requests on the ws subscription connection)
-            if not tx:
+                    chunk.append(fetch_q.get_nowait())
+                except asyncio.QueueEmpty:
+                    break
+            now = time.monotonic()
+            stats["wait_max_ms"] = max(stats["wait_max_ms"], (now - chunk[0][1]) * 1000)
+            for _, t in chunk:
+                m_wait.observe(now - t)
+            try:
+                txs = await asyncio.gather(*(fetcher.call(h) for h, _ in chunk))
+            except Exception as e:
+                print(f"[{cfg.name}] fetch worker error:", e)
                 continue
+            m_fetch.observe(time.monotonic() - now)
+            for (h, _), tx in zip(chunk, txs):
+                if tx:
+                    stats["fetched"] += 1
+                    # fetch_q only held bare hashes; now the target is known, so score_q can shed non-router txs first
+                    await score_q.put((tx, h), keep=(tx.get("to") or "").lower() in routers_lc)
+                else:
+                    stats["null"] += 1  # dropped from mempool / already mined
 
-            # normalize fields whether tx is dict from Web3 or raw JSON
-            to_addr = (tx.get("to") or "").lower()
-            frm     = (tx.get("from") or "").lower()
-            is_router = to_addr in routers_lc
+    async def scorer():
+        while True:
+            tx, tx_hash = await score_q.get()
+            stats["scored"] += 1
+            t0 = time.monotonic()
+            try:
+                c = score(tx, tx_hash)
+            except Exception as e:
+                print(f"[{cfg.name}] loop error:", e)
+                c = None
+            m_process.observe(time.monotonic() - t0)
+            # pricing, metadata and Discord run on the alert workers, so a slow RPC delays that one alert
+            # instead of every tx behind it
+            if c:
+                await alert_q.put((c, tx_hash), keep=not c.by_decode)
 
-            # value
+    async def alert_worker():
+        while True:
+            c, tx_hash = await alert_q.get()
+            t0 = time.monotonic()
             try:
-                # if from Web3: int; if raw JSON: hex
-                v = tx.get("value", 0)
-                if isinstance(v, str):
-                    v = int(v, 16)
-                value_native = float(Web3.from_wei(v, "ether"))
-            except Exception:
-                value_native = 0.0
-            est_usd = value_native * native_usd if native_usd else None
-
-            # input data for swap parsing
-            inp = tx.get("input") or ""
-            swap_info = None
-            if is_router and isinstance(inp, str) and inp.startswith("0x") and len(inp) >= 10:
-                try:
-                    swap_info = parse_uniswap_call(bytes.fromhex(inp[2:]))
-                except Exception:
-                    swap_info = None
-
-            is_whale = frm in whales_lc
-            big_native = value_native >= cfg.min_native
-            big_usd = (est_usd or 0) >= cfg.min_usd
-
-            if is_router and (is_whale or big_native or big_usd or swap_info):
-                link = f"{cfg.explorer}{tx_hash}"
-                usd_str = f" (~${est_usd:,.0f})" if est_usd else ""
-                desc = (
-                    f"**From:** `{frm}`\n"
-                    f"**To:** {routers_lc.get(to_addr,'Router')} (`{to_addr}`)\n"
-                    f"**Value:** {value_native:.4f} {cfg.native_symbol}{usd_str}\n"
-                )
-                if swap_info:
-                    desc += f"**Method:** {swap_info['method']} • **TokenOut:** `{swap_info['token_out']}`\n"
-
-                embed = {
-                    "title": f"{cfg.name.upper()} • Possible Whale Buy",
-                    "description": desc,
-                    "color": 0x2ECC71,
-                    "url": link,
-                    "footer": {"text": tx_hash},
-                }
-                discord_send(embeds=[embed])
-                print(f"[{cfg.name}] alert sent:", tx_hash)
-
-                if autolearn:
-                    learned = autolearn.consider(frm, est_usd)
-                    if learned:
-                        discord_send(
-                            f"🧠 **Auto-learned new EVM whale:** `{learned}` "
-                            f"(≥{autolearn.min_usd:,.0f} USD x{autolearn.occurrences} in {autolearn.window_hours}h). "
-                            f"Added to `whales_evm`."
-                        )
-        except Exception as e:
-            print(f"[{cfg.name}] loop error:", e)
+                await alert(c, tx_hash)
+            except Exception as e:
+                print(f"[{cfg.name}] alert error:", e)
+            m_alert.observe(time.monotonic() - t0)
+
+    # every ws provider is subscribed at once; the seen set forwards whichever announces a tx first and
+    # drops repeats - from the other providers, and re-announcements after a reconnect - before any fetch
+    labels = endpoint_labels([url for url, _ in cfg.ws_endpoints])
+    racing = len(labels) > 1
+    seen = SeenCache(cfg.dedup_ttl, cfg.dedup_max)
+    seen.track_metrics(cfg.name)
+    # alerts are rare: remember them far longer, so a tx re-announced after leaving `seen` never re-posts
+    alerted = SeenCache(ttl=86400, max_size=20000)
+    race = {label: [0, 0, 0.0] for label in labels}  # first, repeated by another provider, summed lag
+    to_addresses = list(cfg.routers.values())
+    print(f"[{cfg.name}] seen set: ttl={seen.ttl:.0f}s max={seen.max_size}")
+    if racing:
+        print(f"[{cfg.name}] racing {len(labels)} ws providers: {', '.join(labels)}")
+
+    def race_snapshot() -> str:
+        return "first/repeat/avg_lag " + " ".join(
+            f"{label}={r[0]}/{r[1]}/{(r[2] / r[1] * 1000 if r[1] else 0):.0f}ms" for label, r in race.items()
+        )
+
+    async def report():
+        eps = http_endpoints(cfg)
+        while True:
+            await asyncio.sleep(cfg.stats_interval)
+            print(
+                f"[{cfg.name}] pipeline recv={stats['recv']} fetched={stats['fetched']} null={stats['null']} "
+                f"scored={stats['scored']} wait_max={stats['wait_max_ms']:.0f}ms | "
+                f"{fetch_q.snapshot()} {score_q.snapshot()} {alert_q.snapshot()} | filter pass/reject: {chain.snapshot()} "
+                f"token_below_min={stats['token_below_min']} token_unpriced={stats['token_unpriced']} | {pricer.snapshot()} | {tokens.snapshot()} | {whales.snapshot()} | {oracle.describe(price_cache_id)}"
+                f" | seen {seen.snapshot()} dup_alerts={stats['dup_alerts']}"
+                + (f" | {race_snapshot()}" if racing else "") + (f" | {eps.snapshot()}" if eps and len(eps) > 1 else "")
+            )
+            stats["wait_max_ms"] = 0.0
+
+    async def receive(idx: int, url: str, mode: str, label: str):
+        m_first, m_lag = M_PROVIDER_FIRST.labels(cfg.name, label), M_PROVIDER_LAG.labels(cfg.name, label)
+        r = race[label]
+        async for item in evm_ws_sub(url, mode, to_addresses, chain=cfg.name, provider=label,
+                                     src=f"{cfg.name}@{label}" if racing else None):
+            # only racing needs to know who saw a tx first (and when); a shared constant mark costs no memory
+            now = time.monotonic()
+            first = seen.first_seen(tx_hash_key(item if isinstance(item, str) else item["hash"]), (now, idx) if racing else True)
+            if first is not None:
+                stats["dup"] += 1
+                if racing and first[1] != idx:
+                    m_lag.observe(now - first[0])
+                    r[1] += 1
+                    r[2] += now - first[0]
+                continue
+            m_first.inc()
+            r[0] += 1
+            stats["recv"] += 1
+            # full-tx subscription modes hand us the tx object directly
+            if isinstance(item, dict):
+                await score_q.put((item, item["hash"]), keep=(item.get("to") or "").lower() in routers_lc)
+            elif fetcher:
+                await fetch_q.put((item, time.monotonic()))
+
+    workers = [asyncio.create_task(scorer())]
+    workers += [asyncio.create_task(alert_worker()) for _ in range(max(1, cfg.alert_workers))]
+    if fetcher:
+        workers += [asyncio.create_task(fetch_worker()) for _ in range(max(1, cfg.fetch_workers))]
+    if cfg.stats_interval > 0:
+        workers.append(asyncio.create_task(report()))
+
+    receivers = [asyncio.create_task(receive(i, url, mode, label))
+                 for i, ((url, mode), label) in enumerate(zip(cfg.ws_endpoints, labels))]
+    try:
+        await asyncio.gather(*receivers)
+    finally:
+        for t in receivers + workers:
+            t.cancel()
 
 # -------------------- Solana logs watcher --------------------
-async def solana_logs_sub(ws_url: str, filter_obj: dict):
-    """Async generator yielding logs notifications for a given 'mentions' filter with reconnect."""
+M_SOL_NOTIFICATIONS = METRICS.counter("whale_solana_filter_notifications_total", "logsNotification frames per filter",
+                                      ("filter",))
+
+async def solana_logs_sub(ws_url: str, filters: List[dict], commitment: str = "confirmed", name: str = "solana"):
+    """
+    Async generator multiplexing many logsSubscribe filters over one websocket.
+    Yields (filter_obj, value) with value = {"signature", "err", "logs"}; notifications are routed
+    by subscription id, and every filter is re-subscribed after a reconnect.
+    """
+    m_connects, m_errors, m_notes = (m.labels("solana", name) for m in (M_WS_CONNECTS, M_WS_ERRORS, M_WS_NOTIFICATIONS))
+    m_filters = [M_SOL_NOTIFICATIONS.labels(f.get("mentions", ["?"])[0]) for f in filters]
+    rec = recorder()
     backoff = 2
     while True:
         try:
-            print("[sol_sub] connecting:", ws_url, "| filter:", filter_obj)
+            m_connects.inc()
+            print(f"[sol_sub] connecting: {ws_url} | {len(filters)} filter(s)")
             async with websockets.connect(ws_url, ping_interval=20, ping_timeout=20) as ws:
-                await ws.send(json.dumps({"jsonrpc":"2.0","id":1,"method":"logsSubscribe","params":[filter_obj, {"commitment":"confirmed"}]}))
-                print("[sol_sub] subscribed")
+                pending: Dict[int, int] = {}  # request id -> filter index, until the subscribe reply arrives
+                by_sub: Dict[int, int] = {}   # subscription id -> filter index
+                if rec:
+                    rec.ws_open(name)
+                for req_id, filter_obj in enumerate(filters, start=1):
+                    pending[req_id] = req_id - 1
+                    sub_req = json.dumps({"jsonrpc":"2.0","id":req_id,"method":"logsSubscribe","params":[filter_obj, {"commitment":commitment}]})
+                    if rec:
+                        rec.ws_out(name, sub_req)
+                    await ws.send(sub_req)
                 while True:
                     raw = await ws.recv()
-                    msg = json.loads(raw)
+                    if rec:
+                        rec.ws_in(name, raw)
+                    fast = fast_logs_notification(raw)
+                    if fast is not None:
+                        m_notes.inc()
+                        idx = by_sub.get(fast[0])
+                        if idx is not None:
+                            m_filters[idx].inc()
+                            yield filters[idx], fast[1]
+                        continue
+                    try:
+                        msg = json_loads(raw)
+                    except JSON_DECODE_ERRORS as e:
+                        m_errors.inc()
+                        print(f"[sol_sub] {name} skipped unparseable frame:", e)
+                        continue
                     if msg.get("method") == "logsNotification":
-                        yield msg["params"]["result"]
+                        m_notes.inc()
+                        params = msg["params"]
+                        idx = by_sub.get(params.get("subscription"))
+                        if idx is not None:
+                            m_filters[idx].inc()
+                            res = params["result"]
+                            yield filters[idx], res.get("value", res)
+                    elif msg.get("id") in pending:
+                        idx = pending.pop(msg["id"])
+                        if "result" in msg:
+                            by_sub[msg["result"]] = idx
+                        else:
+                            print("[sol_sub] subscribe rejected:", filters[idx], msg.get("error"))
+                        if not pending:
+                            print(f"[sol_sub] subscribed {len(by_sub)}/{len(filters)} filter(s)")
+                            backoff = 2
         except Exception as e:
+            m_errors.inc()
             print("[sol_sub] error, will reconnect:", e)
             await asyncio.sleep(backoff)
             backoff = min(backoff * 2, 30)
 
+SOL_WSOL_MINT = "So11111111111111111111111111111111111111112"
+SOL_USD_STABLE_MINTS = {
+    "EPjFWdd5AufqSSqeM2qN1xzybapC8G4wEGGkZwyTDt1v",  # USDC
+    "Es9vMFrzaCERmJfrF4H2FYD4KvNo7tZ8uQHjnNA1iBxX",  # USDT
+}
+SOL_GETTX_OPTS = {"encoding": "jsonParsed", "maxSupportedTransactionVersion": 0, "commitment": "confirmed"}
+
+def sol_balance_deltas(tx: dict, owner: Optional[str] = None) -> Tuple[str, float, Dict[str, float]]:
+    """
+    From a jsonParsed getTransaction result, return (owner, SOL delta excluding the fee, {mint: token delta})
+    for `owner` (default: the fee payer). Token deltas are in UI units, zero deltas omitted.
+    """
+    meta = tx.get("meta") or {}
+    keys = [k["pubkey"] if isinstance(k, dict) else k for k in tx["transaction"]["message"]["accountKeys"]]
+    owner = owner or keys[0]
+    sol = 0.0
+    if owner in keys:
+        i = keys.index(owner)
+        pre, post = meta.get("preBalances") or [], meta.get("postBalances") or []
+        if i < len(pre) and i < len(post):
+            lamports = post[i] - pre[i]
+            if i == 0:
+                lamports += meta.get("fee") or 0  # fee payer: don't count the fee as trade size
+            sol = lamports / 1e9
+    tokens: Dict[str, float] = {}
+    for sign, bals in ((-1, meta.get("preTokenBalances")), (1, meta.get("postTokenBalances"))):
+        for b in bals or []:
+            if b.get("owner") != owner:
+                continue
+            amt = b.get("uiTokenAmount") or {}
+            ui = float(amt.get("uiAmountString") or amt.get("uiAmount") or 0)
+            tokens[b["mint"]] = tokens.get(b["mint"], 0.0) + sign * ui
+    return owner, sol, {m: d for m, d in tokens.items() if d}
+
+def sol_usd_value(sol_delta: float, token_deltas: Dict[str, float], sol_usd: Optional[float]) -> Optional[float]:
+    """Size of a swap in USD: the largest priced leg (SOL, wSOL, USD stables); None if no leg is priced."""
+    legs = []
+    if sol_usd:
+        legs.append(abs(sol_delta) * sol_usd)
+    for mint, d in token_deltas.items():
+        if mint in SOL_USD_STABLE_MINTS:
+            legs.append(abs(d))
+        elif mint == SOL_WSOL_MINT and sol_usd:
+            legs.append(abs(d) * sol_usd)
+    return max(legs) if legs else None
+
 async def watch_solana(cfg):
     print("[solana] starting logs watcher…")
-    filters = [{"mentions": pk} for pk in (cfg.program_ids + cfg.whales)]
-    async def handle_filter(filter_obj):
-        async for res in solana_logs_sub(cfg.wss, filter_obj):
+    filters = [{"mentions": [pk]} for pk in (cfg.program_ids + cfg.whales)]
+    # spread filters round-robin over a small pool of connections
+    n_conns = max(1, min(cfg.ws_connections, len(filters)))
+    groups = [filters[i::n_conns] for i in range(n_conns)]
+    print(f"[solana] {len(filters)} filter(s) over {n_conns} connection(s)")
+    # one signature can match several filters (whale + program, multi-hop routes): alert once
+    seen = SeenCache(cfg.dedup_ttl, cfg.dedup_max)
+    whales_set = set(cfg.whales)
+    oracle = price_oracle()
+    oracle.add_ids([cfg.native_coingecko])
+    oracle.start()
+
+    # enrichment: batched getTransaction -> balance deltas -> USD threshold
+    loop = asyncio.get_running_loop()
+    fetcher = RpcBatcher(cfg.http, "getTransaction", cfg.enrich_batch_size, cfg.enrich_batch_ms, timeout=15)
+    enrich_q = BoundedStage("enrich_q", cfg.queue_size, "drop_oldest")
+    stats = {"candidates": 0, "enriched": 0, "retried": 0, "null": 0, "below_min": 0, "alerts": 0}
+    track_pipeline_stats("solana", stats)
+    enrich_q.track_metrics("solana")
+    seen.track_metrics("solana")
+    m_fetch = M_RPC_FETCH_SECONDS.labels("solana")
+    print(f"[solana] enrichment: workers={cfg.enrich_workers} batch={cfg.enrich_batch_size} "
+          f"window={cfg.enrich_batch_ms}ms min_usd={cfg.min_usd:,.0f}")
+
+    async def handle_group(idx: int, group: List[dict]):
+        async for filter_obj, res in solana_logs_sub(cfg.wss, group, name=f"solana#{idx}"):
             try:
                 sig = res.get("signature")
-                if not sig:
+                # failed txs moved no funds
+                if not sig or res.get("err") or seen.check_and_add(sig):
                     continue
-                log_lines = res.get("logs") or []
-                first_line = (log_lines[0] if log_lines else "")[:180]
-                link = f"{cfg.explorer_tx}{sig}"
-                desc = f"**Signature:** `{sig}`\n**First log:** `{first_line}`\n"
-                embed = {
-                    "title": "SOLANA • Whale/DEX Mention",
-                    "description": desc,
-                    "color": 0x5865F2,
-                    "url": link,
-                    "footer": {"text": "logsSubscribe mention"},
-                }
-                discord_send(embeds=[embed])
-                print("[solana] alert:", sig)
+                stats["candidates"] += 1
+                await enrich_q.put((sig, filter_obj["mentions"][0], 1))
             except Exception as e:
-                print("[solana] handle_filter error:", e)
-    await asyncio.gather(*(handle_filter(f) for f in filters))
+                print("[solana] handle_group error:", e)
+
+    async def alert(sig: str, matched: str, tx: dict, sol_usd: Optional[float]):
+        keys = tx["transaction"]["message"]["accountKeys"]
+        signers = [k["pubkey"] for k in keys if isinstance(k, dict) and k.get("signer")]
+        whale = next((k for k in signers if k in whales_set), None)
+        owner, sol_delta, token_deltas = sol_balance_deltas(tx, whale)
+        usd = sol_usd_value(sol_delta, token_deltas, sol_usd)
+        if not whale and (usd or 0) < cfg.min_usd:
+            stats["below_min"] += 1
+            return
+        usd_str = f"~${usd:,.0f}" if usd is not None else "n/a"
+        desc = f"**Signer:** `{owner}`\n**SOL:** {sol_delta:+,.4f} SOL\n"
+        for mint, d in sorted(token_deltas.items(), key=lambda kv: -abs(kv[1]))[:3]:
+            desc += f"**Token:** `{mint}` {d:+,.4f}\n"
+        desc += f"**Est. value:** {usd_str}\n**Matched:** `{matched}`\n"
+        embed = {
+            "title": "SOLANA • Whale Swap" if whale else "SOLANA • Large DEX Swap",
+            "description": desc,
+            "color": 0x5865F2,
+            "url": f"{cfg.explorer_tx}{sig}",
+            "footer": {"text": sig},
+        }
+        await discord_send(embeds=[embed], key=sig)
+        stats["alerts"] += 1
+        print("[solana] alert:", sig, usd_str)
+
+    async def enrich_worker():
+        while True:
+            chunk = [await enrich_q.get()]
+            while len(chunk) < cfg.enrich_batch_size:
+                try:
+                    chunk.append(enrich_q.get_nowait())
+                except asyncio.QueueEmpty:
+                    break
+            t0 = time.monotonic()
+            try:
+                txs = await asyncio.gather(*(fetcher.call(sig, SOL_GETTX_OPTS) for sig, _, _ in chunk))
+                m_fetch.observe(time.monotonic() - t0)
+                sol_usd = oracle.get(cfg.native_coingecko)
+            except Exception as e:
+                print("[solana] enrich worker error:", e)
+                continue
+            for (sig, matched, attempt), tx in zip(chunk, txs):
+                if not tx:
+                    # the RPC node may lag the websocket by a slot or two: re-queue just this signature
+                    # after a delay and keep draining, rather than holding the whole chunk
+                    if attempt < cfg.enrich_retries:
+                        stats["retried"] += 1
+                        loop.call_later(cfg.enrich_retry_delay, enrich_q.put_nowait, (sig, matched, attempt + 1))
+                    else:
+                        stats["null"] += 1
+                    continue
+                stats["enriched"] += 1
+                try:
+                    await alert(sig, matched, tx, sol_usd)
+                except Exception as e:
+                    print("[solana] enrich error:", sig, e)
+
+    async def report():
+        while True:
+            await asyncio.sleep(cfg.stats_interval)
+            print(
+                f"[solana] pipeline candidates={stats['candidates']} enriched={stats['enriched']} "
+                f"retried={stats['retried']} null={stats['null']} "
+                f"below_min={stats['below_min']} alerts={stats['alerts']} | {enrich_q.snapshot()} | dedup {seen.snapshot()} | "
+                f"{oracle.describe(cfg.native_coingecko)}"
+            )
+
+    jobs = [handle_group(i, g) for i, g in enumerate(groups)]
+    jobs += [enrich_worker() for _ in range(max(1, cfg.enrich_workers))]
+    if cfg.stats_interval > 0:
+        jobs.append(report())
+    await asyncio.gather(*jobs)
 
 # -------------------- Config loaders --------------------
 def load_config(path: str) -> dict:
     with open(path, "r", encoding="utf-8") as f:
         return yaml.safe_load(f) or {}
 
-def build_evm_cfgs(c: dict) -> List[EvmChainCfg]:
+def _url_list(v) -> list:
+    if not v:
+        return []
+    return list(v) if isinstance(v, list) else [v]
+
+def build_evm_cfgs(c: dict, whales: Optional[WhaleRegistry] = None) -> List[EvmChainCfg]:
     out: List[EvmChainCfg] = []
     thresholds = c.get("thresholds", {})
-    whales = set(a.lower() for a in c.get("whales_evm", []))
+    if whales is None:
+        whales = load_evm_whales(c)
     chains = c.get("chains", {}) or {}
     for name, cc in chains.items():
         routers = {r["name"]: Web3.to_checksum_address(r["address"]) for r in cc.get("routers", [])}
+        mode = cc.get("pending_mode", "hashes")
+        # ws / http take one URL or a list; a ws entry may also be {url, pending_mode}
+        ws_endpoints = [(e["url"], e.get("pending_mode", mode)) if isinstance(e, dict) else (e, mode)
+                        for e in _url_list(cc["ws"])]
+        if not ws_endpoints:
+            raise ValueError(f"chains.{name}.ws: no websocket endpoint configured")
+        http_urls = _url_list(cc.get("http"))
         out.append(
             EvmChainCfg(
                 name=name,
-                ws=cc["ws"],
-                http=cc.get("http"),  # new optional HTTP field
+                ws=ws_endpoints[0][0],
+                http=http_urls[0] if http_urls else None,
                 explorer=cc["explorer"],
                 native_symbol=cc.get("native_symbol", "ETH"),
                 native_coingecko=cc.get("native_coingecko", "ethereum"),
@@ -420,6 +3068,27 @@ def build_evm_cfgs(c: dict) -> List[EvmChainCfg]:
                 min_usd=float(thresholds.get("min_usd", 50000)),
                 min_native=float(thresholds.get("min_native", 10)),
                 whales=whales,
+                pending_mode=mode,
+                fetch_batch_size=int(cc.get("fetch_batch_size", 50)),
+                fetch_batch_ms=int(cc.get("fetch_batch_ms", 25)),
+                fetch_workers=int(cc.get("fetch_workers", 4)),
+                queue_size=int(cc.get("queue_size", 10000)),
+                overflow_policy=cc.get("overflow_policy", "drop_oldest"),
+                stats_interval=int(cc.get("stats_interval", 60)),
+                wrapped_native=cc.get("wrapped_native"),
+                v2_factory=cc.get("v2_factory"),
+                v3_factory=cc.get("v3_factory"),
+                v3_fees=[int(f) for f in cc.get("v3_fees", [100, 500, 3000, 10000])],
+                min_pool_native=float(cc.get("min_pool_native", 2.0)),
+                token_price_ttl=float(cc.get("token_price_ttl", 12)),
+                token_price_cache=int(cc.get("token_price_cache", 5000)),
+                token_price_timeout=float(cc.get("token_price_timeout", 2.0)),
+                alert_workers=int(cc.get("alert_workers", 8)),
+                alert_queue_size=int(cc.get("alert_queue_size", 1000)),
+                dedup_ttl=int(cc.get("dedup_ttl", 600)),
+                dedup_max=int(cc.get("dedup_max", 200000)),
+                ws_endpoints=ws_endpoints,
+                http_urls=http_urls,
             )
         )
     return out
@@ -438,16 +3107,30 @@ def build_solana_cfg(c: dict) -> Optional[_SolCfg]:
         explorer_tx=sc.get("explorer_tx", "https://solscan.io/tx/"),
         program_ids=sc.get("program_ids", []),
         whales=c.get("whales_solana", []),
+        ws_connections=int(sc.get("ws_connections", 1)),
+        dedup_ttl=int(sc.get("dedup_ttl", 600)),
+        dedup_max=int(sc.get("dedup_max", 200000)),
+        stats_interval=int(sc.get("stats_interval", 60)),
+        native_coingecko=sc.get("native_coingecko", "solana"),
+        min_usd=float((c.get("thresholds") or {}).get("min_usd", 50000)),
+        enrich_workers=int(sc.get("enrich_workers", 4)),
+        enrich_batch_size=int(sc.get("enrich_batch_size", 20)),
+        enrich_batch_ms=int(sc.get("enrich_batch_ms", 50)),
+        enrich_retries=max(1, int(sc.get("enrich_retries", 3))),
+        enrich_retry_delay=float(sc.get("enrich_retry_delay", 1.0)),
+        queue_size=int(sc.get("queue_size", 5000)),
     )
 
 # -------------------- Main --------------------
 async def main():
     ap = argparse.ArgumentParser()
     ap.add_argument("--config", required=True, help="Path to config.yaml")
+    ap.add_argument("--record", help="Capture ws frames / RPC results to this .jsonl.gz for `bench.py replay`")
     args = ap.parse_args()
 
     cfg_path = args.config
     print("[boot] loading config from:", cfg_path)
+    set_state_dir(cfg_path)
 
     try:
         cfg = load_config(cfg_path)
@@ -458,8 +3141,19 @@ async def main():
         return
 
     print("[boot] chains:", list((cfg.get("chains") or {}).keys()), " solana:", bool(cfg.get("solana")))
+    print("[boot] json backend:", JSON_BACKEND)
+    rec = init_recorder(args.record)
+    if rec:
+        rec.meta(cfg)
+        print("[boot] recording traffic to:", args.record)
+    init_http_client(cfg.get("http_client"))
+    init_discord(cfg.get("discord"), cfg.get("outbox"))
+    init_price_oracle(cfg.get("prices"))
+    init_token_meta(cfg.get("token_cache"))
 
-    evm_cfgs = build_evm_cfgs(cfg)
+    evm_whales = load_evm_whales(cfg)
+    M_WHALES.track(evm_whales.__len__)
+    evm_cfgs = build_evm_cfgs(cfg, evm_whales)
     sol_cfg = build_solana_cfg(cfg)
 
     if not evm_cfgs and not sol_cfg:
@@ -468,20 +3162,41 @@ async def main():
 
     # Quick WS connectivity prints (best-effort)
     for ch in evm_cfgs:
-        print(f"[boot] {ch.name} ws:", ch.ws)
-        if ch.http:
+        for url, _ in ch.ws_endpoints:
+            print(f"[boot] {ch.name} ws:", url)
+        for url, label in zip(ch.http_urls, endpoint_labels(ch.http_urls)):
             try:
-                ok = Web3(Web3.HTTPProvider(ch.http, request_kwargs={"timeout": 10})).is_connected()
-                print(f"[boot] {ch.name} HTTP connected? ->", ok)
+                chain_id = await rpc_call(url, "eth_chainId", timeout=10)
+                print(f"[boot] {ch.name} HTTP {label} connected? -> True (chainId {int(chain_id, 16)})")
             except Exception as e:
-                print(f"[boot] {ch.name} HTTP check failed:", e)
+                print(f"[boot] {ch.name} HTTP {label} check failed:", e)
 
     if sol_cfg:
         print("[boot] solana wss:", sol_cfg.wss)
 
-    autolearn = AutoLearn(cfg, cfg_path, set(cfg.get("whales_evm", []))) if "autolearn" in cfg else None
+    autolearn = AutoLearn(cfg, evm_whales) if "autolearn" in cfg else None
+
+    # register every coin up front so the first refresh is a single batched call
+    oracle = price_oracle()
+    oracle.add_ids([ch.native_coingecko for ch in evm_cfgs] + ([sol_cfg.native_coingecko] if sol_cfg else []))
+
+    # token metadata is shared by every EVM chain; preload what we saw recently so alerts skip the RPC
+    tokens = token_meta()
+    for ch in evm_cfgs:
+        tokens.register_chain(ch.name, http_endpoints(ch))
+    if evm_cfgs:
+        print(f"[boot] token metadata: {await tokens.warmup()} recently seen token(s) loaded")
 
-    tasks: List[asyncio.Task] = []
+    tasks: List[asyncio.Task] = [oracle.start(), tokens.start()]
+    if rec:
+        tasks.append(rec.start())
+    if WEBHOOK:
+        tasks.append(_discord.start())
+    if autolearn and autolearn.enabled:
+        tasks.append(autolearn.start())
+    metrics_task = METRICS.start(cfg.get("metrics"))
+    if metrics_task:
+        tasks.append(metrics_task)
     for ch in evm_cfgs:
         tasks.append(asyncio.create_task(watch_evm(ch, ch.native_coingecko, autolearn)))
     if sol_cfg:
@@ -494,6 +3209,8 @@ async def main():
         print("[boot][ERROR] task crashed:", e)
         import traceback as _tb
         _tb.print_exc()
+    finally:
+        await http_client().close()
 
 if __name__ == "__main__":
     try: